@@ -0,0 +1,171 @@
+import asyncio
+import threading
+
+from pipeline_metrics import MetricsReporterThread, build_reporters, collect_snapshot, format_stage_summary, sample_queue_depths
+from pipeline_plan import load_plan
+from pipeline_routing import AsyncOutputRouter, build_output, output_queue_names
+from workers.queueWorkers import END_OF_STREAM
+from workers.stageMetrics import registry
+
+
+class AsyncYamlPipelineExecutor(threading.Thread):
+    """
+    Runs the same pipeline YAML as YamlPipelineExecutor, but every worker instance is an
+    asyncio task and the queues are asyncio.Queue objects, so network-bound stages can
+    keep hundreds of requests in flight on a single thread.
+
+    Each worker entry may carry an 'async' mapping that overrides location, class,
+    instances and params for this engine; workers without one must already be
+    asyncio workers (an async run() method).
+    """
+    def __init__(self, pipeline_location):
+        super(AsyncYamlPipelineExecutor, self).__init__()
+        self._pipeline_location = pipeline_location
+        self._queues = {}
+        self._workers = {}
+        self._queue_consumers = {}  # queue name -> worker instances consuming it, across every stage
+        self._queue_producers = {}  # queue name -> stages still writing to it
+        self._downstream_queues = {}
+        self._worker_classes = set()
+        self._live_workers = {}  # stage name -> instances still running
+        self._failed_stages = []  # Stages with an instance that raised, in the order they finished
+        self.finished = threading.Event()  # Set once run() returns, for waiting without join()
+
+    def _load_pipeline(self):
+        self._plan = load_plan(self._pipeline_location)
+        self._yaml_data = self._plan.data
+
+    def _initialize_queues(self):
+        for queue in self._yaml_data['queues']:
+            overflow = queue.get('overflow', 'block')
+            if overflow != 'block':
+                print(f"⚠️ Queue {queue['name']}: overflow {overflow!r} is not supported by the asyncio engine, blocking instead")
+            if queue.get('backend', 'memory') != 'memory':
+                print(f"⚠️ Queue {queue['name']}: backend {queue['backend']!r} is not supported by the asyncio engine, keeping it in memory")
+            self._queues[queue['name']] = asyncio.Queue(maxsize=queue.get('maxsize', 0))
+
+    def _initialize_workers(self):
+        for worker in self._yaml_data['workers']:
+            async_worker = worker.get('async') or {}
+            WorkerClass = self._plan.worker_class(worker, engine='asyncio')  # The 'async' block's class when it has one
+            self._worker_classes.add(WorkerClass)
+
+            input_queue = worker.get('input_queue')
+            output_queues = output_queue_names(worker.get('output_queues'))  # Every queue any route writes to
+            worker_name = worker['name']
+            num_instances = async_worker.get('instances', worker.get('instances', 1))
+            if 'min_instances' in worker or 'max_instances' in worker:
+                print(f"⚠️ {worker_name}: autoscaling is only supported by the threads engine, running {num_instances} instances")
+            if worker.get('backend', 'thread') != 'thread':
+                print(f"⚠️ {worker_name}: backend {worker['backend']!r} is only supported by the threads engine, "
+                      f"running its instances as tasks on the event loop")
+
+            dead_letter_queue = worker.get('dead_letter_queue')
+            # The dead-letter queue ends with the stage, like its outputs, so a retry stage reading it finishes too
+            stage_outputs = output_queues + ([dead_letter_queue] if dead_letter_queue else [])
+            self._downstream_queues[worker_name] = stage_outputs
+            for output_queue in stage_outputs:
+                self._queue_producers.setdefault(output_queue, set()).add(worker_name)
+            if input_queue is not None:
+                self._queue_consumers[input_queue] = self._queue_consumers.get(input_queue, 0) + num_instances
+
+            init_params = {
+                'input_queue': self._queues[input_queue] if input_queue else None,
+                # The queue itself for a single output, otherwise a router shared by every instance
+                'output_queue': build_output(worker.get('output_queues'), self._queues, AsyncOutputRouter),
+                'stage_name': worker_name  # Metrics are recorded per stage, not per class
+            }
+            if dead_letter_queue:
+                init_params['dead_letter_queue'] = self._queues[dead_letter_queue]
+
+            input_values = worker.get('input_values')
+            if input_values is not None:
+                init_params['input_values'] = input_values
+
+            params = async_worker.get('params', worker.get('params'))
+            if params is not None:
+                init_params.update(params)
+
+            self._workers[worker_name] = [WorkerClass(**init_params) for _ in range(num_instances)]
+            self._live_workers[worker_name] = num_instances
+
+    def process_pipeline(self):
+        self._load_pipeline()
+        self._initialize_queues()
+        self._initialize_workers()
+
+    async def _run_stage(self, worker_name):
+        """
+        Run every instance of a stage, then send one "DONE" per consumer on each output queue
+        that no other stage still writes to.
+        """
+        results = await asyncio.gather(*(self._run_worker(worker_name, worker) for worker in self._workers[worker_name]),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                print(f"❌ {worker_name} instance failed: {result!r}")
+        failed = any(isinstance(result, BaseException) for result in results)
+        if failed:
+            self._failed_stages.append(worker_name)
+        print(f"[supervisor] {worker_name} " + ("failed" if failed else "finished"))
+        registry.stage(worker_name).finish()
+        for output_queue in dict.fromkeys(self._downstream_queues[worker_name]):
+            producers = self._queue_producers[output_queue]
+            producers.discard(worker_name)
+            if producers:
+                continue  # Another stage still feeds it
+            for _ in range(self._queue_consumers.get(output_queue, 0)):
+                await self._queues[output_queue].put(END_OF_STREAM)
+
+    async def _run_worker(self, worker_name, worker):
+        try:
+            await worker.run()
+        finally:
+            self._live_workers[worker_name] -= 1
+
+    def failed_stages(self):
+        """
+        Names of the stages in which a worker failed (an exception ended it).
+        """
+        return list(self._failed_stages)
+
+    def queue_stats(self):
+        """
+        Size and capacity of every queue.
+        """
+        return [{'name': name, 'size': queue.qsize(), 'maxsize': queue.maxsize} for name, queue in self._queues.items()]
+
+    def metrics_snapshot(self):
+        """
+        Per-stage metrics, live workers, queue depths and rate limiter state in one dict.
+        """
+        return collect_snapshot(self.queue_stats(), dict(self._live_workers))
+
+    async def run_async(self):
+        self.process_pipeline()  # asyncio.Queue must be created inside the running loop on Python < 3.10
+        if self._yaml_data.get('checkpoint') is not None:
+            print("⚠️ checkpoint is only supported by the threads engine and is ignored by the asyncio engine")
+        metrics_config = self._yaml_data.get('metrics') or {}
+        if metrics_config.get('profile'):
+            print("⚠️ metrics.profile samples worker threads only and is ignored by the asyncio engine")
+        # Samples queue depths every interval even without reporters (qsize() is safe from another thread)
+        reporter = MetricsReporterThread(self.metrics_snapshot, build_reporters(metrics_config.get('reporters')),
+                                         interval=metrics_config.get('interval', 5.0),
+                                         sample=lambda: sample_queue_depths(self.queue_stats()))
+        reporter.start()
+        try:
+            await asyncio.gather(*(self._run_stage(worker_name) for worker_name in self._workers))
+        finally:
+            for WorkerClass in self._worker_classes:
+                shutdown = getattr(WorkerClass, 'shutdown', None)
+                if shutdown is not None:
+                    await shutdown()
+        reporter.stop()  # Writes the final report
+        if not reporter.reporters:
+            print(format_stage_summary(self.metrics_snapshot()))
+
+    def run(self):
+        try:
+            asyncio.run(self.run_async())
+        finally:
+            self.finished.set()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: CPU time per processed item for queue consumers that spin on
+empty() (the old scheduler loop) versus QueueConsumerWorker's blocking get().
+
+A producer feeds items at a fixed rate to a pool of consumers, the way the
+Wikipedia stage feeds the Yahoo schedulers, and the process CPU time is
+divided by the number of items processed.
+
+    python benchmarks/consumer_benchmark.py --consumers 10 --items 500 --rate 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from queue import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers.queueWorkers import END_OF_STREAM, QueueConsumerWorker  # noqa: E402
+
+
+class SpinningConsumer(threading.Thread):
+    """
+    Reproduces the scheduler loop before QueueConsumerWorker: poll empty() forever.
+    """
+    def __init__(self, input_queue, counter):
+        self._input_queue = input_queue
+        self._counter = counter
+        super(SpinningConsumer, self).__init__()
+        self.start()
+
+    def run(self):
+        while True:
+            if not self._input_queue.empty():
+                item = self._input_queue.get()
+                if item == END_OF_STREAM:
+                    break
+                self._counter.append(item)
+
+
+class BlockingConsumer(QueueConsumerWorker):
+    """
+    The same consumer built on QueueConsumerWorker.
+    """
+    def __init__(self, input_queue, counter):
+        self._counter = counter
+        super(BlockingConsumer, self).__init__(input_queue=input_queue)
+        self.start()
+
+    def process_item(self, item):
+        self._counter.append(item)
+
+
+def run_case(consumer_class, consumers, items, rate):
+    """
+    Feed items to consumers at rate items/sec and return CPU seconds per processed item.
+    """
+    input_queue = Queue()
+    counter = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    threads = [consumer_class(input_queue, counter) for _ in range(consumers)]
+    interval = 1.0 / rate
+    for item in range(items):
+        input_queue.put(item)
+        time.sleep(interval)  # Simulates a producer waiting on the network
+    for _ in threads:
+        input_queue.put(END_OF_STREAM)
+    for thread in threads:
+        thread.join()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        'consumer': consumer_class.__name__,
+        'items': len(counter),
+        'wall_s': round(wall, 3),
+        'cpu_s': round(cpu, 3),
+        'cpu_us_per_item': round(cpu / max(1, len(counter)) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--consumers', type=int, default=10, help='Consumer threads (4 Yahoo + 6 Postgres = 10)')
+    parser.add_argument('--items', type=int, default=500, help='Items to push through the queue')
+    parser.add_argument('--rate', type=float, default=200.0, help='Producer rate in items/sec')
+    args = parser.parse_args()
+
+    for consumer_class in (SpinningConsumer, BlockingConsumer):
+        print(run_case(consumer_class, args.consumers, args.items, args.rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Local stand-in for Wikipedia and Yahoo Finance, serving the generated pages in
+benchmarks/fixtures.py with configurable latency, server errors and 429s so the
+pipeline can be measured offline and reproducibly.
+
+    python benchmarks/fixture_server.py --port 8765 --latency 0.05 --throttle-rate 0.02
+    python benchmarks/fixture_server.py --latency 0.05 --slow-rate 0.02 --slow-latency 5  # Tail latency
+
+Then point the pipeline at it: the WikiWorker input value
+http://127.0.0.1:8765/wiki/List_of_S%26P_500_companies and the Yahoo stage's
+base_url param http://127.0.0.1:8765/quote/.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fixtures  # noqa: E402
+
+_SYMBOL_MARKER = 'FIXTURESYMBOL'
+_PRICE_MARKER = 987654.32  # Rendered as 987,654.32 in the template
+
+
+class _FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real sites
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fixture_server = self.server.fixture_server
+        fixture_server.delay()
+        if unquote(self.path) == unquote(fixtures.WIKIPEDIA_PATH):  # Clients differ in how they quote '&'
+            fixture_server.count('wiki')
+            self._send(200, fixture_server.wiki_page)
+            return
+        if not self.path.startswith(fixtures.YAHOO_QUOTE_PATH):
+            fixture_server.count('not_found')
+            self._send(404)
+            return
+        outcome = fixture_server.quote_outcome()  # Errors and throttling are injected on quote pages only
+        fixture_server.count(outcome)
+        if outcome == 'throttled':
+            self._send(429, headers={'Retry-After': str(fixture_server.retry_after)})
+        elif outcome == 'error':
+            self._send(500)
+        else:
+            self._send(200, fixture_server.quote_page(unquote(self.path[len(fixtures.YAHOO_QUOTE_PATH):])))
+
+
+class _FixtureHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # Clients closing idle keep-alive connections is normal
+            super(_FixtureHTTPServer, self).handle_error(request, client_address)
+
+
+class FixtureServer:
+    """
+    Threaded HTTP server for the fixture pages, run in a background thread.
+
+    Every request waits latency seconds plus up to jitter more, and with probability
+    slow_rate another slow_latency seconds (a latency tail). Quote requests then fail
+    with 500 with probability error_rate, or with 429 (and Retry-After) with probability
+    throttle_rate. The random draws come from one seeded generator, so a run with the
+    same settings and request order injects the same failures.
+    """
+    def __init__(self, host='127.0.0.1', port=0, symbols=503, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, seed=0, slow_rate=0.0, slow_latency=0.0):
+        """
+        :param port: Port to listen on, 0 picks a free one.
+        :param symbols: Number of constituents on the Wikipedia page.
+        :param latency: Seconds added to every response.
+        :param jitter: Up to this many extra seconds, drawn uniformly per request.
+        :param error_rate: Fraction of quote requests answered with 500.
+        :param throttle_rate: Fraction of quote requests answered with 429.
+        :param retry_after: Retry-After seconds sent with every 429.
+        :param seed: Seed for the latency and failure draws.
+        :param slow_rate: Fraction of requests delayed by slow_latency more seconds.
+        :param slow_latency: Extra seconds for the slow requests.
+        """
+        self.symbols = fixtures.sp500_symbols(symbols)
+        self.wiki_page = fixtures.wikipedia_constituents_page(self.symbols).encode('utf-8')
+        self._quote_template = fixtures.yahoo_quote_page(_SYMBOL_MARKER, price=_PRICE_MARKER).encode('utf-8')
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._httpd = _FixtureHTTPServer((host, port), _FixtureRequestHandler)
+        self._httpd.fixture_server = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def wiki_url(self):
+        return self.base_url + fixtures.WIKIPEDIA_PATH
+
+    @property
+    def yahoo_base_url(self):
+        return self.base_url + fixtures.YAHOO_QUOTE_PATH
+
+    def delay(self):
+        with self._lock:
+            seconds = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.slow_rate and self._random.random() < self.slow_rate:
+                seconds += self.slow_latency
+        if seconds:
+            time.sleep(seconds)
+
+    def quote_outcome(self):
+        """
+        'error', 'throttled' or 'ok' for the next quote request.
+        """
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.error_rate:
+            return 'error'
+        if draw < self.error_rate + self.throttle_rate:
+            return 'throttled'
+        return 'ok'
+
+    def quote_page(self, symbol):
+        page = self._quote_template.replace(_SYMBOL_MARKER.encode(), symbol.encode('utf-8'))
+        return page.replace(f'{_PRICE_MARKER:,.2f}'.encode(), f'{fixtures.symbol_price(symbol):,.2f}'.encode())
+
+    def count(self, outcome):
+        with self._lock:
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+
+    def stats(self):
+        """
+        Requests served so far, by outcome (wiki, ok, error, throttled, not_found).
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        """
+        Serve from a background thread. Returns self.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--symbols', type=int, default=503, help='Constituents on the Wikipedia page')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of quote requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of quote requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of responses delayed by --slow-latency')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='Extra seconds for the slow responses')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FixtureServer(host=args.host, port=args.port, symbols=args.symbols, latency=args.latency,
+                           jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                           retry_after=args.retry_after, seed=args.seed, slow_rate=args.slow_rate,
+                           slow_latency=args.slow_latency)
+    print(f"Serving {server.wiki_url} and {server.yahoo_base_url}<symbol>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(server.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Stand-in stages for benchmarking one pipeline stage in isolation: FixtureSource feeds
+the stage under test with generated items and DrainSink discards what it produces.
+The Async* variants are the same for the asyncio engine.
+"""
+import threading
+from datetime import datetime, timezone
+
+from benchmarks import fixtures
+from workers.queueWorkers import END_OF_STREAM
+
+
+def fixture_items(kind, count):
+    """
+    count generated inputs: 'symbols' (Yahoo stage input) or 'rows' ((symbol, price, time), Postgres stage input).
+    """
+    symbols = fixtures.sp500_symbols(count)
+    if kind == 'symbols':
+        return symbols
+    if kind == 'rows':
+        return [(symbol, fixtures.symbol_price(symbol), datetime.now(timezone.utc)) for symbol in symbols]
+    raise ValueError(f"Unknown fixture item kind {kind!r}, expected 'symbols' or 'rows'")
+
+
+class FixtureSource(threading.Thread):
+    """
+    Puts count generated items on its output queue, then exits.
+    """
+    def __init__(self, input_queue=None, output_queue=None, kind='symbols', count=503, stage_name=None):
+        super(FixtureSource, self).__init__()
+        self._output_queue = output_queue
+        self._items = fixture_items(kind, count)
+        self.start()
+
+    def run(self):
+        for item in self._items:
+            self._output_queue.put(item)
+
+
+class DrainSink(threading.Thread):
+    """
+    Consumes and discards items until END_OF_STREAM.
+    """
+    def __init__(self, input_queue=None, output_queue=None, stage_name=None):
+        super(DrainSink, self).__init__()
+        self._input_queue = input_queue
+        self.start()
+
+    def run(self):
+        while self._input_queue.get() != END_OF_STREAM:
+            pass
+
+
+class AsyncFixtureSource:
+    def __init__(self, input_queue=None, output_queue=None, kind='symbols', count=503, stage_name=None):
+        self._output_queue = output_queue
+        self._items = fixture_items(kind, count)
+
+    async def run(self):
+        for item in self._items:
+            await self._output_queue.put(item)
+
+
+class AsyncDrainSink:
+    def __init__(self, input_queue=None, output_queue=None, stage_name=None):
+        self._input_queue = input_queue
+
+    async def run(self):
+        while await self._input_queue.get() != END_OF_STREAM:
+            pass
@@ -0,0 +1,122 @@
+"""
+Deterministic stand-ins for the pages the pipeline scrapes, shaped like the real
+ones: a Wikipedia "List of S&P 500 companies" page and Yahoo Finance quote pages.
+
+They are generated rather than checked in so the benchmarks and the fixture
+server need no network access; pass a saved page to the benchmarks to measure
+against the real markup instead.
+"""
+import random
+import string
+
+WIKIPEDIA_PATH = '/wiki/List_of_S%26P_500_companies'
+YAHOO_QUOTE_PATH = '/quote/'
+
+_SECTORS = ['Industrials', 'Health Care', 'Information Technology', 'Financials', 'Energy',
+            'Consumer Staples', 'Consumer Discretionary', 'Utilities', 'Materials', 'Real Estate',
+            'Communication Services']
+
+
+def sp500_symbols(count=503, seed=500):
+    """
+    Return count distinct ticker-like symbols, always the same for a given seed.
+    """
+    rng = random.Random(seed)
+    symbols = []
+    seen = set()
+    while len(symbols) < count:
+        symbol = ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(1, 4)))
+        if rng.random() < 0.01:
+            symbol += '.B'
+        if symbol not in seen:
+            seen.add(symbol)
+            symbols.append(symbol)
+    return symbols
+
+
+def symbol_price(symbol):
+    """
+    Deterministic price for a symbol.
+    """
+    return round(10 + (sum(map(ord, symbol)) * 7919 % 400000) / 100, 2)
+
+
+def _padding(rng, tag, count, words=40):
+    vocabulary = ['index', 'market', 'company', 'capitalization', 'float', 'adjusted', 'sector',
+                  'constituent', 'revenue', 'dividend', 'shares', 'exchange', 'listing', 'quarter']
+    return ''.join(
+        f'<{tag}>' + ' '.join(rng.choice(vocabulary) for _ in range(words)) + f'</{tag}>\n'
+        for _ in range(count)
+    )
+
+
+def wikipedia_constituents_page(symbols=None, seed=1):
+    """
+    HTML shaped like the Wikipedia constituents page: a large head, the constituents table,
+    a second table of historical changes, and references.
+    """
+    symbols = symbols or sp500_symbols()
+    rng = random.Random(seed)
+    head = ''.join(f'<link rel="stylesheet" href="/w/load.php?modules=site.styles&amp;v={i}">\n' for i in range(200))
+    head += '<script>' + 'var mwConfig={"wgPageName":"List_of_S&P_500_companies"};' * 2000 + '</script>\n'
+
+    rows = []
+    for symbol in symbols:
+        company = symbol.title() + ' Corp.'
+        rows.append(
+            '<tr>\n'
+            f'<td><a rel="nofollow" class="external text" href="https://www.nyse.com/quote/XNYS:{symbol}">{symbol}</a>\n</td>\n'
+            f'<td><a href="/wiki/{company.replace(" ", "_")}" title="{company}">{company}</a></td>\n'
+            f'<td>{rng.choice(_SECTORS)}</td>\n'
+            '<td>Industrial Conglomerates</td>\n'
+            '<td><a href="/wiki/Saint_Paul,_Minnesota" title="Saint Paul, Minnesota">Saint Paul, Minnesota</a></td>\n'
+            f'<td>{rng.randint(1957, 2024)}-03-04</td>\n'
+            f'<td>{rng.randint(1, 2000000):010d}</td>\n'
+            f'<td>{rng.randint(1850, 2020)}</td>\n'
+            '</tr>\n'
+        )
+    constituents = (
+        '<table class="wikitable sortable sticky-header" id="constituents">\n<tbody>'
+        '<tr>\n<th>Symbol</th>\n<th>Security</th>\n<th>GICS Sector</th>\n<th>GICS Sub-Industry</th>\n'
+        '<th>Headquarters Location</th>\n<th>Date added</th>\n<th>CIK</th>\n<th>Founded</th>\n</tr>\n'
+        + ''.join(rows) + '</tbody></table>\n'
+    )
+    changes = (
+        '<table class="wikitable sortable" id="changes">\n<tbody>'
+        + ''.join(f'<tr><td>June {i % 28 + 1}, 20{i % 24:02d}</td><td>{rng.choice(symbols)}</td>'
+                  f'<td>Added</td><td>{rng.choice(symbols)}</td><td>Removed</td><td>Market cap change.</td></tr>\n'
+                  for i in range(400))
+        + '</tbody></table>\n'
+    )
+    return (
+        '<!DOCTYPE html>\n<html lang="en"><head><meta charset="UTF-8"><title>List of S&amp;P 500 companies</title>\n'
+        + head + '</head>\n<body>\n<div id="content">' + _padding(rng, 'p', 20)
+        + constituents + _padding(rng, 'p', 10) + changes
+        + '<ol class="references">' + _padding(rng, 'li', 300, words=25) + '</ol>\n'
+        + '</div></body></html>\n'
+    )
+
+
+def yahoo_quote_page(symbol, price=None, seed=2):
+    """
+    HTML shaped like a Yahoo Finance quote page: large inline scripts, the price at the
+    position the scheduler's XPath expects (with its data-testid), and a long news feed.
+    """
+    price = symbol_price(symbol) if price is None else price
+    rng = random.Random(seed)
+    head = '<script>' + 'window.YAHOO.context={"quoteType":"EQUITY","exchange":"NMS"};' * 4000 + '</script>\n'
+    quote = (
+        '<div id="nimbus-app"><section><section><section><article>'
+        f'<section><div><h1>{symbol}</h1></div><div><div><section><div><section>'
+        f'<div><div><span class="base yf-ipw1h0" data-testid="qsp-price">{price:,.2f}</span></div>'
+        '<div><span data-testid="qsp-price-change">+1.23</span></div></div>'
+        '</section></div></section></div></div></section>'
+        '<section>' + _padding(rng, 'p', 50) + '</section>'
+        '</article></section></section></section></div>\n'
+    )
+    news = '<ul class="stream">' + _padding(rng, 'li', 1500, words=30) + '</ul>\n'
+    return (
+        '<!DOCTYPE html>\n<html lang="en-US"><head><meta charset="utf-8">'
+        f'<title>{symbol} Stock Price</title>\n' + head + '</head>\n<body>\n'
+        + quote + news + '</body></html>\n'
+    )
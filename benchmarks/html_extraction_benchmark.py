@@ -0,0 +1,152 @@
+"""
+Benchmark: parse time and peak memory of symbol and price extraction, before
+(BeautifulSoup html.parser tree / full lxml tree + absolute XPath) and after
+(workers.htmlExtraction streaming scanners).
+
+Uses the generated pages in benchmarks/fixtures.py unless saved pages are given:
+
+    python benchmarks/html_extraction_benchmark.py
+    python benchmarks/html_extraction_benchmark.py --wiki-html saved/wiki.html --yahoo-html saved/AAPL.html
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.measure import reset_peak_rss, status_kb  # noqa: E402
+from workers.htmlExtraction import PriceScanner, extract_company_symbols, iter_company_symbols, price_from_text  # noqa: E402
+
+CHUNK_SIZE = 16384  # Same chunk size the workers stream with
+
+
+def _chunks(text):
+    return (text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE))
+
+
+def wiki_bs4(page_html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(page_html, features="html.parser")
+    symbols = []
+    for table_row in soup.find(id="constituents").find_all("tr"):
+        td = table_row.find("td")
+        if td:
+            symbols.append(td.get_text(strip=True))
+    return symbols
+
+
+def wiki_scanner(page_html):
+    return extract_company_symbols(page_html)
+
+
+def wiki_streaming(page_html):
+    return list(iter_company_symbols(_chunks(page_html)))
+
+
+def yahoo_lxml(page_html):
+    from lxml import html
+    from workers.yahooFinanceWorkers import PRICE_XPATH
+    return price_from_text(html.fromstring(page_html).xpath(PRICE_XPATH)[0].text)
+
+
+def yahoo_streaming(page_html):
+    scanner = PriceScanner()
+    for chunk in _chunks(page_html):
+        if scanner.feed(chunk) is not None:
+            return price_from_text(scanner.price_text)
+    return None
+
+
+CASES = {
+    'wiki_bs4': ('wiki', wiki_bs4),
+    'wiki_scanner': ('wiki', wiki_scanner),
+    'wiki_streaming': ('wiki', wiki_streaming),
+    'yahoo_lxml': ('yahoo', yahoo_lxml),
+    'yahoo_streaming': ('yahoo', yahoo_streaming),
+}
+
+
+def load_pages(args):
+    if args.wiki_html:
+        with open(args.wiki_html, encoding='utf-8') as file:
+            wiki = file.read()
+    else:
+        wiki = fixtures.wikipedia_constituents_page()
+    if args.yahoo_html:
+        with open(args.yahoo_html, encoding='utf-8') as file:
+            yahoo = file.read()
+    else:
+        yahoo = fixtures.yahoo_quote_page('MMM')
+    return {'wiki': wiki, 'yahoo': yahoo}
+
+
+def child(case, page_path):
+    """
+    Run one case once in this (fresh) process and print the growth of peak RSS it caused.
+    The page is read from a file so generating it doesn't raise the peak beforehand.
+    """
+    with open(page_path, encoding='utf-8') as file:
+        page = file.read()
+    if case.startswith('wiki_bs4'):
+        import bs4  # noqa: F401  Keep import cost out of the measurement
+    elif case.startswith('yahoo_lxml'):
+        import lxml.html  # noqa: F401
+    reset_peak_rss()
+    before = status_kb('VmRSS')
+    CASES[case][1](page)
+    after = status_kb('VmHWM')
+    print(json.dumps({'peak_rss_kb': max(0, after - before)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--wiki-html', help='Saved Wikipedia constituents page')
+    parser.add_argument('--yahoo-html', help='Saved Yahoo Finance quote page')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case; the best is reported')
+    parser.add_argument('--child', nargs=2, metavar=('CASE', 'PAGE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    pages = load_pages(args)
+    page_paths = {}
+    for name, page in pages.items():
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.html', delete=False) as file:
+            file.write(page)
+            page_paths[name] = file.name
+    print(json.dumps({name: f'{len(page) / 1024:.0f} KiB' for name, page in pages.items()}))
+    results = {}
+    for case, (page_name, function) in CASES.items():
+        try:
+            result = function(pages[page_name])
+        except ImportError as e:
+            print(json.dumps({'case': case, 'skipped': str(e)}))
+            continue
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            function(pages[page_name])
+            timings.append(time.perf_counter() - start)
+        child_args = [sys.executable, os.path.abspath(__file__), '--child', case, page_paths[page_name]]
+        memory = json.loads(subprocess.run(child_args, capture_output=True, text=True, check=True).stdout)
+        results[case] = result
+        print(json.dumps({'case': case, 'best_ms': round(min(timings) * 1000, 3), **memory,
+                          'items': len(result) if isinstance(result, list) else result}))
+
+    for path in page_paths.values():
+        os.remove(path)
+
+    for old, new in (('wiki_bs4', 'wiki_scanner'), ('wiki_bs4', 'wiki_streaming'), ('yahoo_lxml', 'yahoo_streaming')):
+        if old in results and new in results and results[old] != results[new]:
+            print(f"❌ {new} disagrees with {old}")
+
+
+if __name__ == '__main__':
+    main()
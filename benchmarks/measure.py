@@ -0,0 +1,40 @@
+"""
+Process resource measurements shared by the benchmarks: peak RSS from /proc
+(resettable, unlike ru_maxrss) and CPU time.
+"""
+import resource
+
+
+def status_kb(field):
+    """
+    A memory field (VmRSS, VmHWM) of this process from /proc, in KiB; ru_maxrss where /proc is missing.
+    ru_maxrss is only a fallback because Linux carries the parent's peak over into a spawned child.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak_rss():
+    """
+    Reset this process's peak RSS (VmHWM) to its current RSS, where the kernel allows it.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def cpu_seconds():
+    """
+    User plus system CPU time of this process (all threads) and of its waited-for children.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
@@ -0,0 +1,281 @@
+"""
+Benchmark: end-to-end throughput, latency, CPU and peak memory of the wiki -> yahoo -> postgres
+pipeline, fully offline.
+
+The pipeline YAML is rewritten to scrape benchmarks/fixture_server.py (Wikipedia and Yahoo
+stand-ins with configurable latency, errors and 429s) and to write to a fresh SQLite file
+(or --database-url), then run in a child process so CPU time and peak RSS belong to the
+pipeline alone. One JSON result is printed, and optionally compared with a stored baseline:
+
+    python benchmarks/pipeline_benchmark.py --symbols 200 --latency 0.05 --throttle-rate 0.02
+    python benchmarks/pipeline_benchmark.py --stage YahooFinanceWorker --engine asyncio
+    python benchmarks/pipeline_benchmark.py --latency 0.05 --slow-rate 0.02 --slow-latency 5
+    python benchmarks/pipeline_benchmark.py --set YahooFinanceWorker.instances=16 \\
+        --set "YahooFinanceWorker.params.rate_limit={rate: 200, burst: 50, max_rate: 200}"
+    python benchmarks/pipeline_benchmark.py --save-baseline baseline.json
+    python benchmarks/pipeline_benchmark.py --baseline baseline.json --tolerance 0.15
+
+Latency percentiles are the upper bounds of workers.stageMetrics histogram buckets.
+"""
+import argparse
+import copy
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixture_server import FixtureServer  # noqa: E402
+from benchmarks.measure import cpu_seconds, reset_peak_rss, status_kb  # noqa: E402
+from pipeline_routing import output_queue_names  # noqa: E402
+
+DEFAULT_PIPELINE = os.path.join(ROOT, 'pipelines', 'wiki_yahoo_scrapper_pipeline.yaml')
+STAGE_ROLES = {  # Worker location -> what it needs pointed at the fixtures
+    'workers.wikiWorker': 'wiki',
+    'workers.yahooFinanceWorkers': 'yahoo',
+    'workers.postGresWorker': 'postgres',
+}
+STAGE_INPUTS = {'yahoo': 'symbols', 'postgres': 'rows'}  # FixtureSource item kind for a stage run in isolation
+PRICES_TABLE = 'CREATE TABLE IF NOT EXISTS prices (symbol TEXT, price REAL, extracted_time TIMESTAMP)'
+
+
+def _set_params(worker, params):
+    worker.setdefault('params', {}).update(params)
+    async_worker = worker.get('async') or {}
+    if async_worker.get('params') is not None:  # Replaces params under the asyncio engine, so patch it too
+        async_worker['params'].update(params)
+
+
+def _set_path(worker, dotted_key, value):
+    keys = dotted_key.split('.')
+    target = worker
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+def _isolate_stage(pipeline, stage_name, count):
+    """
+    Keep only stage_name, fed by a FixtureSource and drained by a DrainSink per output queue.
+    """
+    worker = next((worker for worker in pipeline['workers'] if worker['name'] == stage_name), None)
+    if worker is None:
+        raise SystemExit(f"No stage named {stage_name!r} in the pipeline")
+    workers = [worker]
+    input_queue = worker.get('input_queue')
+    if input_queue is not None:
+        kind = STAGE_INPUTS.get(STAGE_ROLES.get(worker['location']))
+        if kind is None:
+            raise SystemExit(f"Don't know which fixture items to feed {stage_name!r}")
+        workers.insert(0, {
+            'name': 'FixtureSource', 'location': 'benchmarks.fixture_stages', 'class': 'FixtureSource',
+            'output_queues': [input_queue], 'params': {'kind': kind, 'count': count},
+            'async': {'class': 'AsyncFixtureSource'},
+        })
+    output_queues = list(dict.fromkeys(output_queue_names(worker.get('output_queues'))))
+    for output_queue in output_queues:
+        workers.append({
+            'name': f'DrainSink-{output_queue}', 'location': 'benchmarks.fixture_stages', 'class': 'DrainSink',
+            'input_queue': output_queue, 'async': {'class': 'AsyncDrainSink'},
+        })
+    used_queues = {input_queue, *output_queues}
+    pipeline['queues'] = [queue for queue in pipeline['queues'] if queue['name'] in used_queues]
+    pipeline['workers'] = workers
+
+
+def offline_pipeline(pipeline, server, database_url, engine=None, stage=None, settings=()):
+    """
+    Copy of a pipeline definition pointed at the fixture server and database_url, with caches,
+    checkpoints and metrics reporters off.
+    :param stage: Name of a stage to run in isolation instead of the whole pipeline.
+    :param settings: 'Stage.dotted.key=value' overrides (value parsed as YAML) applied last.
+    """
+    pipeline = copy.deepcopy(pipeline)
+    pipeline['metrics'] = {}
+    pipeline.pop('checkpoint', None)  # Every benchmark run starts from scratch
+    if engine is not None:
+        pipeline['engine'] = engine
+    for worker in pipeline['workers']:
+        role = STAGE_ROLES.get(worker['location'])
+        if role == 'wiki':
+            worker['input_values'] = [server.wiki_url]
+            _set_params(worker, {'cache_ttl': 0})
+        elif role == 'yahoo':
+            _set_params(worker, {'base_url': server.yahoo_base_url, 'price_cache_ttl': 0})
+        elif role == 'postgres':
+            _set_params(worker, {'database_url': database_url})
+    if stage is not None:
+        _isolate_stage(pipeline, stage, len(server.symbols))
+    workers = {worker['name']: worker for worker in pipeline['workers']}
+    for setting in settings:
+        key, _, value = setting.partition('=')
+        stage_name, _, dotted_key = key.partition('.')
+        if stage_name not in workers or not dotted_key:
+            raise SystemExit(f"--set {setting!r}: expected Stage.key=value with one of {sorted(workers)}")
+        _set_path(workers[stage_name], dotted_key, yaml.safe_load(value))
+    return pipeline
+
+
+def child(pipeline_path, result_path, measured_stages):
+    """
+    Run the pipeline once in this (fresh) process and write its measurements to result_path.
+    """
+    from workers.stageMetrics import registry
+    from yaml_reader import create_pipeline_executor
+
+    executor = create_pipeline_executor(pipeline_path)
+    reset_peak_rss()
+    cpu_before = cpu_seconds()
+    started = time.perf_counter()
+    executor.start()
+    executor.join()
+    wall_seconds = time.perf_counter() - started
+    cpu = cpu_seconds() - cpu_before
+
+    stages = {}
+    for stage_name, stage in registry.snapshot().items():
+        stages[stage_name] = {
+            'items': stage['items'],
+            'errors': stage['errors'],
+            'items_per_second': stage['throughput_per_second'],
+            'p50_seconds': stage['latency']['p50'],
+            'p99_seconds': stage['latency']['p99'],
+            'wait_seconds': stage['wait_seconds'],
+        }
+    items = sum(stages.get(stage_name, {}).get('items', 0) for stage_name in measured_stages)
+    with open(result_path, 'w') as file:
+        json.dump({
+            'items': items,
+            'items_per_second': round(items / wall_seconds, 3),
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu, 3),
+            'peak_rss_kb': status_kb('VmHWM'),
+            'stages': stages,
+        }, file)
+
+
+def run_once(pipeline, measured_stages, verbose=False):
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline_path = os.path.join(directory, 'pipeline.yaml')
+        result_path = os.path.join(directory, 'result.json')
+        with open(pipeline_path, 'w') as file:
+            yaml.safe_dump(pipeline, file)
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', pipeline_path, result_path,
+                        ','.join(measured_stages)],
+                       cwd=ROOT, check=True, stdout=None if verbose else subprocess.DEVNULL)
+        with open(result_path) as file:
+            return json.load(file)
+
+
+def compare(result, baseline, tolerance):
+    """
+    Relative change of each metric against the baseline; a change worse than tolerance is a regression.
+    """
+    comparisons = []
+
+    def check(metric, current, previous, higher_is_better):
+        if not previous or current is None:
+            return
+        change = (current - previous) / previous
+        comparisons.append({
+            'metric': metric, 'baseline': previous, 'current': current, 'change': round(change, 3),
+            'regressed': change < -tolerance if higher_is_better else change > tolerance,
+        })
+
+    check('items_per_second', result['items_per_second'], baseline.get('items_per_second'), True)
+    for metric in ('wall_seconds', 'cpu_seconds', 'peak_rss_kb'):
+        check(metric, result[metric], baseline.get(metric), False)
+    for stage_name, stage in result['stages'].items():
+        baseline_stage = baseline.get('stages', {}).get(stage_name, {})
+        check(f'{stage_name}.items_per_second', stage['items_per_second'], baseline_stage.get('items_per_second'), True)
+        check(f'{stage_name}.p99_seconds', stage['p99_seconds'], baseline_stage.get('p99_seconds'), False)
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pipeline', default=DEFAULT_PIPELINE, help='Pipeline YAML to run')
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], help="Override the pipeline's engine")
+    parser.add_argument('--stage', help='Run only this stage, fed with generated items')
+    parser.add_argument('--set', action='append', default=[], metavar='STAGE.KEY=VALUE',
+                        help='Override a worker setting, e.g. YahooFinanceWorker.instances=8')
+    parser.add_argument('--database-url', help='Write to this database (its prices table must exist) instead of SQLite')
+    parser.add_argument('--symbols', type=int, default=503, help='Constituents on the fixture Wikipedia page')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every fixture response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of quote requests answered with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of quote requests answered with 429')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of responses delayed by --slow-latency')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='Extra seconds for the slow responses')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='Runs; the fastest is reported')
+    parser.add_argument('--baseline', help='Compare with this stored result; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative change before a regression')
+    parser.add_argument('--save-baseline', help='Store the result here')
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own output")
+    parser.add_argument('--child', nargs=3, metavar=('PIPELINE', 'RESULT', 'STAGES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.child[2].split(','))
+        return
+
+    with open(args.pipeline) as file:
+        pipeline = yaml.safe_load(file)
+    config = {key: getattr(args, key) for key in ('engine', 'stage', 'set', 'symbols', 'latency', 'jitter',
+                                                   'error_rate', 'throttle_rate', 'slow_rate', 'slow_latency', 'seed')}
+    config['pipeline'] = os.path.relpath(args.pipeline, ROOT)
+
+    runs = []
+    for _ in range(args.repeat):
+        server = FixtureServer(symbols=args.symbols, latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed,
+                               slow_rate=args.slow_rate, slow_latency=args.slow_latency).start()
+        with tempfile.TemporaryDirectory() as directory:
+            database_url = args.database_url
+            database_path = None
+            if database_url is None:
+                database_path = os.path.join(directory, 'prices.db')
+                with sqlite3.connect(database_path) as connection:
+                    connection.execute(PRICES_TABLE)
+                database_url = f'sqlite:///{database_path}'
+            run_pipeline = offline_pipeline(pipeline, server, database_url, engine=args.engine,
+                                            stage=args.stage, settings=args.set)
+            measured_stages = [args.stage] if args.stage else [
+                worker['name'] for worker in run_pipeline['workers'] if not worker.get('output_queues')]
+            result = run_once(run_pipeline, measured_stages, verbose=args.verbose)
+            if database_path is not None:
+                with sqlite3.connect(database_path) as connection:
+                    result['rows_written'] = connection.execute('SELECT COUNT(*) FROM prices').fetchone()[0]
+        server.stop()
+        result['server'] = server.stats()
+        runs.append(result)
+
+    result = {'config': config, **min(runs, key=lambda run: run['wall_seconds'])}
+    print(json.dumps(result, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('config') != config:
+            print(f"⚠️ Baseline was recorded with a different configuration: {baseline.get('config')}")
+        comparisons = compare(result, baseline, args.tolerance)
+        print(json.dumps({'comparison': comparisons}, indent=2))
+        regressions = [comparison['metric'] for comparison in comparisons if comparison['regressed']]
+        if regressions:
+            print(f"❌ Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
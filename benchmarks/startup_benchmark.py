@@ -0,0 +1,109 @@
+"""
+Benchmark: cold start of a pipeline run, the cost every scheduled (e.g. once a minute) run pays
+before doing useful work. Each measurement is a fresh interpreter:
+
+  - validate: `main.py --validate` (parse and schema-check the YAML, no worker imports)
+  - dry_run: `main.py --dry-run` (validate and import every worker class)
+  - ready: from process launch until every stage's workers are built and started
+  - first_row: from process launch until the sink stage has written its first rows
+
+The ready and first_row runs use the pipeline pointed at benchmarks/fixture_server.py and a
+fresh SQLite file, like pipeline_benchmark.py. Medians over --repeat runs are printed as JSON.
+
+    python benchmarks/startup_benchmark.py --repeat 10
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixture_server import FixtureServer  # noqa: E402
+from benchmarks.pipeline_benchmark import DEFAULT_PIPELINE, PRICES_TABLE, offline_pipeline  # noqa: E402
+
+
+def child(pipeline_path, result_path, sink_stage):
+    """
+    Build and start the pipeline in this (fresh) process, record when it was ready and when
+    the sink first wrote, then exit without waiting for the rest of the run.
+    """
+    from workers.stageMetrics import registry
+    from yaml_reader import YamlPipelineExecutor
+
+    executor = YamlPipelineExecutor(pipeline_path)
+    executor.process_pipeline()  # Builds and starts every worker
+    ready = time.time()
+    deadline = time.monotonic() + 60
+    while registry.stage(sink_stage).snapshot()['items'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    with open(result_path, 'w') as file:
+        json.dump({'ready': ready, 'first_row': time.time()}, file)
+    os._exit(0)  # The run itself isn't measured
+
+
+def timed(command):
+    started = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pipeline', default=DEFAULT_PIPELINE, help='Pipeline YAML to start')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes per measurement; the median is reported')
+    parser.add_argument('--child', nargs=3, metavar=('PIPELINE', 'RESULT', 'SINK'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    main_py = os.path.join(ROOT, 'main.py')
+    samples = {'validate': [], 'dry_run': [], 'ready': [], 'first_row': []}
+    for _ in range(args.repeat):
+        samples['validate'].append(timed([sys.executable, main_py, args.pipeline, '--validate']))
+        samples['dry_run'].append(timed([sys.executable, main_py, args.pipeline, '--dry-run']))
+
+    with open(args.pipeline) as file:
+        pipeline = yaml.safe_load(file)
+    server = FixtureServer().start()
+    try:
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as directory:
+                database_path = os.path.join(directory, 'prices.db')
+                with sqlite3.connect(database_path) as connection:
+                    connection.execute(PRICES_TABLE)
+                run_pipeline = offline_pipeline(pipeline, server, f'sqlite:///{database_path}')
+                sink = next(worker['name'] for worker in run_pipeline['workers'] if not worker.get('output_queues'))
+                pipeline_path = os.path.join(directory, 'pipeline.yaml')
+                result_path = os.path.join(directory, 'result.json')
+                with open(pipeline_path, 'w') as file:
+                    yaml.safe_dump(run_pipeline, file)
+                launched = time.time()
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--child', pipeline_path, result_path, sink],
+                               cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+                with open(result_path) as file:
+                    result = json.load(file)
+                samples['ready'].append(result['ready'] - launched)
+                samples['first_row'].append(result['first_row'] - launched)
+    finally:
+        server.stop()
+
+    print(json.dumps({
+        'pipeline': os.path.relpath(args.pipeline, ROOT),
+        'repeat': args.repeat,
+        **{f'{name}_seconds': round(statistics.median(values), 4) for name, values in samples.items()},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
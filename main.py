@@ -1,22 +1,87 @@
+import argparse  # Command-line options
+import signal  # SIGTERM stops a streaming run like Ctrl+C
+import sys  # Exit status for --validate, --dry-run and failed runs
 import time  # Import the time module for measuring execution duration
 
-from yaml_reader import YamlPipelineExecutor  # Import the YamlPipelineExecutor class from yaml_reader module
+from pipeline_plan import PipelinePlanError, load_plan  # Schema-checked pipeline definitions
+from yaml_reader import create_pipeline_executor  # Builds the executor for the pipeline's engine
+
+
+def check_pipeline(pipeline_location, dry_run=False):
+    """
+    Validate the pipeline without running it; with dry_run, also import every worker class.
+    Returns the exit status: 0 if the pipeline is usable, 1 otherwise.
+    """
+    try:
+        plan = load_plan(pipeline_location)
+    except PipelinePlanError as e:
+        print(f"❌ {e.path} is not a valid pipeline:")
+        for problem in e.problems:
+            print(f"   - {problem}")
+        return 1
+    problems = plan.resolve_all() if dry_run else []  # Imports are what a dry run adds to validation
+    print(plan.describe())
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ {pipeline_location} is valid" + (" and every worker class loads" if dry_run else ""))
+    return 1 if problems else 0
+
+
+def wait_for(executor):
+    """
+    Block until executor's thread exits. Waits on its finished event rather than in join(): an
+    interrupted join() marks the thread as finished while it is still running (CPython gh-90882),
+    an interrupted Event.wait() leaves nothing behind.
+    """
+    executor.finished.wait()
+    executor.join()  # Returns at once, run() is over
 
 
 def main():
     """
     Main function to execute the YAML pipeline and measure its execution time.
     """
-    pipeline_location = 'pipelines/wiki_yahoo_scrapper_pipeline.yaml'  # Path to the YAML pipeline configuration file
+    parser = argparse.ArgumentParser(description="Run a YAML pipeline.")
+    parser.add_argument('pipeline', nargs='?', default='pipelines/wiki_yahoo_scrapper_pipeline.yaml',
+                        help='Path to the YAML pipeline configuration file')
+    parser.add_argument('--run-id', help='Checkpointed run to resume (or start under this id)')
+    parser.add_argument('--stages', help='Comma-separated workers to run on this node (default: all of them)')
+    parser.add_argument('--broker', help="host:port of the queue broker, overriding the pipeline's 'broker' block")
+    parser.add_argument('--validate', action='store_true', help='Check the pipeline against the schema and exit')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and import every worker class, then exit')
+    args = parser.parse_args()
+    stages = args.stages.split(',') if args.stages else None  # The other nodes run the rest
+
+    pipeline_location = args.pipeline  # Path to the YAML pipeline configuration file
+    if args.validate or args.dry_run:
+        sys.exit(check_pipeline(pipeline_location, dry_run=args.dry_run))
+
     scraper_start_time = time.time()  # Record the start time before pipeline execution
-    yamlPipelineExecutor = YamlPipelineExecutor(pipeline_location=pipeline_location)  # Initialize the pipeline executor with the YAML file
+    try:
+        yamlPipelineExecutor = create_pipeline_executor(pipeline_location, run_id=args.run_id, stages=stages,
+                                                       broker=args.broker)  # Initialize the pipeline executor with the YAML file
+    except PipelinePlanError:
+        sys.exit(check_pipeline(pipeline_location))  # Lists every problem
 
     # yamlPipelineExecutor.process_pipeline()  # (Commented out) Alternative method to process the pipeline
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Raise KeyboardInterrupt on SIGTERM too
     yamlPipelineExecutor.start()  # Start the pipeline execution
+    try:
+        wait_for(yamlPipelineExecutor)  # Wait for every stage to drain
+    except KeyboardInterrupt:  # Streaming pipelines run until stopped
+        print("⏹️ Stopping: the sources stop polling and the items in flight drain")
+        if hasattr(yamlPipelineExecutor, 'stop'):  # The asyncio engine only runs batch pipelines
+            yamlPipelineExecutor.stop()
+        wait_for(yamlPipelineExecutor)
     end_time = time.time()  # Record the end time after pipeline execution
 
+    failed = yamlPipelineExecutor.failed_stages() if hasattr(yamlPipelineExecutor, 'failed_stages') else []
+    if failed:
+        print(f"❌ Failed in {round(end_time - scraper_start_time, 1)} seconds: {', '.join(failed)} stopped on an error")
+        sys.exit(1)
     print(f"✅ Finished in {round(end_time - scraper_start_time, 1)} seconds")  # Print the total execution time
 
 
 if __name__ == "__main__":
-    main()  # Run the main function if this script is executed directly
\ No newline at end of file
+    main()  # Run the main function if this script is executed directly
@@ -0,0 +1,88 @@
+import threading
+
+
+class AutoscaledStage:
+    """
+    Scaling bounds and state of one stage.
+    """
+    def __init__(self, name, input_queue, output_queues, min_instances, max_instances):
+        self.name = name
+        self.input_queue = input_queue
+        self.output_queues = output_queues
+        self.min_instances = min_instances
+        self.max_instances = max_instances
+        self.idle_intervals = 0  # Consecutive checks that found the input queue empty
+
+
+class PipelineAutoscaler(threading.Thread):
+    """
+    Grows and shrinks the worker pool of each autoscaled stage between its
+    min_instances and max_instances, checking every interval seconds:
+
+      - Downstream backpressure (a bounded output queue at least backpressure full)
+        or an input queue that stayed empty for idle_intervals checks: retire one worker.
+      - More than scale_up_backlog queued items per worker: add up to half as many
+        workers again (at least one), so a pool can double every two checks.
+
+    The autoscaler only decides; the executor owns the workers and the end-of-stream
+    bookkeeping, through the callbacks passed in.
+    """
+    def __init__(self, instances, scale_up, scale_down, interval=1.0, scale_up_backlog=2, idle_intervals=3,
+                 backpressure=0.8):
+        """
+        :param instances: Callable(stage name) -> current worker count, 0 once the stage's input has ended.
+        :param scale_up: Callable(stage name, count) that starts count more workers.
+        :param scale_down: Callable(stage name) that retires one worker.
+        :param interval: Seconds between checks.
+        :param scale_up_backlog: Queued items per worker above which the stage grows.
+        :param idle_intervals: Checks with an empty input queue before the stage shrinks.
+        :param backpressure: Fill fraction of a bounded output queue that counts as downstream backpressure.
+        """
+        super(PipelineAutoscaler, self).__init__(name='pipeline-autoscaler', daemon=True)
+        self._instances = instances
+        self._scale_up = scale_up
+        self._scale_down = scale_down
+        self._interval = interval
+        self._scale_up_backlog = scale_up_backlog
+        self._idle_intervals = idle_intervals
+        self._backpressure = backpressure
+        self._stages = []
+        self._stop_event = threading.Event()
+
+    def add_stage(self, name, input_queue, output_queues, min_instances, max_instances):
+        self._stages.append(AutoscaledStage(name, input_queue, output_queues, min_instances, max_instances))
+
+    def _is_backpressured(self, queue):
+        capacity = getattr(queue, 'capacity', queue.maxsize)  # PipelineQueue keeps it even when spilling
+        return capacity > 0 and queue.qsize() >= self._backpressure * capacity
+
+    def decide(self, stage):
+        """
+        Number of workers to add (positive) or retire (negative) for stage right now.
+        """
+        instances = self._instances(stage.name)
+        if instances == 0:  # Finished, or its input has ended: nothing left to scale
+            return 0
+        backlog = stage.input_queue.qsize()
+        stage.idle_intervals = stage.idle_intervals + 1 if backlog == 0 else 0
+        if any(self._is_backpressured(queue) for queue in stage.output_queues) or \
+                stage.idle_intervals >= self._idle_intervals:
+            if instances > stage.min_instances:
+                stage.idle_intervals = 0
+                return -1
+            return 0
+        if backlog > instances * self._scale_up_backlog and instances < stage.max_instances:
+            return min(stage.max_instances - instances, max(1, instances // 2))
+        return 0
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            for stage in self._stages:
+                change = self.decide(stage)
+                if change > 0:
+                    self._scale_up(stage.name, change)
+                elif change < 0:
+                    self._scale_down(stage.name)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,507 @@
+"""
+A small TCP queue broker, so the stages of one pipeline can run on several machines.
+
+QueueBroker holds named queues in memory and serves them over a line-delimited JSON
+protocol. Every node of a pipeline builds a RemoteQueue for each queue declared with
+'backend: broker'; the workers use it exactly like a PipelineQueue.
+
+  - Items are JSON; tuples, datetimes and price records/batches are tagged, so items
+    come out of the queue as the same Python types that went in.
+  - Delivery is at least once: get() leases an item to the connection that took it, and the
+    worker acknowledges it with task_done() once handled. Leases of a connection that drops,
+    or that aren't acknowledged within the queue's lease time, are requeued.
+  - End-of-stream spans nodes: every stage that writes to a queue registers as a producer
+    and reports when it has finished. Once the expected number of producers have registered
+    and all of them are done, the queue is closed, and when it has drained every consumer on
+    every node gets END_OF_STREAM. A node whose connection drops counts as finished, since
+    whatever it hadn't acknowledged goes to the nodes still running.
+
+Run a broker with `python pipeline_broker.py --host 0.0.0.0 --port 7650`.
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from queue import Empty, Full
+
+from pipeline_queues import CONTROL_MARKERS
+from workers.priceRecords import PriceBatch, PriceRecord
+from workers.queueWorkers import END_OF_STREAM
+
+DEFAULT_BROKER_PORT = 7650
+DEFAULT_LEASE = 60.0  # Seconds a consumer may hold an item before it is redelivered
+POLL_INTERVAL = 0.5  # Longest a blocking RemoteQueue.get() waits on the broker before checking its local markers
+NODE_ID = f"{socket.gethostname()}-{os.getpid()}"  # Tells apart the producers of one stage on different nodes
+
+
+def encode_item(item):
+    """
+    JSON-ready form of a queue item. Tuples, datetimes, PriceRecords and PriceBatches are
+    tagged so decode_item() can restore them.
+    """
+    if isinstance(item, PriceBatch):
+        return {'__price_batch__': item.columns()}
+    if isinstance(item, PriceRecord):
+        return {'__price_record__': [encode_item(value) for value in item]}
+    if isinstance(item, datetime):
+        return {'__datetime__': item.isoformat()}
+    if isinstance(item, tuple):
+        return {'__tuple__': [encode_item(value) for value in item]}
+    if isinstance(item, list):
+        return [encode_item(value) for value in item]
+    if isinstance(item, dict):
+        return {key: encode_item(value) for key, value in item.items()}
+    return item
+
+
+def decode_item(value):
+    """
+    Inverse of encode_item().
+    """
+    if isinstance(value, list):
+        return [decode_item(element) for element in value]
+    if isinstance(value, dict):
+        if '__datetime__' in value:
+            return datetime.fromisoformat(value['__datetime__'])
+        if '__tuple__' in value:
+            return tuple(decode_item(element) for element in value['__tuple__'])
+        if '__price_record__' in value:
+            return PriceRecord(*(decode_item(element) for element in value['__price_record__']))
+        if '__price_batch__' in value:
+            return PriceBatch.from_columns(value['__price_batch__'])
+        return {key: decode_item(element) for key, element in value.items()}
+    return value
+
+
+def parse_address(address):
+    """
+    (host, port) from 'host:port', 'host' or a {host, port} mapping.
+    """
+    if isinstance(address, dict):
+        return address.get('host', '127.0.0.1'), int(address.get('port', DEFAULT_BROKER_PORT))
+    host, _, port = str(address).rpartition(':')
+    if not host:
+        return port, DEFAULT_BROKER_PORT
+    return host, int(port)
+
+
+class BrokerQueue:
+    """
+    One queue held by the broker: pending items, leased items and the producers writing to it.
+    """
+    def __init__(self, name, maxsize=0, producers=1, lease=DEFAULT_LEASE):
+        """
+        :param name: Pipeline-qualified queue name.
+        :param maxsize: Capacity for pending items; 0 means unbounded. put() blocks while it is full.
+        :param producers: Producer registrations to expect before the queue may close, so a
+                          node that starts late doesn't find its queue already closed.
+        :param lease: Seconds before an unacknowledged item is redelivered.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.expected_producers = producers
+        self.lease = lease
+        self._items = deque()  # Encoded items waiting for a consumer
+        self._leases = {}  # delivery id -> (encoded item, connection id, expiry)
+        self._producers = set()  # Registered producers that haven't finished
+        self._registered = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.high_water_mark = 0
+        self.total_put = 0
+        self.redelivered = 0
+
+    def put(self, item, timeout=None):
+        """
+        :return: False if the queue stayed full for timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.maxsize > 0 and len(self._items) >= self.maxsize:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._items.append(item)
+            self.total_put += 1
+            self.high_water_mark = max(self.high_water_mark, len(self._items))
+            self._condition.notify_all()
+            return True
+
+    def get(self, delivery_id, connection_id, timeout=None):
+        """
+        Lease the oldest item to a connection.
+        :return: The item, None if timeout expired, or END_OF_STREAM once the queue is closed,
+                 drained and has no outstanding leases.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._items:
+                if self._closed and not self._leases:
+                    return END_OF_STREAM
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            item = self._items.popleft()
+            self._leases[delivery_id] = (item, connection_id, time.monotonic() + self.lease)
+            self._condition.notify_all()  # Room for a blocked put()
+            return item
+
+    def ack(self, delivery_id):
+        with self._condition:
+            if self._leases.pop(delivery_id, None) is not None and self._closed and not self._leases:
+                self._condition.notify_all()  # Consumers waiting for the end can have it now
+
+    def requeue(self, connection_id=None, now=None):
+        """
+        Put back, at the front, items leased to connection_id (a dropped consumer) or,
+        with now, items whose lease expired before it.
+        """
+        with self._condition:
+            expired = [delivery_id for delivery_id, (_, owner, expiry) in self._leases.items()
+                       if owner == connection_id or (now is not None and expiry <= now)]
+            for delivery_id in reversed(expired):  # Keep their original order at the front
+                self._items.appendleft(self._leases.pop(delivery_id)[0])
+            if expired:
+                self.redelivered += len(expired)
+                self._condition.notify_all()
+
+    def register_producer(self, producer):
+        with self._condition:
+            self._producers.add(producer)
+            self._registered += 1
+
+    def producer_done(self, producer):
+        with self._condition:
+            self._producers.discard(producer)
+            if not self._producers and self._registered >= self.expected_producers:
+                self._closed = True
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': len(self._items),
+                'maxsize': self.maxsize,
+                'leased': len(self._leases),
+                'high_water_mark': self.high_water_mark,
+                'total_put': self.total_put,
+                'redelivered': self.redelivered,
+                'producers': len(self._producers),
+                'closed': self._closed,
+            }
+
+
+class _BrokerRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one client connection: one JSON request per line, one JSON response per line.
+    """
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection_id = id(self)
+        touched = set()  # Queues this connection took leases from
+        producers = set()  # (queue, producer) registered through this connection
+        try:
+            for line in self.rfile:
+                request = json.loads(line)
+                try:
+                    response = self.server.handle_request_message(request, connection_id)
+                except Exception as e:  # Reported to the client, the connection stays up
+                    response = {'error': f"{type(e).__name__}: {e}"}
+                if request.get('op') == 'get':
+                    touched.add(request['queue'])
+                elif request.get('op') == 'register_producer':
+                    producers.add((request['queue'], request['producer']))
+                self.wfile.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            for name in touched:  # A consumer that goes away returns what it hadn't acknowledged
+                self.server.queue(name).requeue(connection_id=connection_id)
+            for name, producer in producers:  # A node that goes away no longer holds its queues open
+                self.server.queue(name).producer_done(producer)
+
+
+class QueueBroker(socketserver.ThreadingTCPServer):
+    """
+    TCP server holding the broker-backed queues of any number of pipelines, namespaced by
+    pipeline name. One thread per client connection; each worker thread of a node has its
+    own connection, so blocking gets don't hold each other up.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_BROKER_PORT, reap_interval=1.0):
+        """
+        :param host: Interface to listen on.
+        :param port: Port to listen on; 0 picks a free one (see address).
+        :param reap_interval: Seconds between checks for expired leases.
+        """
+        super(QueueBroker, self).__init__((host, port), _BrokerRequestHandler)
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._delivery_ids = itertools.count(1)
+        self._reap_interval = reap_interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def queue(self, name, **settings):
+        """
+        The named queue, created with settings on first use (later settings are ignored).
+        """
+        with self._lock:
+            if name not in self._queues:
+                self._queues[name] = BrokerQueue(name, **settings)
+            return self._queues[name]
+
+    def handle_request_message(self, request, connection_id):
+        op = request['op']
+        if op == 'declare':
+            self.queue(request['queue'], maxsize=request.get('maxsize', 0),
+                       producers=request.get('producers', 1), lease=request.get('lease', DEFAULT_LEASE))
+            return {'ok': True}
+        queue = self.queue(request['queue'])
+        if op == 'put':
+            return {'ok': queue.put(request['item'], request.get('timeout'))}
+        if op == 'get':
+            delivery_id = next(self._delivery_ids)
+            item = queue.get(delivery_id, connection_id, request.get('timeout'))
+            if item is None:
+                return {'empty': True}
+            if item == END_OF_STREAM:
+                return {'end': True}
+            return {'id': delivery_id, 'item': item}
+        if op == 'ack':
+            queue.ack(request['id'])
+            return {'ok': True}
+        if op == 'register_producer':
+            queue.register_producer(request['producer'])
+            return {'ok': True}
+        if op == 'producer_done':
+            queue.producer_done(request['producer'])
+            return {'ok': True}
+        if op == 'stats':
+            return queue.stats()
+        raise ValueError(f"Unknown broker operation {op!r}")
+
+    def _reap_leases(self):
+        while not self._stop_event.wait(self._reap_interval):
+            now = time.monotonic()
+            with self._lock:
+                queues = list(self._queues.values())
+            for queue in queues:
+                queue.requeue(now=now)
+
+    def start(self):
+        """
+        Serve in background threads (for embedding the broker in a node or a benchmark).
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='queue-broker', daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._reap_leases, name='queue-broker-leases', daemon=True).start()
+        return self
+
+    def serve(self):
+        """
+        Serve in the calling thread until interrupted.
+        """
+        threading.Thread(target=self._reap_leases, name='queue-broker-leases', daemon=True).start()
+        self.serve_forever()
+
+    def stop(self):
+        self._stop_event.set()
+        self.shutdown()
+        self.server_close()
+
+
+class BrokerConnection:
+    """
+    One client connection to a QueueBroker. Not thread-safe: RemoteQueue keeps one per thread.
+    """
+    def __init__(self, address):
+        self._socket = socket.create_connection(address)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile('rb')
+
+    def request(self, op, **fields):
+        """
+        Send one request and return the broker's response.
+        :raises RuntimeError: If the broker rejected the request.
+        :raises ConnectionError: If the broker closed the connection.
+        """
+        self._socket.sendall(json.dumps(dict(fields, op=op), separators=(',', ':')).encode('utf-8') + b'\n')
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Queue broker closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f"Queue broker: {response['error']}")
+        return response
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+class RemoteQueue:
+    """
+    PipelineQueue stand-in for a queue held by a QueueBroker, shared by every node that runs
+    the same pipeline (queues are named '<pipeline>/<queue>' on the broker).
+
+    Each item taken with get() must be acknowledged with task_done() once handled, by the same
+    thread; anything not acknowledged is redelivered. The END_OF_STREAM and RETIRE markers the
+    executor puts never leave this node: they are handed to this node's consumers first, so
+    retiring a worker doesn't stop a consumer elsewhere. The end of the stream itself comes
+    from the broker once every producer of the queue, on every node, has finished.
+    """
+    def __init__(self, name, address, pipeline, maxsize=0, producers=1, lease=DEFAULT_LEASE):
+        """
+        :param name: Queue name from the pipeline YAML.
+        :param address: (host, port) of the broker.
+        :param pipeline: Pipeline name, shared by every node of the pipeline.
+        :param maxsize: Capacity on the broker; 0 means unbounded.
+        :param producers: Producer stages (across all nodes) to wait for before the queue can end.
+        :param lease: Seconds a consumer may hold an item before it is redelivered.
+        """
+        self.name = name
+        self.maxsize = self.capacity = maxsize
+        self.overflow = 'block'
+        self._address = address
+        self._key = f"{pipeline}/{name}"
+        self._local = threading.local()  # Connection and unacknowledged delivery ids of each thread
+        self._connections = []
+        self._lock = threading.Lock()
+        self._markers = deque()  # Control markers for this node's consumers
+        self._request('declare', maxsize=maxsize, producers=producers, lease=lease)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = BrokerConnection(self._address)
+            self._local.deliveries = deque()
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _request(self, op, **fields):
+        return self._connection().request(op, queue=self._key, **fields)
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put an item on the broker, waiting while the queue is full.
+        :raises queue.Full: If the queue is still full after timeout (or at once when not blocking).
+        """
+        if item in CONTROL_MARKERS:
+            with self._lock:
+                self._markers.append(item)
+            return
+        if not self._request('put', item=encode_item(item), timeout=timeout if block else 0)['ok']:
+            raise Full
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def _take_marker(self):
+        with self._lock:
+            return self._markers.popleft() if self._markers else None
+
+    def get(self, block=True, timeout=None):
+        """
+        Take the next item, leasing it to this thread until task_done().
+        :raises queue.Empty: If no item arrived within timeout (or at once when not blocking).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            marker = self._take_marker()
+            if marker is not None:
+                return marker
+            wait = 0 if not block else POLL_INTERVAL
+            if block and deadline is not None:
+                wait = max(0.0, min(wait, deadline - time.monotonic()))
+            response = self._request('get', timeout=wait)
+            if 'end' in response:
+                return END_OF_STREAM
+            if 'id' in response:
+                self._local.deliveries.append(response['id'])
+                return decode_item(response['item'])
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        """
+        Acknowledge the oldest item this thread took and hasn't acknowledged yet.
+        :raises ValueError: If this thread holds no unacknowledged item.
+        """
+        deliveries = getattr(self._local, 'deliveries', None)
+        if not deliveries:
+            raise ValueError('task_done() called too many times')
+        self._request('ack', id=deliveries.popleft())
+
+    def register_producer(self, stage_name):
+        """
+        Announce that stage_name writes to this queue from this node.
+        """
+        self._request('register_producer', producer=f"{NODE_ID}/{stage_name}")
+
+    def producer_done(self, stage_name):
+        """
+        Report that stage_name has finished on this node; the queue ends when every producer has.
+        """
+        self._request('producer_done', producer=f"{NODE_ID}/{stage_name}")
+
+    def qsize(self):
+        return self._request('stats')['size']
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def stats(self):
+        """
+        Broker-side size and counters, in the shape of PipelineQueue.stats().
+        """
+        stats = self._request('stats')
+        stats.update(name=self.name, overflow=self.overflow, backend='broker', dropped=0, spilled=0)
+        return stats
+
+    def close(self):
+        """
+        Close every connection; items still leased through them are redelivered.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a queue broker for distributed pipelines.")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on (0.0.0.0 for every interface)')
+    parser.add_argument('--port', type=int, default=DEFAULT_BROKER_PORT)
+    args = parser.parse_args()
+    broker = QueueBroker(args.host, args.port)
+    print(f"📡 Queue broker listening on {broker.address[0]}:{broker.address[1]}")
+    try:
+        broker.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.server_close()
+
+
+if __name__ == "__main__":
+    main()
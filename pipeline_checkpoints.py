@@ -0,0 +1,139 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+DEFAULT_CHECKPOINT_PATH = os.path.join('.cache', 'checkpoints.sqlite3')
+
+
+def new_run_id():
+    """
+    A fresh run id: start time plus process id, readable and unique enough for one machine.
+    """
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+def checkpoint_key(item):
+    """
+    Key an input item is checkpointed under: strings (symbols, URLs) as they are, anything else by repr().
+    """
+    return item if isinstance(item, str) else repr(item)
+
+
+class CheckpointStore:
+    """
+    SQLite record of the items each stage of a run has completed, with the outputs it
+    emitted for them, so a restarted run can skip finished items and replay their
+    outputs instead of redoing the work.
+
+    The database runs in WAL mode with synchronous=NORMAL: every completed item is
+    committed on its own, which survives the process dying (not a power cut) without
+    an fsync per item.
+    """
+    def __init__(self, path, run_id):
+        """
+        :param path: SQLite file, created (with its directory) if missing.
+        :param run_id: Run whose checkpoints are read and written.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)  # Shared by the workers under _lock
+        with self._lock:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS runs ('
+                'run_id TEXT PRIMARY KEY, pipeline TEXT, started_at REAL, finished_at REAL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS completed_items ('
+                'run_id TEXT, stage TEXT, item_key TEXT, outputs BLOB, completed_at REAL, '
+                'PRIMARY KEY (run_id, stage, item_key))'
+            )
+            self._connection.commit()
+
+    def begin_run(self, pipeline):
+        """
+        Register the run, or resume it if it already exists.
+        :param pipeline: Identifies the pipeline (its path); resuming a run with another one is refused.
+        :return: True when resuming an existing run.
+        :raises ValueError: If the run id belongs to a different pipeline.
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT pipeline FROM runs WHERE run_id = ?', (self.run_id,)).fetchone()
+            if row is None:
+                self._connection.execute('INSERT INTO runs (run_id, pipeline, started_at) VALUES (?, ?, ?)',
+                                         (self.run_id, pipeline, time.time()))
+                self._connection.commit()
+                return False
+        if row[0] != pipeline:
+            raise ValueError(f"Run {self.run_id!r} belongs to pipeline {row[0]!r}, not {pipeline!r}")
+        return True
+
+    def finish_run(self):
+        with self._lock:
+            self._connection.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), self.run_id))
+            self._connection.commit()
+
+    def completed_items(self, stage_name):
+        """
+        {item key: outputs} for everything stage_name has completed in this run.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT item_key, outputs FROM completed_items WHERE run_id = ? AND stage = ?',
+                (self.run_id, stage_name)
+            ).fetchall()
+        return {item_key: pickle.loads(outputs) for item_key, outputs in rows}
+
+    def record(self, stage_name, item_key, outputs):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO completed_items (run_id, stage, item_key, outputs, completed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.run_id, stage_name, item_key, pickle.dumps(outputs), time.time())
+            )
+            self._connection.commit()
+
+    def stage(self, stage_name):
+        return StageCheckpoint(self, stage_name)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class StageCheckpoint:
+    """
+    One stage's view of a CheckpointStore, shared by all of the stage's workers.
+    Completed items are loaded once, so lookups never touch the database.
+    """
+    def __init__(self, store, stage_name):
+        self._store = store
+        self._stage_name = stage_name
+        self._completed = store.completed_items(stage_name)
+        self._lock = threading.Lock()
+        self.replayed = 0  # Items skipped because an earlier attempt completed them
+
+    def lookup(self, item):
+        """
+        Outputs recorded for item, or None if it still has to be processed.
+        """
+        with self._lock:
+            outputs = self._completed.get(checkpoint_key(item))
+            if outputs is not None:
+                self.replayed += 1
+            return outputs
+
+    def record(self, item, outputs):
+        """
+        Mark item as completed, with the outputs it produced (a list, possibly empty).
+        """
+        key = checkpoint_key(item)
+        self._store.record(self._stage_name, key, outputs)
+        with self._lock:
+            self._completed[key] = outputs
@@ -0,0 +1,314 @@
+import json  # One JSON document per report
+import os  # Atomic replace of the Prometheus text file
+import sys  # Stdout and sys._current_frames() for the sampling profiler
+import tempfile  # Temporary file next to the Prometheus target
+import threading  # Reporter and profiler threads
+import time  # Report timestamps
+from collections import Counter  # Sample counts per frame
+
+from workers.stageMetrics import registry
+
+
+class JsonLogReporter:
+    """
+    Writes every metrics snapshot as a single JSON line, to stdout or appended to a file.
+    """
+    def __init__(self, path=None):
+        """
+        :param path: File to append to. None writes to stdout.
+        """
+        self._path = path
+
+    def report(self, snapshot):
+        line = json.dumps(snapshot, default=str)
+        if self._path is None:
+            print(line, flush=True)
+            return
+        with open(self._path, 'a') as file:
+            file.write(line + '\n')
+
+
+class PrometheusTextFileReporter:
+    """
+    Rewrites a Prometheus text-format file on every report, for node_exporter's
+    textfile collector (or anything else that scrapes a file).
+    """
+    def __init__(self, path):
+        """
+        :param path: Target file, replaced atomically so scrapers never read a partial file.
+        """
+        self._path = path
+
+    @staticmethod
+    def _histogram_lines(name, labels, histogram):
+        lines = []
+        cumulative = 0
+        for bucket, count in histogram['buckets'].items():
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram["sum"]}')
+        lines.append(f'{name}_count{{{labels}}} {histogram["count"]}')
+        return lines
+
+    def render(self, snapshot):
+        lines = [
+            '# TYPE pipeline_stage_items_total counter',
+            '# TYPE pipeline_stage_errors_total counter',
+            '# TYPE pipeline_stage_throughput_per_second gauge',
+            '# TYPE pipeline_stage_item_seconds histogram',
+            '# TYPE pipeline_stage_wait_seconds histogram',
+        ]
+        for stage_name, stage in snapshot['stages'].items():
+            labels = f'stage="{stage_name}"'
+            lines.append(f'pipeline_stage_items_total{{{labels}}} {stage["items"]}')
+            lines.append(f'pipeline_stage_errors_total{{{labels}}} {stage["errors"]}')
+            lines.append(f'pipeline_stage_throughput_per_second{{{labels}}} {stage["throughput_per_second"]}')
+            lines.extend(self._histogram_lines('pipeline_stage_item_seconds', labels, stage['latency']))
+            for kind, histogram in stage['waits'].items():
+                lines.extend(self._histogram_lines('pipeline_stage_wait_seconds', f'{labels},kind="{kind}"', histogram))
+        lines.append('# TYPE pipeline_stage_live_workers gauge')
+        for stage_name, alive in snapshot['live_workers'].items():
+            lines.append(f'pipeline_stage_live_workers{{stage="{stage_name}"}} {alive}')
+        lines.append('# TYPE pipeline_queue_size gauge')
+        lines.append('# TYPE pipeline_queue_high_water_mark gauge')
+        for queue in snapshot['queues']:
+            labels = f'queue="{queue["name"]}"'
+            lines.append(f'pipeline_queue_size{{{labels}}} {queue["size"]}')
+            if 'high_water_mark' in queue:
+                lines.append(f'pipeline_queue_high_water_mark{{{labels}}} {queue["high_water_mark"]}')
+        lines.append('# TYPE pipeline_rate_limiter_rate gauge')
+        for host, limiter in snapshot['rate_limiters'].items():
+            lines.append(f'pipeline_rate_limiter_rate{{host="{host}"}} {limiter["rate"]}')
+        lines.append('# TYPE pipeline_hedged_requests_total counter')
+        lines.append('# TYPE pipeline_hedge_delay_seconds gauge')
+        for host, hedger in snapshot.get('hedging', {}).items():
+            labels = f'host="{host}"'
+            for kind in ('requests', 'hedges', 'hedge_wins', 'timeouts'):
+                lines.append(f'pipeline_hedged_requests_total{{{labels},kind="{kind}"}} {hedger[kind]}')
+            if hedger['hedge_delay'] is not None:
+                lines.append(f'pipeline_hedge_delay_seconds{{{labels}}} {hedger["hedge_delay"]}')
+        lines.append('# TYPE pipeline_price_age_seconds gauge')
+        lines.append('# TYPE pipeline_price_symbols gauge')
+        lines.append('# TYPE pipeline_price_changes_total counter')
+        for stage_name, freshness in snapshot.get('freshness', {}).items():
+            labels = f'stage="{stage_name}"'
+            for quantile, key in (('0.5', 'age_p50'), ('0.95', 'age_p95'), ('1', 'age_max')):
+                if freshness[key] is not None:
+                    lines.append(f'pipeline_price_age_seconds{{{labels},quantile="{quantile}"}} {freshness[key]}')
+            lines.append(f'pipeline_price_symbols{{{labels}}} {freshness["symbols"]}')
+            if 'stale' in freshness:
+                lines.append(f'pipeline_price_symbols{{{labels},state="stale"}} {freshness["stale"]}')
+            lines.append(f'pipeline_price_changes_total{{{labels},changed="true"}} {freshness["changed"]}')
+            lines.append(f'pipeline_price_changes_total{{{labels},changed="false"}} {freshness["suppressed"]}')
+        return '\n'.join(lines) + '\n'
+
+    def report(self, snapshot):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as file:
+            file.write(self.render(snapshot))
+        os.replace(temporary_path, self._path)
+
+
+class SnapshotReporter:
+    """
+    Overwrites a JSON file with the latest snapshot (handy for 'watch cat' during a run).
+    """
+    def __init__(self, path):
+        self._path = path
+
+    def report(self, snapshot):
+        temporary_path = f"{self._path}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(snapshot, file, indent=2, default=str)
+        os.replace(temporary_path, self._path)
+
+
+REPORTERS = {
+    'json': JsonLogReporter,
+    'prometheus': PrometheusTextFileReporter,
+    'snapshot': SnapshotReporter,
+}
+
+
+def build_reporters(reporters_config):
+    """
+    Build reporters from the pipeline's metrics.reporters list, e.g.
+    [{'type': 'json'}, {'type': 'prometheus', 'path': 'metrics/pipeline.prom'}].
+    """
+    reporters = []
+    for reporter_config in reporters_config or []:
+        reporter_config = dict(reporter_config)
+        reporter_type = reporter_config.pop('type')
+        if reporter_type not in REPORTERS:
+            raise ValueError(f"Unknown metrics reporter {reporter_type!r}, expected one of {sorted(REPORTERS)}")
+        reporters.append(REPORTERS[reporter_type](**reporter_config))
+    return reporters
+
+
+class StageSamplingProfiler(threading.Thread):
+    """
+    Low-overhead sampling profiler: every interval it looks at the current frame of each
+    thread bound to a stage (see workers.stageMetrics.bind_stage) and counts where it is,
+    so hot spots are reported per stage without instrumenting any code.
+
+    Asyncio stages share one thread and are not bound, so they are not sampled.
+    """
+    def __init__(self, interval=0.01, depth=1):
+        """
+        :param interval: Seconds between samples.
+        :param depth: Number of innermost frames that make up one sample key.
+        """
+        super(StageSamplingProfiler, self).__init__(name='stage-profiler', daemon=True)
+        self._interval = interval
+        self._depth = depth
+        self._samples = {}  # stage name -> Counter of frame keys
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def _frame_key(self, frame):
+        parts = []
+        while frame is not None and len(parts) < self._depth:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno}:{code.co_name}")
+            frame = frame.f_back
+        return ' <- '.join(parts)
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            thread_stages = registry.thread_stages()
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stage_name in thread_stages.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self._samples.setdefault(stage_name, Counter())[self._frame_key(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+    def top(self, limit=5):
+        """
+        Most sampled frames per stage: {stage: [[frame, share of samples], ...]}.
+        """
+        with self._lock:
+            top_frames = {}
+            for stage_name, samples in self._samples.items():
+                total = sum(samples.values())
+                top_frames[stage_name] = [[frame, round(count / total, 3)] for frame, count in samples.most_common(limit)]
+            return top_frames
+
+
+class MetricsReporterThread(threading.Thread):
+    """
+    Calls collect() every interval seconds and hands the snapshot to every reporter,
+    plus one final report when stopped so short runs are always captured.
+
+    Without reporters it still wakes up every interval to call sample() (e.g. to record
+    queue depths), so the depth history covers the whole run, not just its end.
+    """
+    def __init__(self, collect, reporters, interval=5.0, sample=None):
+        """
+        :param collect: Callable returning the current metrics snapshot.
+        :param reporters: Objects with a report(snapshot) method (possibly none).
+        :param interval: Seconds between reports.
+        :param sample: Callable run every interval instead of collect() when there are no reporters
+                       (collect() is expected to take the same sample).
+        """
+        super(MetricsReporterThread, self).__init__(name='metrics-reporter', daemon=True)
+        self._collect = collect
+        self.reporters = reporters
+        self._interval = interval
+        self._sample = sample
+        self._stop_event = threading.Event()
+
+    def report(self):
+        if not self.reporters:
+            if self._sample is not None:
+                self._sample()
+            return
+        snapshot = self._collect()
+        for reporter in self.reporters:
+            try:
+                reporter.report(snapshot)
+            except Exception as error:  # A broken reporter must not take the pipeline down
+                print(f"⚠️ Metrics reporter {type(reporter).__name__} failed: {error!r}")
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            self.report()
+
+    def stop(self):
+        """
+        Stop the periodic reports and write the final one (just a last sample without reporters).
+        """
+        self._stop_event.set()
+        self.join()
+        self.report()
+
+
+def format_stage_summary(snapshot):
+    """
+    One compact line per stage for the end-of-run console summary.
+    """
+    lines = []
+    for stage_name, stage in snapshot['stages'].items():
+        latency = stage['latency']
+        waits = ' '.join(f"{kind}={seconds:.2f}s" for kind, seconds in stage['wait_seconds'].items() if seconds)
+        lines.append(
+            f"[metrics] {stage_name}: {stage['items']} items, {stage['errors']} errors, "
+            f"{stage['throughput_per_second']}/s, p50={latency['p50']} p99={latency['p99']}"
+            + (f", waits {waits}" if waits else '')
+        )
+    for queue in snapshot['queues']:
+        lines.append(f"[queue] {queue}")
+    for stage_name, freshness in snapshot.get('freshness', {}).items():
+        lines.append(
+            f"[freshness] {stage_name}: {freshness['symbols']} symbols, age p50={freshness['age_p50']}s "
+            f"p95={freshness['age_p95']}s max={freshness['age_max']}s, {freshness['changed']} changed, "
+            f"{freshness['suppressed']} unchanged" + (f", {freshness['stale']} stale" if 'stale' in freshness else '')
+        )
+    for host, hedger in snapshot.get('hedging', {}).items():
+        lines.append(
+            f"[hedging] {host}: {hedger['requests']} requests, {hedger['hedges']} hedged "
+            f"({hedger['hedge_wins']} answered first) after {hedger['hedge_delay']}s, {hedger['timeouts']} past the deadline"
+        )
+    for stage_name, frames in snapshot.get('profile', {}).items():
+        lines.append(f"[profile] {stage_name}: " + ', '.join(f"{frame} ({share:.0%})" for frame, share in frames))
+    return '\n'.join(lines)
+
+
+def sample_queue_depths(queues):
+    """
+    Add the current size of every queue to the registry's depth history.
+    :param queues: List of queue stats dicts (name and size at least).
+    """
+    registry.record_queue_depths({queue['name']: queue['size'] for queue in queues})
+
+
+def collect_snapshot(queues, live_workers, profiler=None):
+    """
+    Assemble a full metrics snapshot.
+    :param queues: List of queue stats dicts (name and size at least).
+    :param live_workers: {stage name: live worker count}.
+    :param profiler: Optional StageSamplingProfiler whose top frames are included.
+    """
+    from workers.rateLimiter import rate_limiter_snapshots  # Imported lazily, only Yahoo stages create limiters
+    from workers.priceFreshness import freshness_snapshots  # Likewise, only Yahoo stages track prices
+    from workers.requestHedging import hedger_snapshots  # And only they hedge requests
+
+    sample_queue_depths(queues)
+    snapshot = {
+        'timestamp': time.time(),
+        'stages': registry.snapshot(),
+        'live_workers': live_workers,
+        'queues': queues,
+        'queue_depth_history': [[round(timestamp, 3), depths] for timestamp, depths in list(registry.queue_depths)[-12:]],
+        'rate_limiters': rate_limiter_snapshots(),
+        'freshness': freshness_snapshots(),
+        'hedging': hedger_snapshots(),
+    }
+    if profiler is not None:
+        snapshot['profile'] = profiler.top()
+    return snapshot
@@ -0,0 +1,260 @@
+import difflib
+import functools
+import importlib
+import os
+import threading
+
+import yaml
+
+from pipeline_metrics import REPORTERS
+from pipeline_queues import PipelineQueue
+from pipeline_routing import parse_output_queues
+
+ENGINES = ('threads', 'asyncio')
+MODES = ('batch', 'streaming')
+QUEUE_BACKENDS = ('memory', 'broker')
+WORKER_BACKENDS = ('thread', 'process')
+PER_PROCESS_PARAMS = ('rate_limit', 'hedging')  # Shared through in-process registries, so one copy per process
+
+_NUMBER = (int, float)
+# Allowed keys of each block of a pipeline YAML, with the types their values may have
+PIPELINE_SCHEMA = {
+    'name': str, 'engine': str, 'mode': str, 'broker': (dict, str), 'checkpoint': dict, 'autoscaling': dict,
+    'metrics': dict, 'queues': list, 'workers': list,
+}
+QUEUE_SCHEMA = {
+    'name': str, 'description': str, 'maxsize': int, 'overflow': str, 'backend': str,
+    'producers': int, 'lease': _NUMBER,
+}
+WORKER_SCHEMA = {
+    'name': str, 'description': str, 'location': str, 'class': str, 'instances': int,
+    'min_instances': int, 'max_instances': int, 'input_queue': str, 'output_queues': list,
+    'input_values': list, 'params': dict, 'backend': str, 'async': dict, 'dead_letter_queue': str,
+}
+ASYNC_WORKER_SCHEMA = {'location': str, 'class': str, 'instances': int, 'params': dict}
+ROUTE_SCHEMA = {'route': str, 'queues': list, 'key': int}
+BLOCK_SCHEMAS = {
+    'broker': {'host': str, 'port': int},
+    'checkpoint': {'path': str},
+    'autoscaling': {'interval': _NUMBER, 'scale_up_backlog': _NUMBER, 'idle_intervals': int, 'backpressure': _NUMBER},
+    'metrics': {'interval': _NUMBER, 'profile': bool, 'profile_interval': _NUMBER, 'reporters': list},
+}
+
+_SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)  # libyaml parses several times faster when available
+_plans = {}  # (path, mtime, size) -> PipelinePlan, so one process parses and validates a file once
+_plans_lock = threading.Lock()
+
+
+class PipelinePlanError(ValueError):
+    """
+    A pipeline YAML that doesn't match the schema. problems lists every issue found.
+    """
+    def __init__(self, path, problems):
+        self.path = path
+        self.problems = problems
+        super(PipelinePlanError, self).__init__(f"{path}: " + "; ".join(problems))
+
+
+def _type_names(types):
+    types = types if isinstance(types, tuple) else (types,)
+    return ' or '.join({dict: 'mapping', list: 'list', str: 'string'}.get(kind, kind.__name__) for kind in types)
+
+
+def _check_keys(problems, where, mapping, schema, required=()):
+    """
+    Report unknown keys (with the closest known one, for typos), wrongly typed values and missing keys.
+    """
+    if not isinstance(mapping, dict):
+        problems.append(f"{where}: expected a mapping, got {type(mapping).__name__}")
+        return False
+    for key, value in mapping.items():
+        if key not in schema:
+            close = difflib.get_close_matches(str(key), schema, n=1)
+            problems.append(f"{where}: unknown key {key!r}" + (f", did you mean {close[0]!r}?" if close else ""))
+            continue
+        types = schema[key] if isinstance(schema[key], tuple) else (schema[key],)
+        if value is None:  # An empty value, same as leaving the key out
+            continue
+        if (isinstance(value, bool) and bool not in types) or not isinstance(value, types):
+            problems.append(f"{where}: {key} should be a {_type_names(schema[key])}, got {value!r}")
+    for key in required:
+        if key not in mapping:
+            problems.append(f"{where}: missing required key {key!r}")
+    return True
+
+
+def _check_choice(problems, where, key, value, choices):
+    if value is not None and value not in choices:
+        problems.append(f"{where}: {key} {value!r} is not one of {choices}")
+
+
+def validate_pipeline(data):
+    """
+    Every problem found in a parsed pipeline definition, as readable strings (empty if it is valid).
+    """
+    problems = []
+    if not _check_keys(problems, 'pipeline', data, PIPELINE_SCHEMA, required=('queues', 'workers')):
+        return problems
+    _check_choice(problems, 'pipeline', 'engine', data.get('engine'), ENGINES)
+    _check_choice(problems, 'pipeline', 'mode', data.get('mode'), MODES)
+    if data.get('mode') == 'streaming' and data.get('engine', 'threads') != 'threads':
+        problems.append("pipeline: mode 'streaming' needs engine 'threads'")
+    for block, schema in BLOCK_SCHEMAS.items():
+        if isinstance(data.get(block), dict):
+            _check_keys(problems, block, data[block], schema)
+    for index, reporter in enumerate((data.get('metrics') or {}).get('reporters') or []):
+        if not isinstance(reporter, dict) or reporter.get('type') not in REPORTERS:
+            problems.append(f"metrics.reporters[{index}]: type should be one of {tuple(REPORTERS)}")
+
+    queue_names = set()
+    for index, queue in enumerate(data.get('queues') or []):
+        where = f"queues[{index}]" + (f" ({queue.get('name')})" if isinstance(queue, dict) and queue.get('name') else '')
+        if not _check_keys(problems, where, queue, QUEUE_SCHEMA, required=('name',)):
+            continue
+        if queue.get('name') in queue_names:
+            problems.append(f"{where}: duplicate queue name")
+        queue_names.add(queue.get('name'))
+        _check_choice(problems, where, 'overflow', queue.get('overflow'), PipelineQueue.OVERFLOW_POLICIES)
+        _check_choice(problems, where, 'backend', queue.get('backend'), QUEUE_BACKENDS)
+
+    worker_names = set()
+    for index, worker in enumerate(data.get('workers') or []):
+        where = f"workers[{index}]" + (f" ({worker.get('name')})" if isinstance(worker, dict) and worker.get('name') else '')
+        if not _check_keys(problems, where, worker, WORKER_SCHEMA, required=('name', 'location', 'class')):
+            continue
+        if worker.get('name') in worker_names:
+            problems.append(f"{where}: duplicate worker name")
+        worker_names.add(worker.get('name'))
+        _check_choice(problems, where, 'backend', worker.get('backend'), WORKER_BACKENDS)
+        if worker.get('backend') == 'process' and isinstance(worker.get('params'), dict):
+            for key in PER_PROCESS_PARAMS:
+                if key in worker['params']:
+                    problems.append(f"{where}: params.{key} would be separate in every process, "
+                                    f"it needs backend 'thread'")
+        if isinstance(worker.get('async'), dict):
+            _check_keys(problems, f"{where}.async", worker['async'], ASYNC_WORKER_SCHEMA)
+        for key in ('instances', 'min_instances', 'max_instances'):
+            if isinstance(worker.get(key), int) and worker[key] < 1:
+                problems.append(f"{where}: {key} should be at least 1")
+        if isinstance(worker.get('min_instances'), int) and isinstance(worker.get('max_instances'), int) and \
+                worker['min_instances'] > worker['max_instances']:
+            problems.append(f"{where}: min_instances is larger than max_instances")
+
+        referenced = [worker['input_queue']] if isinstance(worker.get('input_queue'), str) else []
+        if isinstance(worker.get('dead_letter_queue'), str):
+            referenced.append(worker['dead_letter_queue'])
+            if worker['dead_letter_queue'] == worker.get('input_queue'):  # The stage would wait for itself to end
+                problems.append(f"{where}: dead_letter_queue can't be the stage's own input_queue, use a retry stage")
+        for route_index, entry in enumerate(worker.get('output_queues') or []):
+            if isinstance(entry, dict):
+                _check_keys(problems, f"{where}.output_queues[{route_index}]", entry, ROUTE_SCHEMA)
+        try:
+            referenced += [name for route in parse_output_queues(worker.get('output_queues')) for name in route.queue_names]
+        except (ValueError, AttributeError, TypeError) as e:
+            problems.append(f"{where}: invalid output_queues: {e}")
+        for name in referenced:
+            if name not in queue_names:
+                problems.append(f"{where}: unknown queue {name!r}")
+    return problems
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_class(location, class_name):
+    """
+    Import location and return its class_name, once per process: autoscaled stages and
+    later executors reuse the class without touching the import machinery again.
+    """
+    return getattr(importlib.import_module(location), class_name)
+
+
+class PipelinePlan:
+    """
+    A validated pipeline definition. Worker classes are not imported until a stage is
+    built (worker_class()), so validating a pipeline, or running only some of its stages,
+    never pays for importing the modules of the others.
+    """
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @property
+    def name(self):
+        return self.data.get('name') or os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def engine(self):
+        return self.data.get('engine', 'threads')
+
+    @property
+    def mode(self):
+        return self.data.get('mode') or 'batch'
+
+    @property
+    def workers(self):
+        return self.data['workers']
+
+    @staticmethod
+    def worker_location(worker, engine='threads'):
+        """
+        (module, class name) of a worker entry under engine; asyncio prefers the 'async' block.
+        """
+        if engine == 'asyncio':
+            async_worker = worker.get('async') or {}
+            return async_worker.get('location', worker['location']), async_worker.get('class', worker['class'])
+        return worker['location'], worker['class']
+
+    def worker_class(self, worker, engine='threads'):
+        return resolve_class(*self.worker_location(worker, engine))
+
+    def resolve_all(self):
+        """
+        Import every worker class the plan's engine uses.
+        :return: Problems found, one string per class that can't be imported.
+        """
+        problems = []
+        for worker in self.workers:
+            location, class_name = self.worker_location(worker, self.engine)
+            try:
+                resolve_class(location, class_name)
+            except Exception as e:  # ImportError, AttributeError, or whatever the module raised
+                problems.append(f"{worker['name']}: can't load {location}.{class_name}: {type(e).__name__}: {e}")
+        return problems
+
+    def describe(self):
+        """
+        One line per stage: class, instances, backend and queues.
+        """
+        lines = [f"Pipeline {self.name} (engine: {self.engine}, mode: {self.mode}, {len(self.data['queues'])} queues)"]
+        for worker in self.workers:
+            location, class_name = self.worker_location(worker, self.engine)
+            instances = str(worker.get('instances', 1))
+            if 'min_instances' in worker or 'max_instances' in worker:
+                instances += f" [{worker.get('min_instances', 1)}..{worker.get('max_instances', instances)}]"
+            outputs = ', '.join(name for route in parse_output_queues(worker.get('output_queues')) for name in route.queue_names)
+            lines.append(f"  {worker['name']}: {location}.{class_name} x{instances} ({worker.get('backend', 'thread')}) "
+                         f"{worker.get('input_queue') or '-'} -> {outputs or '-'}"
+                         + (f" (failed -> {worker['dead_letter_queue']})" if worker.get('dead_letter_queue') else ''))
+        return '\n'.join(lines)
+
+
+def load_plan(path):
+    """
+    Parse and validate the pipeline YAML at path, reusing the plan while the file is unchanged.
+    :raises PipelinePlanError: If the pipeline doesn't match the schema.
+    """
+    path = os.path.abspath(path)
+    status = os.stat(path)
+    key = (path, status.st_mtime_ns, status.st_size)
+    with _plans_lock:
+        plan = _plans.get(key)
+    if plan is not None:
+        return plan
+    with open(path, 'r') as file:
+        data = yaml.load(file, Loader=_SafeLoader) or {}
+    problems = validate_pipeline(data)
+    if problems:
+        raise PipelinePlanError(path, problems)
+    plan = PipelinePlan(path, data)
+    with _plans_lock:
+        _plans[key] = plan
+    return plan
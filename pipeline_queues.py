@@ -0,0 +1,151 @@
+import pickle
+import tempfile
+from collections import deque
+from queue import Queue
+
+from workers.queueWorkers import END_OF_STREAM, RETIRE
+
+CONTROL_MARKERS = (END_OF_STREAM, RETIRE)  # Never dropped: consumer bookkeeping depends on every one arriving
+
+
+class SpillFile:
+    """
+    Append-only FIFO of pickled items in an anonymous temporary file.
+    Not thread-safe on its own; PipelineQueue calls it with its mutex held.
+    """
+    def __init__(self, directory=None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._read_position = 0
+        self._write_position = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, item):
+        self._file.seek(self._write_position)
+        pickle.dump(item, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._write_position = self._file.tell()
+        self._count += 1
+
+    def popleft(self):
+        self._file.seek(self._read_position)
+        item = pickle.load(self._file)
+        self._read_position = self._file.tell()
+        self._count -= 1
+        if self._count == 0:  # Drained: start over at the beginning of the file
+            self._file.seek(0)
+            self._file.truncate()
+            self._read_position = self._write_position = 0
+        return item
+
+    def close(self):
+        self._file.close()
+
+
+class PipelineQueue(Queue):
+    """
+    queue.Queue with a capacity, an overflow policy and usage counters.
+
+    Overflow policies, applied when maxsize items are already queued:
+      - block: put() waits for room, so producers are throttled to the pace of their consumers.
+      - drop_oldest: the oldest queued item is discarded to make room.
+      - spill: new items are pickled to a temporary file and read back in order as room frees up,
+               so producers never block and memory stays bounded.
+    The END_OF_STREAM and RETIRE markers are never dropped or spilled out of order.
+
+    The high-water mark (largest number of items ever queued) and drop/spill counts are
+    available from stats() for sizing queues.
+    """
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'spill')
+
+    def __init__(self, name, maxsize=0, overflow='block', spill_directory=None):
+        """
+        :param name: Queue name from the pipeline YAML.
+        :param maxsize: Capacity; 0 means unbounded.
+        :param overflow: One of OVERFLOW_POLICIES.
+        :param spill_directory: Where the spill file is created (default: the system temp dir).
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Queue {name}: unknown overflow policy {overflow!r}, expected one of {self.OVERFLOW_POLICIES}")
+        self.name = name
+        self.capacity = maxsize
+        self.overflow = overflow
+        self._spill_directory = spill_directory
+        self.high_water_mark = 0
+        self.total_put = 0
+        self.dropped = 0
+        self.spilled = 0
+        # Spilling queues accept every put() and bound memory themselves
+        super(PipelineQueue, self).__init__(maxsize=0 if overflow == 'spill' else maxsize)
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self._spill = None  # SpillFile, created on first overflow
+
+    def _qsize(self):
+        return len(self.queue) + (len(self._spill) if self._spill is not None else 0)
+
+    def _put(self, item):
+        if self.overflow == 'spill' and self.capacity > 0 and (
+                len(self.queue) >= self.capacity or (self._spill is not None and len(self._spill))):
+            if self._spill is None:
+                self._spill = SpillFile(self._spill_directory)
+            self._spill.append(item)  # Behind everything already spilled, so order is kept
+            self.spilled += 1
+        else:
+            self.queue.append(item)
+        self.total_put += 1
+        self.high_water_mark = max(self.high_water_mark, self._qsize())
+
+    def _get(self):
+        item = self.queue.popleft()
+        if self._spill is not None:
+            while len(self._spill) and len(self.queue) < self.capacity:  # Refill memory from disk
+                self.queue.append(self._spill.popleft())
+        return item
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put an item, applying the overflow policy when the queue is full.
+        """
+        if self.overflow == 'drop_oldest' and self.capacity > 0 and item not in CONTROL_MARKERS:
+            with self.not_full:
+                while self._qsize() >= self.capacity and self._drop_oldest():
+                    pass
+                if self._qsize() < self.capacity:
+                    self._put(item)
+                    self.unfinished_tasks += 1
+                    self.not_empty.notify()
+                    return
+            # Only control markers left to drop: wait for room like a blocking queue
+        super(PipelineQueue, self).put(item, block, timeout)
+
+    def _drop_oldest(self):
+        """
+        Discard the oldest item that isn't a control marker. Called with the mutex held.
+        :return: False if there was nothing that could be dropped.
+        """
+        for index, queued in enumerate(self.queue):
+            if queued not in CONTROL_MARKERS:
+                del self.queue[index]
+                self.dropped += 1
+                self.unfinished_tasks -= 1  # Nobody will call task_done() for it
+                return True
+        return False
+
+    def stats(self):
+        """
+        Current size, capacity, policy and counters.
+        """
+        with self.mutex:
+            return {
+                'name': self.name,
+                'size': self._qsize(),
+                'maxsize': self.capacity,
+                'overflow': self.overflow,
+                'high_water_mark': self.high_water_mark,
+                'total_put': self.total_put,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+            }
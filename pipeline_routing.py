@@ -0,0 +1,127 @@
+import threading
+import zlib
+
+ROUTING_MODES = ('broadcast', 'round_robin', 'hash')
+
+
+class Route:
+    """
+    One entry of a worker's output_queues: a set of queues that together receive each item.
+
+      - broadcast: every queue gets the item (a plain queue name is a single-queue broadcast).
+      - round_robin: queues take turns, so the work is split evenly.
+      - hash: the queue is picked from a stable hash of the item's key, so every item with
+        the same key lands on the same queue in the order it was produced. A batch item
+        (one with a split() method, like PriceBatch) is split into one sub-batch per queue
+        by the key of each record in it.
+    """
+    def __init__(self, mode, queue_names, key=None):
+        """
+        :param mode: One of ROUTING_MODES.
+        :param queue_names: Names of the queues this route writes to.
+        :param key: For hash routing, index of the key in tuple items (None hashes the whole item).
+        """
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode {mode!r}, expected one of {ROUTING_MODES}")
+        if not queue_names:
+            raise ValueError(f"A {mode} route needs at least one queue")
+        self.mode = mode
+        self.queue_names = list(queue_names)
+        self.key = key
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def partition(self, item):
+        """
+        Index of the queue a hash route sends item to. crc32 rather than hash(), which
+        is salted per process for strings.
+        """
+        key = item if self.key is None else item[self.key]
+        return zlib.crc32(str(key).encode('utf-8')) % len(self.queue_names)
+
+    def targets(self, item, queues):
+        """
+        Queues (from the name -> queue mapping) that should receive item.
+        """
+        if self.mode == 'broadcast':
+            return [queues[name] for name in self.queue_names]
+        if self.mode == 'round_robin':
+            with self._lock:
+                index = self._next
+                self._next = (index + 1) % len(self.queue_names)
+        else:
+            index = self.partition(item)
+        return [queues[self.queue_names[index]]]
+
+    def deliveries(self, item, queues):
+        """
+        (queue, item) pairs to put for item: the item itself for each target, or for a
+        hash route and a batch item, each queue's share of the batch.
+        """
+        if self.mode == 'hash' and hasattr(item, 'split'):
+            return [(queues[self.queue_names[index]], part) for index, part in item.split(self.partition).items()]
+        return [(queue, item) for queue in self.targets(item, queues)]
+
+
+def parse_output_queues(entries):
+    """
+    Routes for a worker's output_queues list. Each entry is a queue name (broadcast to it)
+    or a mapping {route: broadcast|round_robin|hash, queues: [...], key: <tuple index>}.
+    """
+    routes = []
+    for entry in entries or []:
+        if isinstance(entry, str):
+            routes.append(Route('broadcast', [entry]))
+        else:
+            routes.append(Route(entry.get('route', 'broadcast'), entry.get('queues', []), entry.get('key')))
+    return routes
+
+
+def output_queue_names(entries):
+    """
+    Every queue name a worker's output_queues list writes to, in order.
+    """
+    return [name for route in parse_output_queues(entries) for name in route.queue_names]
+
+
+class OutputRouter:
+    """
+    Stands in for a worker's output queue when it has several outputs: put() delivers the
+    item through every route. Shared by all instances of a stage so round-robin turns
+    and hash partitions are global to the stage.
+    """
+    def __init__(self, routes, queues):
+        """
+        :param routes: Route objects from parse_output_queues().
+        :param queues: Queue name -> queue object.
+        """
+        self._routes = routes
+        self._queues = queues
+
+    def put(self, item, block=True, timeout=None):
+        for route in self._routes:
+            for queue, share in route.deliveries(item, self._queues):
+                queue.put(share, block, timeout)
+
+
+class AsyncOutputRouter(OutputRouter):
+    """
+    OutputRouter for asyncio.Queue outputs.
+    """
+    async def put(self, item):
+        for route in self._routes:
+            for queue, share in route.deliveries(item, self._queues):
+                await queue.put(share)
+
+
+def build_output(entries, queues, router_class=OutputRouter):
+    """
+    What to pass a worker as output_queue: None without outputs, the queue itself for a
+    single plain queue name, otherwise a router over all of its routes.
+    """
+    routes = parse_output_queues(entries)
+    if not routes:
+        return None
+    if len(routes) == 1 and routes[0].mode == 'broadcast' and len(routes[0].queue_names) == 1:
+        return queues[routes[0].queue_names[0]]
+    return router_class(routes, queues)
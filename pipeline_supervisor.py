@@ -0,0 +1,86 @@
+import threading
+from queue import Queue
+
+
+class PipelineSupervisor:
+    """
+    Tracks the live worker instances of every pipeline stage and reacts as soon as
+    a stage finishes, instead of polling is_alive() on a timer.
+
+    Each registered worker gets a small watcher thread that blocks in join() and
+    posts a completion event the moment the worker exits. wait() consumes those
+    events, calls on_stage_done(stage_name) when the last instance of a stage
+    exits, and returns once every stage has drained.
+
+    A worker that exits with its `error` attribute set (an exception ended it) marks
+    its stage as failed; failed_stages() lists them, so the run's exit status shows it.
+    """
+
+    def __init__(self, on_stage_done=None):
+        """
+        :param on_stage_done: Callable invoked with the stage name when all of its workers have exited.
+        """
+        self._on_stage_done = on_stage_done
+        self._events = Queue()  # Stage names, one per worker that exited
+        self._alive = {}  # stage name -> number of live workers
+        self._failed = []  # Stages with a worker that failed, in the order they failed
+        self._lock = threading.Lock()
+
+    def add_worker(self, stage_name, worker):
+        """
+        Start supervising a worker. worker only needs a join() method (threads and processes both work).
+        """
+        with self._lock:
+            self._alive[stage_name] = self._alive.get(stage_name, 0) + 1
+        watcher = threading.Thread(
+            target=self._watch, args=(stage_name, worker),
+            name=f"supervisor-{stage_name}", daemon=True
+        )
+        watcher.start()
+
+    def _watch(self, stage_name, worker):
+        worker.join()  # Wakes up as soon as the worker exits
+        if getattr(worker, 'error', None) is not None:
+            with self._lock:
+                if stage_name not in self._failed:
+                    self._failed.append(stage_name)
+        self._events.put(stage_name)
+
+    def alive_workers(self, stage_name):
+        """
+        Number of live workers in a stage.
+        """
+        with self._lock:
+            return self._alive.get(stage_name, 0)
+
+    def failed_stages(self):
+        """
+        Names of the stages in which a worker failed.
+        """
+        with self._lock:
+            return list(self._failed)
+
+    def stats(self):
+        """
+        List of [stage name, live workers] pairs.
+        """
+        with self._lock:
+            return [[stage_name, alive] for stage_name, alive in self._alive.items()]
+
+    def wait(self):
+        """
+        Block until every supervised stage has finished, firing on_stage_done for each
+        stage in the order they complete.
+        """
+        while True:
+            with self._lock:
+                if not any(self._alive.values()):
+                    return
+            stage_name = self._events.get()
+            with self._lock:
+                self._alive[stage_name] -= 1
+                stage_done = self._alive[stage_name] == 0
+            if stage_done:
+                print(f"[supervisor] {stage_name} " + ("failed" if stage_name in self.failed_stages() else "finished"))
+                if self._on_stage_done is not None:
+                    self._on_stage_done(stage_name)
@@ -0,0 +1,144 @@
+import importlib
+import multiprocessing
+import threading
+from queue import Empty, Full
+
+from workers.queueWorkers import END_OF_STREAM
+from workers.stageMetrics import registry
+
+LIVENESS_INTERVAL = 1.0  # Seconds between checks that the worker processes are still running, while blocked
+
+
+class _ProcessExited:
+    """
+    Sent by each child process on its output queue when it finishes, with what its worker recorded.
+    """
+    def __init__(self, failed, metrics):
+        self.failed = failed  # The worker raised (or couldn't be built)
+        self.metrics = metrics  # StageMetrics.state() of the process, or None
+
+
+def _run_worker_process(location, class_name, stage_name, input_queue, output_queue, params):
+    """
+    Entry point of a stage's child process: build one worker on the multiprocessing
+    queues and wait for it to finish.
+    """
+    failed = True
+    try:
+        WorkerClass = getattr(importlib.import_module(location), class_name)
+        worker = WorkerClass(input_queue=input_queue, output_queue=output_queue, **params)
+        worker.join()
+        failed = getattr(worker, 'error', None) is not None
+    finally:
+        output_queue.put(_ProcessExited(failed, registry.stage(stage_name).state()))
+
+
+class ProcessStage:
+    """
+    Runs the instances of a pipeline stage in separate processes, so CPU-bound
+    stages are not serialized by the GIL.
+
+    Each process builds one ordinary worker whose input and output queues are
+    multiprocessing queues. Two pump threads bridge them to the pipeline's
+    in-process queues, so upstream and downstream stages see the same queue
+    semantics as for a threaded stage: items flow through unchanged, and the
+    stage consumes one "DONE" per instance. join() returns once every process
+    has exited and all of their output has been forwarded.
+
+    Each process reports its worker's metrics when it exits, and they are added to
+    the stage's metrics here. A process whose worker raised, or that died without
+    reporting, sets `error`, so the supervisor marks the stage as failed; if every
+    process is gone, the input pump stops instead of blocking on a queue nobody reads.
+    Rate limiters and hedgers are per process, so pipeline_plan rejects them on
+    process-backed stages.
+    """
+    def __init__(self, location, class_name, num_instances, input_queue=None, output_queue=None, **params):
+        """
+        :param location: Module path of the worker class.
+        :param class_name: Name of the worker class. It must accept input_queue/output_queue
+                           keyword arguments and be a Thread that starts itself, like the other workers.
+        :param num_instances: Number of worker processes.
+        :param input_queue: Pipeline queue to consume from, or None for source stages.
+        :param output_queue: Pipeline queue to put results in, or None for sink stages.
+        :param params: Extra keyword arguments for the worker class (must be picklable).
+        """
+        context = multiprocessing.get_context('spawn')  # Forking a process that runs threads is unsafe
+        self._stage_name = params.get('stage_name') or class_name  # Same default as the workers' own
+        self._num_instances = num_instances
+        self.error = None  # Set when a worker process failed
+        self._input_queue = input_queue
+        self._output_queue = output_queue
+        # Small bounded buffers, so a full pipeline queue still pushes back on the processes
+        self._mp_input = context.Queue(maxsize=2 * num_instances) if input_queue is not None else None
+        self._mp_output = context.Queue(maxsize=2 * num_instances)
+
+        self._processes = [
+            context.Process(target=_run_worker_process,
+                            args=(location, class_name, self._stage_name, self._mp_input, self._mp_output, params),
+                            daemon=True)
+            for _ in range(num_instances)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._input_pump = None
+        if self._mp_input is not None:
+            self._input_pump = threading.Thread(target=self._pump_input, daemon=True)
+            self._input_pump.start()
+        self._output_pump = threading.Thread(target=self._pump_output, daemon=True)
+        self._output_pump.start()
+
+    def _pump_input(self):
+        """
+        Forward items from the pipeline queue to the processes until every instance got its "DONE".
+        """
+        done_sent = 0
+        while done_sent < self._num_instances:
+            item = self._input_queue.get()
+            while True:
+                try:
+                    self._mp_input.put(item, timeout=LIVENESS_INTERVAL)
+                    break
+                except Full:
+                    if not any(process.is_alive() for process in self._processes):
+                        self._fail("every worker process exited before its input ended")
+                        return  # Nobody left to take it
+            if item == END_OF_STREAM:
+                done_sent += 1
+            else:
+                self._input_queue.task_done()  # Handed to a process; broker-backed queues won't redeliver it
+
+    def _pump_output(self):
+        """
+        Forward results from the processes to the pipeline queue until every process has exited.
+        """
+        exited = 0
+        while exited < self._num_instances:
+            try:
+                item = self._mp_output.get(timeout=LIVENESS_INTERVAL)
+            except Empty:
+                if not any(process.is_alive() for process in self._processes):
+                    self._fail(f"{self._num_instances - exited} worker processes died without reporting")
+                    return
+                continue
+            if isinstance(item, _ProcessExited):
+                exited += 1
+                if item.metrics is not None:
+                    registry.stage(self._stage_name).merge(item.metrics)
+                if item.failed:
+                    self._fail("a worker process failed")
+            elif self._output_queue is not None:
+                self._output_queue.put(item)
+
+    def _fail(self, reason):
+        if self.error is None:
+            self.error = RuntimeError(f"{self._stage_name}: {reason}")
+            print(f"❌ {self.error}")
+
+    def is_alive(self):
+        return self._output_pump.is_alive()
+
+    def join(self, timeout=None):
+        self._output_pump.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
@@ -0,0 +1,50 @@
+import time
+
+from workers.fetchPolicy import PriceFetchPolicy
+from workers.rateLimiter import AdaptiveRateLimiter
+
+
+def test_a_429_slows_the_limiter_down_and_retries():
+    limiter = AdaptiveRateLimiter(rate=10.0, min_rate=1.0)
+    fetch = PriceFetchPolicy('AAPL', limiter)
+    fetch.granted(0.0)
+    assert not fetch.answered(429, None, '2')
+    assert limiter.snapshot()['rate'] == 5.0
+    fetch.granted(0.0)
+    assert fetch.answered(200, 189.5)
+    assert fetch.price == 189.5
+
+
+def test_errors_end_the_fetch_without_a_price():
+    fetch = PriceFetchPolicy('AAPL', AdaptiveRateLimiter())
+    fetch.granted(0.0)
+    assert fetch.answered(404, None)
+    assert fetch.price is None
+
+
+def test_backoff_doubles_without_a_deadline():
+    fetch = PriceFetchPolicy('AAPL', AdaptiveRateLimiter())
+    backoffs = []
+    for _ in fetch.attempts():
+        assert fetch.granted(0.0) is None
+        backoffs.append(fetch.failed(ConnectionError('reset')))
+    assert backoffs == [1, 2, 4, 8]
+
+
+def test_backoff_is_capped_by_the_deadline_and_token_waits_push_it_back():
+    fetch = PriceFetchPolicy('AAPL', AdaptiveRateLimiter(), deadline=0.5)
+    assert fetch.granted(30.0) <= 0.5  # The first token wait never counts
+    first_deadline = fetch.deadline
+    assert fetch.failed(ConnectionError('reset')) <= 0.5
+    fetch.granted(0.25)
+    assert fetch.deadline == first_deadline + 0.25
+    assert all(timeout <= 0.75 for timeout in fetch.timeouts(3.05, 10))
+
+
+def test_nothing_is_retried_past_the_deadline(capsys):
+    fetch = PriceFetchPolicy('AAPL', AdaptiveRateLimiter(), deadline=0.01)
+    fetch.granted(0.0)
+    time.sleep(0.02)
+    assert fetch.failed(TimeoutError()) is None
+    assert fetch.give_up() is None
+    assert 'No price within the 0.01s deadline' in capsys.readouterr().out
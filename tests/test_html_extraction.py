@@ -0,0 +1,58 @@
+import pytest
+
+from benchmarks.fixtures import sp500_symbols, wikipedia_constituents_page, yahoo_quote_page
+from workers.htmlExtraction import (ConstituentsSymbolScanner, PriceScanner, extract_company_symbols,
+                                    iter_company_symbols, price_from_text)
+
+SYMBOLS = sp500_symbols(50)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1000, 16384])
+def test_symbols_come_out_of_any_chunking(chunk_size):
+    page = wikipedia_constituents_page(SYMBOLS)
+    assert list(iter_company_symbols(chunked(page, chunk_size))) == SYMBOLS
+
+
+def test_the_scanner_stops_at_the_end_of_the_constituents_table():
+    page = wikipedia_constituents_page(SYMBOLS)
+    scanner = ConstituentsSymbolScanner()
+    symbols = []
+    for chunk in chunked(page, 4096):
+        symbols += scanner.feed(chunk)
+        if scanner.done:
+            break
+    assert symbols == SYMBOLS
+    assert scanner.feed('<table id="constituents"><tr><td>LATE</td></tr>') == []  # The changes table is never read
+
+
+def test_a_page_without_the_table_has_no_symbols():
+    assert extract_company_symbols('<html><body><table id="changes"></table></body></html>') is None
+    assert extract_company_symbols(wikipedia_constituents_page(SYMBOLS)) == SYMBOLS
+
+
+@pytest.mark.parametrize('chunk_size', [5, 4096])
+def test_the_price_is_found_in_any_chunking(chunk_size):
+    scanner = PriceScanner()
+    found = None
+    for chunk in chunked(yahoo_quote_page('AAPL', price=1234.56), chunk_size):
+        found = scanner.feed(chunk)
+        if found is not None:
+            break
+    assert found == '1,234.56'
+    assert price_from_text(found) == 1234.56
+
+
+def test_older_layouts_with_a_streamer_element():
+    page = '<fin-streamer data-symbol="AAPL" data-field="regularMarketPrice" data-value="189.5">189.50</fin-streamer>'
+    assert PriceScanner().feed(page) == '189.5'
+
+
+def test_a_page_without_a_price():
+    scanner = PriceScanner()
+    assert scanner.feed('<html><body>Symbol not found</body></html>') is None
+    with pytest.raises(ValueError):
+        price_from_text('N/A')
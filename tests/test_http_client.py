@@ -0,0 +1,71 @@
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from workers import httpClient
+
+PAGE = '<html><body>' + 'filler ' * 5000 + '<span data-testid="qsp-price">189.50</span></body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/trickle':  # 10 bytes every 50ms, far slower than any read timeout would notice
+            self.send_response(200)
+            self.send_header('Content-Length', '100000')
+            self.end_headers()
+            try:
+                for _ in range(1000):
+                    self.wfile.write(b'x' * 10)
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+            return
+        body = gzip.compress(PAGE.encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+def test_iter_text_decodes_compressed_bodies(server):
+    with httpClient.get(f'{server}/page', stream=True) as response:
+        assert ''.join(httpClient.iter_text(response)) == PAGE
+
+
+def test_a_trickling_body_stops_at_the_deadline(server):
+    started = time.monotonic()
+    with httpClient.get(f'{server}/trickle', read_timeout=1, stream=True) as response:
+        with pytest.raises(TimeoutError):
+            for _ in httpClient.iter_text(response, deadline=started + 0.3):
+                pass
+    assert time.monotonic() - started < 1.0
+
+
+def test_pools_sized_up_front_are_not_remounted():
+    session = httpClient.get_session()
+    httpClient.size_pools(1000)  # What the pipeline executor does before starting any worker
+    adapter = session.get_adapter('http://example.com')
+    for _ in range(3):
+        httpClient.reserve_connections()
+    assert session.get_adapter('http://example.com') is adapter
+    httpClient.reserve_connections(1000)  # More workers than planned for: a larger adapter replaces it
+    assert session.get_adapter('http://example.com') is not adapter
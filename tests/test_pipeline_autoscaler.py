@@ -0,0 +1,60 @@
+import time
+from queue import Queue
+
+from pipeline_autoscaler import AutoscaledStage, PipelineAutoscaler
+
+
+def filled(count, maxsize=0):
+    queue = Queue(maxsize=maxsize)
+    for item in range(count):
+        queue.put(item)
+    return queue
+
+
+def autoscaler(instances, **config):
+    return PipelineAutoscaler(instances=lambda name: instances, scale_up=None, scale_down=None, **config)
+
+
+def test_a_backlog_grows_the_pool_by_half_up_to_max_instances():
+    stage = AutoscaledStage('prices', filled(50), [], min_instances=1, max_instances=10)
+    assert autoscaler(4).decide(stage) == 2
+    assert autoscaler(1).decide(stage) == 1  # At least one
+    assert autoscaler(9).decide(stage) == 1  # Never past max_instances
+    assert autoscaler(10).decide(stage) == 0
+
+
+def test_a_small_backlog_is_left_alone():
+    stage = AutoscaledStage('prices', filled(8), [], min_instances=1, max_instances=10)
+    assert autoscaler(4, scale_up_backlog=2).decide(stage) == 0
+
+
+def test_an_idle_stage_shrinks_after_idle_intervals_down_to_min_instances():
+    stage = AutoscaledStage('prices', Queue(), [], min_instances=2, max_instances=10)
+    scaler = autoscaler(3, idle_intervals=3)
+    assert [scaler.decide(stage) for _ in range(3)] == [0, 0, -1]
+    assert stage.idle_intervals == 0  # Starts counting again for the next worker
+    assert [autoscaler(2, idle_intervals=3).decide(stage) for _ in range(3)] == [0, 0, 0]
+
+
+def test_downstream_backpressure_shrinks_even_with_a_backlog():
+    stage = AutoscaledStage('prices', filled(50), [filled(9, maxsize=10)], min_instances=1, max_instances=10)
+    assert autoscaler(4, backpressure=0.8).decide(stage) == -1
+    stage.output_queues = [filled(5, maxsize=10)]
+    assert autoscaler(4, backpressure=0.8).decide(stage) == 2
+
+
+def test_a_finished_stage_is_not_scaled():
+    stage = AutoscaledStage('prices', filled(50), [], min_instances=1, max_instances=10)
+    assert autoscaler(0).decide(stage) == 0
+
+
+def test_the_thread_calls_back_into_the_executor():
+    calls = []
+    scaler = PipelineAutoscaler(instances=lambda name: 2, scale_up=lambda name, count: calls.append((name, count)),
+                                scale_down=lambda name: calls.append((name, -1)), interval=0.01)
+    scaler.add_stage('prices', filled(50), [], min_instances=1, max_instances=3)
+    scaler.start()
+    time.sleep(0.1)
+    scaler.stop()
+    scaler.join()
+    assert calls and all(call == ('prices', 1) for call in calls)
@@ -0,0 +1,117 @@
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+from pipeline_broker import BrokerQueue, QueueBroker, RemoteQueue
+from workers.queueWorkers import END_OF_STREAM
+
+
+@pytest.fixture
+def broker():
+    broker = QueueBroker(port=0, reap_interval=0.05).start()
+    yield broker
+    broker.stop()
+
+
+def remote_queue(broker, name='Prices', **settings):
+    return RemoteQueue(name, broker.address, 'test', **settings)
+
+
+def in_thread(function, *args, **kwargs):
+    """
+    Run function in a new thread (so it gets its own broker connection) and return its
+    result, or raise what it raised.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = function(*args, **kwargs)
+        except Exception as error:
+            outcome['error'] = error
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def test_expired_lease_is_requeued_at_the_front():
+    queue = BrokerQueue('Prices', lease=5.0)
+    queue.put('AAPL')
+    queue.put('MSFT')
+    assert queue.get(1, 'consumer') == 'AAPL'
+    queue.requeue(now=time.monotonic())  # Not expired yet
+    assert queue.stats()['leased'] == 1
+    queue.requeue(now=time.monotonic() + 10.0)
+    assert queue.stats()['redelivered'] == 1
+    assert queue.get(2, 'other consumer') == 'AAPL'
+    assert queue.get(3, 'other consumer') == 'MSFT'
+
+
+def test_unacknowledged_item_is_redelivered_to_another_consumer(broker):
+    queue = remote_queue(broker, lease=0.2)
+    queue.put(('AAPL', 189.5))
+    assert in_thread(queue.get) == ('AAPL', 189.5)  # Taken and never acknowledged
+    assert in_thread(queue.get, timeout=5.0) == ('AAPL', 189.5)  # After the lease expired
+    assert queue.stats()['redelivered'] == 1
+
+
+def test_dropped_connection_returns_its_leases(broker):
+    consumer = remote_queue(broker)
+    consumer.put('AAPL')
+    assert consumer.get() == 'AAPL'
+    consumer.close()
+    assert in_thread(remote_queue(broker).get, timeout=5.0) == 'AAPL'
+
+
+def test_ack_removes_the_lease(broker):
+    queue = remote_queue(broker, lease=0.2)
+    queue.put('AAPL')
+    assert queue.get() == 'AAPL'
+    assert queue.stats()['leased'] == 1
+    queue.task_done()
+    assert queue.stats()['leased'] == 0
+    time.sleep(0.4)  # Past the lease: nothing comes back
+    with pytest.raises(Empty):
+        queue.get(timeout=0.1)
+    assert queue.stats()['redelivered'] == 0
+
+
+def test_task_done_without_a_delivery_raises(broker):
+    with pytest.raises(ValueError):
+        remote_queue(broker).task_done()
+
+
+def test_queue_ends_only_after_every_expected_producer_is_done(broker):
+    queue = remote_queue(broker, producers=2)
+    queue.register_producer('Wiki')
+    queue.put('AAPL')
+    queue.producer_done('Wiki')  # Only one of the two expected producers has registered
+    assert queue.get() == 'AAPL'
+    queue.task_done()
+    with pytest.raises(Empty):
+        queue.get(timeout=0.2)
+    assert not queue.stats()['closed']
+    queue.register_producer('WikiRetry')
+    queue.producer_done('WikiRetry')
+    assert queue.stats()['closed']
+    assert queue.get(timeout=5.0) == END_OF_STREAM
+
+
+def test_every_consumer_gets_end_of_stream(broker):
+    queue = remote_queue(broker, producers=1)
+    queue.register_producer('Wiki')
+    queue.put('AAPL')
+    queue.producer_done('Wiki')
+    assert queue.get() == 'AAPL'
+    # Outstanding lease: other consumers wait for it rather than ending early
+    with pytest.raises(Empty):
+        in_thread(queue.get, timeout=0.2)
+    queue.task_done()
+    assert [in_thread(queue.get, timeout=5.0) for _ in range(3)] == [END_OF_STREAM] * 3
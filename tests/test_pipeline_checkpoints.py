@@ -0,0 +1,49 @@
+from queue import Queue
+
+from pipeline_checkpoints import CheckpointStore
+from workers.queueWorkers import END_OF_STREAM, QueueConsumerWorker
+
+
+class Lookup(QueueConsumerWorker):
+    """
+    Puts (key, value) for known keys and (key, None) for the rest, like a price that couldn't be fetched.
+    """
+    VALUES = {'a': 1, 'b': 2}
+
+    def __init__(self, **kwargs):
+        self.processed = []
+        super(Lookup, self).__init__(**kwargs)
+        self.start()
+
+    def process_item(self, item):
+        self.processed.append(item)
+        self.put((item, self.VALUES.get(item)))
+
+    def is_complete(self, outputs):
+        return all(value is not None for _, value in outputs)
+
+
+def run(store, items):
+    input_queue, output_queue = Queue(), Queue()
+    for item in items + [END_OF_STREAM]:
+        input_queue.put(item)
+    worker = Lookup(input_queue=input_queue, output_queue=output_queue, checkpoint=store.stage('Lookup'))
+    worker.join(5)
+    return worker.processed, [output_queue.get_nowait() for _ in range(output_queue.qsize())]
+
+
+def test_resumed_run_replays_completed_items_and_retries_the_rest(tmp_path, monkeypatch):
+    path = str(tmp_path / 'checkpoints.sqlite3')
+    processed, outputs = run(CheckpointStore(path, 'run-1'), ['a', 'b', 'c'])
+    assert processed == ['a', 'b', 'c']
+    monkeypatch.setitem(Lookup.VALUES, 'c', 3)  # c can be looked up now
+    processed, outputs = run(CheckpointStore(path, 'run-1'), ['a', 'b', 'c'])
+    assert processed == ['c']  # a and b were completed, c only reported a failure
+    assert outputs == [('a', 1), ('b', 2), ('c', 3)]
+
+
+def test_another_run_starts_from_scratch(tmp_path):
+    path = str(tmp_path / 'checkpoints.sqlite3')
+    run(CheckpointStore(path, 'run-1'), ['a'])
+    processed, _ = run(CheckpointStore(path, 'run-2'), ['a'])
+    assert processed == ['a']
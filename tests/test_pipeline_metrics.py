@@ -0,0 +1,35 @@
+import time
+
+from pipeline_metrics import MetricsReporterThread, collect_snapshot
+
+
+class ListReporter:
+    def __init__(self):
+        self.snapshots = []
+
+    def report(self, snapshot):
+        self.snapshots.append(snapshot)
+
+
+def test_queue_depths_are_sampled_without_reporters():
+    samples = []
+    reporter = MetricsReporterThread(lambda: samples.append('collect'), [], interval=0.01,
+                                     sample=lambda: samples.append('sample'))
+    reporter.start()
+    time.sleep(0.1)
+    reporter.stop()
+    assert samples.count('sample') >= 3  # On the interval, not only at the end
+    assert 'collect' not in samples  # No snapshot is built for nobody
+
+
+def test_reporters_get_periodic_and_final_snapshots():
+    sink = ListReporter()
+    depths = iter(range(100))
+    reporter = MetricsReporterThread(lambda: collect_snapshot([{'name': 'Prices', 'size': next(depths)}], {}),
+                                     [sink], interval=0.01)
+    reporter.start()
+    time.sleep(0.1)
+    reporter.stop()
+    assert len(sink.snapshots) >= 3
+    history = sink.snapshots[-1]['queue_depth_history']
+    assert [depths['Prices'] for _, depths in history][-2:] == [len(sink.snapshots) - 2, len(sink.snapshots) - 1]
@@ -0,0 +1,76 @@
+import glob
+import os
+
+import pytest
+
+from pipeline_plan import PipelinePlanError, load_plan, validate_pipeline
+
+PIPELINES = glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', '*.yaml'))
+
+
+def pipeline(**worker):
+    return {
+        'queues': [{'name': 'symbols'}, {'name': 'prices'}],
+        'workers': [dict({'name': 'Prices', 'location': 'workers.yahooFinanceWorkers',
+                          'class': 'YahooFinancePriceScheduler', 'input_queue': 'symbols',
+                          'output_queues': ['prices']}, **worker)],
+    }
+
+
+@pytest.mark.parametrize('path', PIPELINES)
+def test_the_shipped_pipelines_are_valid(path):
+    assert load_plan(path).workers
+
+
+def test_a_valid_pipeline_has_no_problems():
+    assert validate_pipeline(pipeline()) == []
+
+
+def test_unknown_keys_are_rejected_with_a_suggestion():
+    data = pipeline(instnces=4)
+    data['engin'] = 'asyncio'
+    data['metrics'] = {'intervl': 5}
+    assert validate_pipeline(data) == [
+        "pipeline: unknown key 'engin', did you mean 'engine'?",
+        "metrics: unknown key 'intervl', did you mean 'interval'?",
+        "workers[0] (Prices): unknown key 'instnces', did you mean 'instances'?",
+    ]
+
+
+@pytest.mark.parametrize('worker, problem', [
+    ({'instances': 'four'}, "workers[0] (Prices): instances should be a int, got 'four'"),
+    ({'instances': True}, "workers[0] (Prices): instances should be a int, got True"),
+    ({'instances': 0}, "workers[0] (Prices): instances should be at least 1"),
+    ({'min_instances': 5, 'max_instances': 2}, "workers[0] (Prices): min_instances is larger than max_instances"),
+    ({'backend': 'fork'}, "workers[0] (Prices): backend 'fork' is not one of ('thread', 'process')"),
+    ({'input_queue': 'quotes'}, "workers[0] (Prices): unknown queue 'quotes'"),
+    ({'backend': 'process', 'params': {'rate_limit': {'rate': 5}}},
+     "workers[0] (Prices): params.rate_limit would be separate in every process, it needs backend 'thread'"),
+])
+def test_bad_worker_values_are_rejected(worker, problem):
+    assert validate_pipeline(pipeline(**worker)) == [problem]
+
+
+def test_bad_pipeline_values_are_rejected():
+    data = pipeline()
+    data.update(engine='trio', mode='streaming')
+    del data['queues']
+    assert validate_pipeline(data) == [
+        "pipeline: missing required key 'queues'",
+        "pipeline: engine 'trio' is not one of ('threads', 'asyncio')",
+        "pipeline: mode 'streaming' needs engine 'threads'",
+        "workers[0] (Prices): unknown queue 'symbols'",
+        "workers[0] (Prices): unknown queue 'prices'",
+    ]
+
+
+def test_load_plan_reports_every_problem(tmp_path):
+    path = tmp_path / 'broken.yaml'
+    path.write_text("queues:\n  - name: symbols\n    maxsize: lots\nworkers:\n  - name: Wiki\n")
+    with pytest.raises(PipelinePlanError) as raised:
+        load_plan(str(path))
+    assert raised.value.problems == [
+        "queues[0] (symbols): maxsize should be a int, got 'lots'",
+        "workers[0] (Wiki): missing required key 'location'",
+        "workers[0] (Wiki): missing required key 'class'",
+    ]
@@ -0,0 +1,67 @@
+from queue import Full
+
+import pytest
+
+from pipeline_queues import PipelineQueue
+from workers.queueWorkers import END_OF_STREAM, RETIRE
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+        queue.task_done()
+    return items
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        PipelineQueue('Prices', maxsize=2, overflow='drop_newest')
+
+
+def test_spill_keeps_order_and_bounds_memory(tmp_path):
+    queue = PipelineQueue('Prices', maxsize=3, overflow='spill', spill_directory=str(tmp_path))
+    for price in range(10):
+        queue.put_nowait(('AAPL', price))  # Never blocks, never raises Full
+    assert len(queue.queue) == 3  # The rest is on disk
+    assert queue.qsize() == 10
+    stats = queue.stats()
+    assert (stats['spilled'], stats['high_water_mark'], stats['dropped']) == (7, 10, 0)
+    assert drain(queue) == [('AAPL', price) for price in range(10)]
+
+
+def test_spill_stays_in_order_while_draining(tmp_path):
+    queue = PipelineQueue('Prices', maxsize=2, overflow='spill', spill_directory=str(tmp_path))
+    for price in range(4):
+        queue.put(price)
+    assert queue.get() == 0
+    queue.put(4)  # Behind what is already spilled, even though memory has room
+    queue.put(END_OF_STREAM)
+    assert [queue.get() for _ in range(5)] == [1, 2, 3, 4, END_OF_STREAM]
+
+
+def test_drop_oldest_discards_the_oldest_items():
+    queue = PipelineQueue('Prices', maxsize=3, overflow='drop_oldest')
+    for price in range(5):
+        queue.put_nowait(price)
+    assert queue.stats()['dropped'] == 2
+    assert drain(queue) == [2, 3, 4]
+    queue.join()  # Dropped items don't leave unfinished tasks behind
+
+
+def test_drop_oldest_never_drops_control_markers():
+    queue = PipelineQueue('Prices', maxsize=3, overflow='drop_oldest')
+    queue.put(1)
+    queue.put(END_OF_STREAM)
+    queue.put(2)
+    queue.put(3)  # Drops 1, the oldest item that isn't a marker
+    assert drain(queue) == [END_OF_STREAM, 2, 3]
+
+
+def test_drop_oldest_blocks_when_only_markers_are_queued():
+    queue = PipelineQueue('Prices', maxsize=2, overflow='drop_oldest')
+    queue.put(END_OF_STREAM)
+    queue.put(RETIRE)
+    with pytest.raises(Full):
+        queue.put(1, timeout=0.1)
+    assert queue.stats()['dropped'] == 0
@@ -0,0 +1,113 @@
+import zlib
+from datetime import datetime, timezone
+from queue import Queue
+
+import pytest
+
+from pipeline_routing import OutputRouter, Route, build_output, output_queue_names, parse_output_queues
+from workers.priceRecords import PriceBatch, PriceRecord
+
+SYMBOLS = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'NVDA', 'META', 'TSLA', 'BRK.B']
+
+
+def queues_named(*names):
+    return {name: Queue() for name in names}
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_hash_partition_is_a_stable_crc32_of_the_key():
+    route = Route('hash', ['Prices0', 'Prices1', 'Prices2'], key=0)
+    for symbol in SYMBOLS:
+        # crc32, not hash(): the same symbol goes to the same queue in every process and on every node
+        assert route.partition((symbol, 1.0)) == zlib.crc32(symbol.encode('utf-8')) % 3
+
+
+def test_hash_route_keeps_each_key_on_one_queue():
+    queues = queues_named('Prices0', 'Prices1', 'Prices2')
+    router = OutputRouter(parse_output_queues([{'route': 'hash', 'key': 0, 'queues': list(queues)}]), queues)
+    for price in range(3):
+        for symbol in SYMBOLS:
+            router.put((symbol, price))
+    seen = {}
+    for name, queue in queues.items():
+        for symbol, _ in drain(queue):
+            assert seen.setdefault(symbol, name) == name  # Never split across queues
+    assert set(seen) == set(SYMBOLS)
+    assert len(set(seen.values())) > 1  # Spread over the queues
+
+
+def test_hash_route_without_key_hashes_the_whole_item():
+    route = Route('hash', ['A', 'B'])
+    assert route.partition('AAPL') == zlib.crc32(b'AAPL') % 2
+    assert route.partition(('AAPL', 1.0)) == zlib.crc32(str(('AAPL', 1.0)).encode('utf-8')) % 2
+
+
+def test_hash_route_preserves_per_key_order():
+    queues = queues_named('Prices0', 'Prices1')
+    router = OutputRouter([Route('hash', list(queues), key=0)], queues)
+    for price in range(20):
+        router.put(('AAPL', price))
+    routed = [item for queue in queues.values() for item in drain(queue)]
+    assert routed == [('AAPL', price) for price in range(20)]
+
+
+def test_round_robin_and_broadcast_routes():
+    queues = queues_named('Prices0', 'Prices1', 'Audit')
+    router = OutputRouter(parse_output_queues(['Audit', {'route': 'round_robin', 'queues': ['Prices0', 'Prices1']}]),
+                          queues)
+    for price in range(4):
+        router.put(price)
+    assert drain(queues['Audit']) == [0, 1, 2, 3]
+    assert drain(queues['Prices0']) == [0, 2]
+    assert drain(queues['Prices1']) == [1, 3]
+
+
+def test_build_output_passes_a_single_queue_through():
+    queues = queues_named('Prices', 'Audit')
+    assert build_output(['Prices'], queues) is queues['Prices']
+    assert build_output([], queues) is None
+    assert isinstance(build_output(['Prices', 'Audit'], queues), OutputRouter)
+    assert output_queue_names(['Audit', {'route': 'hash', 'queues': ['Prices']}]) == ['Audit', 'Prices']
+
+
+def test_unknown_routing_mode_is_rejected():
+    with pytest.raises(ValueError):
+        parse_output_queues([{'route': 'random', 'queues': ['Prices']}])
+    with pytest.raises(ValueError):
+        Route('hash', [])
+
+
+def test_hash_route_splits_price_batches_by_symbol():
+    queues = queues_named('Prices0', 'Prices1', 'Prices2')
+    router = OutputRouter([Route('hash', list(queues), key=0)], queues)
+    extracted_time = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    for price in range(3):
+        router.put(PriceBatch.from_records((symbol, float(price), extracted_time) for symbol in SYMBOLS))
+    single = queues_named('Prices0', 'Prices1', 'Prices2')
+    single_router = OutputRouter([Route('hash', list(single), key=0)], single)
+    for price in range(3):
+        for symbol in SYMBOLS:
+            single_router.put(PriceRecord(symbol, float(price), extracted_time))
+    for name, queue in queues.items():
+        batches = drain(queue)
+        assert all(isinstance(batch, PriceBatch) for batch in batches)
+        # Same queue per symbol as unbatched records, and in the order they were produced
+        assert [record for batch in batches for record in batch] == drain(single[name])
+
+
+def test_hash_route_without_key_never_hashes_the_batch_itself():
+    queues = queues_named('Prices0', 'Prices1')
+    router = OutputRouter([Route('hash', list(queues))], queues)
+    extracted_time = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    records = [PriceRecord(symbol, 1.0, extracted_time) for symbol in SYMBOLS]
+    router.put(PriceBatch.from_records(records))
+    route = Route('hash', list(queues))
+    for index, name in enumerate(queues):
+        assert [record for batch in drain(queues[name]) for record in batch] == \
+            [record for record in records if route.partition(record) == index]
@@ -0,0 +1,47 @@
+from queue import Queue
+
+import pytest
+
+from pipeline_supervisor import PipelineSupervisor
+from workers.queueWorkers import END_OF_STREAM, QueueConsumerWorker
+
+
+class Halver(QueueConsumerWorker):
+    def __init__(self, **kwargs):
+        super(Halver, self).__init__(**kwargs)
+        self.start()
+
+    def process_item(self, item):
+        self.put(1 / item)  # 0 raises ZeroDivisionError and ends the worker
+
+
+def run_stage(supervisor, stage_name, items, instances=1):
+    input_queue, output_queue = Queue(), Queue()
+    for item in items:
+        input_queue.put(item)
+    for _ in range(instances):
+        input_queue.put(END_OF_STREAM)
+    for _ in range(instances):
+        supervisor.add_worker(stage_name, Halver(input_queue=input_queue, output_queue=output_queue))
+    return output_queue
+
+
+def test_stage_done_fires_once_when_its_last_worker_exits():
+    done = []
+    supervisor = PipelineSupervisor(on_stage_done=done.append)
+    output = run_stage(supervisor, 'Halver', [1, 2, 4], instances=3)
+    supervisor.wait()
+    assert done == ['Halver']
+    assert output.qsize() == 3
+    assert supervisor.failed_stages() == []
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')  # The failure is the point
+def test_a_worker_that_raises_fails_its_stage():
+    done = []
+    supervisor = PipelineSupervisor(on_stage_done=done.append)
+    run_stage(supervisor, 'Good', [1, 2])
+    run_stage(supervisor, 'Bad', [0])
+    supervisor.wait()
+    assert sorted(done) == ['Bad', 'Good']  # A failed stage still ends, so downstream gets "DONE"
+    assert supervisor.failed_stages() == ['Bad']
@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timezone
+from queue import Queue
+
+import pytest
+
+sqlalchemy = pytest.importorskip('sqlalchemy')
+
+from workers.postGresWorker import (PostGresBatchWriter, PostGresMasterScheduler, create_unique_index,  # noqa: E402
+                                    get_engine, has_unique_index)
+from workers.priceRecords import PriceBatch  # noqa: E402
+from workers.queueWorkers import END_OF_STREAM  # noqa: E402
+
+CREATE_PRICES = 'CREATE TABLE prices (symbol TEXT, price REAL, extracted_time TIMESTAMP)'
+UNIQUE_INDEX = 'CREATE UNIQUE INDEX prices_symbol_extracted_time_key ON prices (symbol, extracted_time)'
+
+
+def at(second):
+    return datetime(2024, 1, 2, 0, 0, second, tzinfo=timezone.utc)
+
+
+def database(tmp_path, *statements):
+    url = f"sqlite:///{tmp_path / 'prices.sqlite3'}"
+    with get_engine(url).begin() as connection:
+        for statement in statements:
+            connection.execute(sqlalchemy.text(statement))
+    return url
+
+
+def stored(url):
+    with get_engine(url).begin() as connection:
+        return connection.execute(sqlalchemy.text('SELECT symbol, price FROM prices ORDER BY symbol')).fetchall()
+
+
+def test_rows_are_written_in_batches(tmp_path, capsys):
+    url = database(tmp_path, CREATE_PRICES)
+    writer = PostGresBatchWriter(batch_size=3, flush_interval=60.0, database_url=url)
+    for second in range(7):
+        writer.add(f'S{second}', float(second), at(second))
+    assert writer.buffered_rows() == 1  # Two full batches went out on their own
+    assert writer.flush() == 1
+    assert len(stored(url)) == 7
+    assert capsys.readouterr().out.count('Inserted batch') == 3
+
+
+def test_replayed_rows_are_skipped_on_conflict(tmp_path):
+    url = database(tmp_path, CREATE_PRICES, UNIQUE_INDEX)
+    writer = PostGresBatchWriter(batch_size=10, database_url=url)
+    batch = PriceBatch.from_records([('AAPL', 189.5, at(0)), ('MSFT', 410.0, at(0))])
+    writer.add_batch(batch)
+    writer.flush()
+    writer.add_batch(batch)  # A resumed run or a redelivery sends the same prices again
+    writer.add('AAPL', 190.0, at(1))
+    writer.flush()
+    assert stored(url) == [('AAPL', 189.5), ('AAPL', 190.0), ('MSFT', 410.0)]
+
+
+def test_writers_only_check_for_the_unique_index(tmp_path):
+    url = database(tmp_path, CREATE_PRICES)
+    writer = PostGresBatchWriter(batch_size=10, database_url=url)
+    writer.add('AAPL', 189.5, at(0))
+    writer.flush()  # Plain inserts: no DDL at runtime
+    assert has_unique_index(get_engine(url)) is False
+    create_unique_index(get_engine(url))  # The setup step
+    assert has_unique_index(get_engine(url)) is True
+
+
+def test_failed_batch_stays_buffered_until_it_is_written(tmp_path):
+    url = database(tmp_path)  # No prices table yet: every write fails
+    writer = PostGresBatchWriter(batch_size=10, flush_interval=0.01, database_url=url)
+    writer.add('AAPL', 189.5, at(0))
+    assert writer.flush() == 0
+    assert writer.buffered_rows() == 1
+    assert writer.time_until_flush() is not None
+    database(tmp_path, CREATE_PRICES)
+    assert writer.flush() == 1
+    assert writer.buffered_rows() == 0
+
+
+def test_writer_gives_up_after_retry_for(tmp_path):
+    writer = PostGresBatchWriter(batch_size=10, database_url=database(tmp_path), retry_for=0.0)
+    writer.add('AAPL', 189.5, at(0))
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        writer.flush()
+    assert writer.buffered_rows() == 1  # Still there for the caller to report
+
+
+def test_items_are_acknowledged_only_after_their_rows_are_committed(tmp_path):
+    url = database(tmp_path)
+    input_queue = Queue()
+    input_queue.put(PriceBatch.from_records([('AAPL', 189.5, at(0)), ('MSFT', 410.0, at(0))]))
+    input_queue.put(('GOOG', 140.0, at(0)))
+    input_queue.put(END_OF_STREAM)
+    scheduler = PostGresMasterScheduler(input_queue=input_queue, batch_size=2, flush_interval=0.05,
+                                        database_url=url)
+    scheduler.join(0.5)  # Writes keep failing: nothing is acknowledged
+    assert scheduler.is_alive()
+    assert input_queue.unfinished_tasks == 3
+    database(tmp_path, CREATE_PRICES)
+    scheduler.join(10)
+    assert not scheduler.is_alive() and scheduler.error is None
+    assert input_queue.unfinished_tasks == 1  # Only "DONE", which the base class never acknowledges
+    assert [symbol for symbol, _ in stored(url)] == ['AAPL', 'GOOG', 'MSFT']
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')  # The failure is the point
+def test_scheduler_fails_when_the_database_stays_down(tmp_path):
+    input_queue = Queue()
+    input_queue.put(('AAPL', 189.5, at(0)))
+    input_queue.put(END_OF_STREAM)
+    scheduler = PostGresMasterScheduler(input_queue=input_queue, batch_size=10, flush_interval=0.01,
+                                        database_url=database(tmp_path), retry_for=0.2)
+    scheduler.join(10)
+    assert not scheduler.is_alive()
+    assert scheduler.error is not None
+    assert input_queue.unfinished_tasks == 2  # The row was never written, so its item isn't acknowledged
+
+
+def test_async_sink_retries_then_gives_up(tmp_path):
+    pytest.importorskip('aiohttp')
+    from workers.asyncWorkers import AsyncPostGresScheduler
+
+    async def run(url, retry_for):
+        input_queue = asyncio.Queue()
+        await input_queue.put(('AAPL', 189.5, at(0)))
+        await input_queue.put(END_OF_STREAM)
+        sink = AsyncPostGresScheduler(input_queue=input_queue, batch_size=10, flush_interval=0.01,
+                                      database_url=url, retry_for=retry_for)
+        await sink.consume()
+
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        asyncio.run(run(database(tmp_path), retry_for=0.1))
+    url = database(tmp_path, CREATE_PRICES)
+    asyncio.run(run(url, retry_for=0.1))
+    assert stored(url) == [('AAPL', 189.5)]
@@ -0,0 +1,35 @@
+from workers.priceFreshness import PriceTracker, get_price_tracker
+
+
+def test_only_changed_prices_go_downstream():
+    tracker = PriceTracker()
+    assert [tracker.observe('AAPL', price, now=0.0) for price in (189.5, 189.5, 190.0, 189.5)] == \
+        [True, False, True, True]
+    assert tracker.observe('MSFT', 189.5, now=0.0)  # Prices are tracked per symbol
+    snapshot = tracker.snapshot(now=0.0)
+    assert (snapshot['changed'], snapshot['suppressed']) == (4, 1)
+
+
+def test_a_failed_fetch_is_suppressed_and_the_age_keeps_growing():
+    tracker = PriceTracker(stale_after=30.0)
+    tracker.observe('AAPL', 189.5, now=100.0)
+    assert not tracker.observe('AAPL', None, now=120.0)
+    assert tracker.observe('AAPL', 189.5, now=125.0) is False  # Still the price sent before the failure
+    tracker.observe('MSFT', None, now=125.0)
+    assert tracker.ages(now=140.0) == {'AAPL': 15.0, 'MSFT': None}
+    snapshot = tracker.snapshot(now=160.0)
+    assert (snapshot['symbols'], snapshot['never_fetched'], snapshot['stale'], snapshot['age_max']) == (2, 1, 2, 35.0)
+
+
+def test_symbols_no_longer_polled_are_forgotten():
+    tracker = PriceTracker(forget_after=60.0)
+    tracker.observe('AAPL', 189.5, now=0.0)
+    tracker.observe('MSFT', 410.0, now=50.0)
+    assert tracker.ages(now=100.0) == {'MSFT': 50.0}
+    assert tracker.observe('AAPL', 189.5, now=100.0)  # Back in the universe: its price counts as new
+
+
+def test_every_instance_of_a_stage_shares_a_tracker():
+    tracker = get_price_tracker('test_price_freshness')
+    assert get_price_tracker('test_price_freshness') is tracker
+    assert get_price_tracker('test_price_freshness_other') is not tracker
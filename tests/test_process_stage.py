@@ -0,0 +1,45 @@
+from queue import Queue
+
+from pipeline_plan import validate_pipeline
+from process_stage import ProcessStage
+from workers.queueWorkers import END_OF_STREAM, QueueConsumerWorker
+from workers.stageMetrics import registry
+
+
+class Inverter(QueueConsumerWorker):
+    def __init__(self, **kwargs):
+        super(Inverter, self).__init__(**kwargs)
+        self.start()
+
+    def process_item(self, item):
+        self.put(1 / item)  # 0 raises ZeroDivisionError and ends the worker
+
+
+def run_stage(stage_name, items, instances=2):
+    input_queue, output_queue = Queue(), Queue()
+    for item in items + [END_OF_STREAM] * instances:
+        input_queue.put(item)
+    stage = ProcessStage('test_process_stage', 'Inverter', instances, input_queue=input_queue,
+                         output_queue=output_queue, stage_name=stage_name)
+    stage.join(30)
+    return stage, sorted(output_queue.get_nowait() for _ in range(output_queue.qsize()))
+
+
+def test_outputs_and_metrics_come_back_from_the_processes():
+    stage, outputs = run_stage('Inverting', [1, 2, 4, 5])
+    assert not stage.is_alive() and stage.error is None
+    assert outputs == [0.2, 0.25, 0.5, 1.0]
+    assert registry.stage('Inverting').snapshot()['items'] == 4
+
+
+def test_a_stage_whose_processes_all_die_fails_instead_of_hanging():
+    stage, _ = run_stage('Crashing', [0, 0] + [1] * 50)  # Far more input than the processes' small buffer
+    assert not stage.is_alive()
+    assert stage.error is not None
+
+
+def test_per_process_params_are_rejected_on_process_stages():
+    worker = {'name': 'Yahoo', 'location': 'workers.yahooFinanceWorkers', 'class': 'YahooFinancePriceScheduler',
+              'backend': 'process', 'params': {'rate_limit': {'rate': 2.0}, 'hedging': True}}
+    problems = validate_pipeline({'queues': [], 'workers': [worker]})
+    assert len(problems) == 2 and all('needs backend' in problem for problem in problems)
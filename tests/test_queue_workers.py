@@ -0,0 +1,35 @@
+from queue import Queue
+
+from workers.queueWorkers import END_OF_STREAM, RETIRE, QueueConsumerWorker
+
+
+def consumer(*items):
+    input_queue = Queue()
+    for item in items:
+        input_queue.put(item)
+    return QueueConsumerWorker(input_queue=input_queue), input_queue  # Not started: get_many() is called directly
+
+
+def test_get_many_drains_up_to_max_items():
+    worker, input_queue = consumer(1, 2, 3, 4, 5)
+    assert worker.get_many(3) == ([1, 2, 3], False)
+    assert worker.get_many(3) == ([4, 5], False)  # Whatever is queued, without waiting for a full batch
+    assert input_queue.empty()
+
+
+def test_get_many_stops_at_end_of_stream():
+    worker, input_queue = consumer(1, 2, END_OF_STREAM, 3)
+    assert worker.get_many(10) == ([1, 2], True)
+    assert input_queue.get_nowait() == 3  # Nothing behind the marker is taken
+
+
+def test_get_many_treats_retire_as_end_of_stream():
+    worker, _ = consumer(1, RETIRE)
+    assert worker.get_many(10) == ([1], True)
+    worker, _ = consumer(RETIRE)
+    assert worker.get_many(10) == ([], True)  # Also as the first item
+
+
+def test_get_many_returns_nothing_when_the_timeout_expires():
+    worker, _ = consumer()
+    assert worker.get_many(10, timeout=0.01) == ([], False)
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from workers.rateLimiter import AdaptiveRateLimiter, get_rate_limiter, parse_retry_after
+
+
+def test_slow_start_then_additive_increase_after_a_throttle():
+    limiter = AdaptiveRateLimiter(rate=2.0, max_rate=100.0, increase=1.0)
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.snapshot()['rate'] == 4.0  # Slow start: +1 per success
+    limiter.on_throttled()
+    assert limiter.snapshot()['rate'] == 2.0
+    limiter.on_success()
+    assert limiter.snapshot()['rate'] == 2.5  # Additive increase: increase / rate per success
+
+
+def test_increase_stops_at_max_rate():
+    limiter = AdaptiveRateLimiter(rate=2.0, max_rate=3.0)
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.snapshot()['rate'] == 3.0
+
+
+def test_throttling_halves_the_rate_down_to_min_rate():
+    limiter = AdaptiveRateLimiter(rate=8.0, min_rate=3.0, decrease=0.5, decrease_cooldown=0.0)
+    limiter.on_throttled()
+    assert limiter.snapshot()['rate'] == 4.0
+    limiter.on_throttled()
+    assert limiter.snapshot()['rate'] == 3.0
+    assert limiter.snapshot()['throttled'] == 2
+
+
+def test_429s_from_requests_already_in_flight_cut_the_rate_once():
+    limiter = AdaptiveRateLimiter(rate=8.0, decrease_cooldown=60.0)
+    for _ in range(5):
+        limiter.on_throttled()
+    assert limiter.snapshot()['rate'] == 4.0
+
+
+def test_throttling_drops_the_saved_up_burst():
+    limiter = AdaptiveRateLimiter(rate=1.0, burst=10)
+    assert limiter.try_acquire()
+    limiter.on_throttled()
+    assert not limiter.try_acquire()
+
+
+def test_retry_after_pauses_every_request():
+    limiter = AdaptiveRateLimiter(rate=1000.0, burst=10, decrease_cooldown=0.0)
+    limiter.on_throttled(retry_after=0.2)
+    assert not limiter.try_acquire()
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+@pytest.mark.parametrize('header, seconds', [('5', 5.0), ('0.5', 0.5), ('-3', 0.0), (None, None),
+                                             ('Wed, 21 Oct 2015 07:28:00 GMT', None)])
+def test_parse_retry_after(header, seconds):
+    assert parse_retry_after(header) == seconds
+
+
+def test_limiters_are_shared_per_host():
+    first = get_rate_limiter('http://rate-limiter.test/quote/AAPL')
+    assert get_rate_limiter('http://rate-limiter.test/quote/MSFT') is first
+    assert get_rate_limiter('http://other.test/quote/AAPL') is not first
@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from workers.requestHedging import RequestHedger
+
+
+def primed_hedger(latency=0.01):
+    hedger = RequestHedger(min_samples=5, budget=1.0)
+    for _ in range(10):
+        hedger.call(lambda abandoned: time.sleep(latency))
+    return hedger
+
+
+def test_a_slow_request_is_hedged_and_the_loser_is_abandoned():
+    hedger = primed_hedger()
+    calls, stopped = [], threading.Event()
+
+    def request(abandoned):
+        calls.append(abandoned)
+        if len(calls) == 1:  # The first one hangs until it is told to give up
+            abandoned.wait(5)
+            stopped.set()
+            raise TimeoutError('abandoned')
+        return 'hedge'
+
+    assert hedger.call(request, timeout=2) == 'hedge'
+    assert stopped.wait(1)  # Its pool thread is free again
+    assert hedger.snapshot()['hedge_wins'] >= 1
+
+
+def test_no_hedge_without_a_spare_token():
+    hedger = primed_hedger()
+    calls = []
+
+    def request(abandoned):
+        calls.append(abandoned)
+        abandoned.wait(5)
+        return 'late'
+
+    hedges = hedger.snapshot()['hedges']  # Priming may have hedged a slow one already
+    with pytest.raises(TimeoutError):
+        hedger.call(request, timeout=0.5, may_hedge=lambda: False)
+    assert len(calls) == 1
+    assert calls[0].is_set()  # Abandoned at the deadline
+    assert hedger.snapshot()['hedges'] == hedges
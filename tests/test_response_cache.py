@@ -0,0 +1,73 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from workers.responseCache import DiskCache, ResponseCache, fetch_text
+
+PAGE = '<table id="constituents"><tr><td>AAPL</td></tr></table>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []  # (path, If-None-Match) of every request
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = PAGE.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResponseCache()
+    cache.set('symbols', ['AAPL'], ttl=0.05)
+    assert cache.get('symbols') == ['AAPL']
+    time.sleep(0.1)
+    assert cache.get('symbols') is None
+    assert cache.get_entry('symbols').value == ['AAPL']  # Kept for revalidation
+
+
+def test_a_fresh_response_is_served_without_a_request(server):
+    cache = ResponseCache()
+    url = f'{server}/fresh'
+    assert fetch_text(url, ttl=60, cache=cache) == (PAGE, True)
+    assert fetch_text(url, ttl=60, cache=cache) == (PAGE, False)
+    assert [path for path, _ in Handler.requests_seen].count('/fresh') == 1
+
+
+def test_a_stale_response_is_revalidated_and_a_304_reuses_it(server):
+    cache = ResponseCache()
+    url = f'{server}/stale'
+    assert fetch_text(url, ttl=0.05, cache=cache) == (PAGE, True)
+    time.sleep(0.1)
+    assert fetch_text(url, ttl=60, cache=cache) == (PAGE, False)
+    assert ('/stale', '"v1"') in Handler.requests_seen
+    assert cache.get(f'response:{url}') == PAGE  # Fresh again for the new ttl
+
+
+def test_entries_survive_on_disk(tmp_path):
+    ResponseCache(disk=DiskCache(str(tmp_path))).set('price:AAPL', 189.5, ttl=60, etag='"v1"')
+    entry = ResponseCache(disk=DiskCache(str(tmp_path))).get_entry('price:AAPL')
+    assert (entry.value, entry.etag, entry.is_fresh()) == (189.5, '"v1"', True)
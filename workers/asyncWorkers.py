@@ -0,0 +1,456 @@
+import asyncio  # Event loop, queues and tasks
+import codecs  # Incremental decoding of streamed bodies
+import time  # Timing for stage metrics
+from datetime import datetime, timezone  # For timestamping prices
+
+import aiohttp  # Async HTTP client
+
+from workers import httpClient  # Default timeouts and content encodings
+from workers.responseCache import conditional_headers, get_response_cache  # Shared TTL cache
+from workers.rateLimiter import get_rate_limiter  # Shared adaptive per-host rate limiter
+from workers.fetchPolicy import PriceFetchPolicy  # Same retries, backoff and deadline as the threaded scheduler
+from workers.requestHedging import get_hedger  # Shared per-host hedging of slow requests
+from workers.htmlExtraction import PriceScanner, price_from_text  # Streaming price scanner
+from workers.postGresWorker import DEFAULT_RETRY_FOR, MAX_RETRY_DELAY, PostGresBatchWriter, ensure_datetime  # Shared engine and batch inserts
+from workers.priceRecords import PriceBatch, PriceRecord  # Compact stage traffic
+from workers.priceFreshness import get_price_tracker  # Delta suppression and per-symbol freshness
+from workers.queueWorkers import END_OF_STREAM  # Same end-of-stream marker as the threaded workers
+from workers.stageMetrics import bind_stage, record_wait, registry  # Per-stage instrumentation
+from workers.wikiWorker import WikiWorker  # Reuse the symbol extraction
+from workers.yahooFinanceWorkers import YAHOO_BASE_URL, YAHOO_HEADERS, YahooFinancePriceWorker  # Reuse URL, headers and price parsing
+
+_client_sessions = {}  # Event loop -> shared aiohttp.ClientSession
+
+
+def get_client_session(limit=100):
+    """
+    Return the aiohttp session shared by every async worker on the running event loop.
+    :param limit: Maximum number of simultaneous connections for the session.
+    """
+    loop = asyncio.get_running_loop()
+    session = _client_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=limit)
+        session = aiohttp.ClientSession(connector=connector)
+        _client_sessions[loop] = session
+    return session
+
+
+async def close_client_sessions():
+    """
+    Close the shared session of the running event loop.
+    """
+    session = _client_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class AsyncQueueConsumerWorker:
+    """
+    asyncio counterpart of QueueConsumerWorker: consumes items from an asyncio.Queue
+    until END_OF_STREAM. Subclasses implement process_item() (or override consume());
+    the executor runs one run() task per configured instance, which records the
+    task's metrics against its stage. Outputs can be batched with output_batch_size,
+    and failed items sent to a dead_letter_queue, as for QueueConsumerWorker.
+    """
+    def __init__(self, input_queue=None, output_queue=None, stage_name=None, output_batch_size=1,
+                 output_flush_interval=1.0, dead_letter_queue=None):
+        """
+        :param input_queue: asyncio.Queue to consume items from.
+        :param output_queue: asyncio.Queue to put results in, or None for sink stages.
+        :param stage_name: Pipeline stage this worker belongs to, for metrics (defaults to the class name).
+        :param output_batch_size: Outputs per batch put on the output queue (default 1: no batching).
+        :param output_flush_interval: Seconds a partial output batch may wait before it is put.
+        :param dead_letter_queue: asyncio.Queue to put failed items on instead of stopping (optional).
+        """
+        self._input_queue = input_queue
+        self._output_queue = output_queue
+        self._dead_letter_queue = dead_letter_queue
+        self._stage_name = stage_name or type(self).__name__
+        self._metrics = registry.stage(self._stage_name)
+        self._output_batch_size = max(1, int(output_batch_size))
+        self._output_flush_interval = float(output_flush_interval)
+        self._output_buffer = [] if self._output_batch_size > 1 else None  # Outputs not put yet
+        self._output_deadline = None  # time.monotonic() the buffered outputs are due
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next item. Returns END_OF_STREAM when the stage's input has ended.
+        :raises asyncio.TimeoutError: If timeout expires before an item arrives.
+        """
+        started = time.perf_counter()
+        try:
+            if timeout is None:
+                return await self._input_queue.get()
+            return await asyncio.wait_for(self._input_queue.get(), timeout)
+        finally:
+            self._metrics.record_wait('input', time.perf_counter() - started)
+
+    async def get_many(self, max_items, timeout=None):
+        """
+        Wait for the first item, then drain up to max_items without waiting again.
+        :return: (items, end_of_stream), items is empty if timeout expired first.
+        """
+        items = []
+        try:
+            item = await self.get(timeout)
+        except asyncio.TimeoutError:
+            return items, False
+        while True:
+            if item == END_OF_STREAM:
+                return items, True
+            items.append(item)
+            if len(items) >= max_items:
+                return items, False
+            try:
+                item = self._input_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return items, False
+
+    async def put(self, item):
+        """
+        Put an item on the output queue, if this worker has one (through the output batch, when batching).
+        """
+        if self._output_buffer is None:
+            await self._put_output(item)
+            return
+        if not self._output_buffer:
+            self._output_deadline = time.monotonic() + self._output_flush_interval
+        self._output_buffer.append(item)
+        if len(self._output_buffer) >= self._output_batch_size:
+            await self.flush_output()
+
+    async def _put_output(self, item):
+        if self._output_queue is not None:
+            started = time.perf_counter()
+            await self._output_queue.put(item)
+            self._metrics.record_wait('output', time.perf_counter() - started)
+
+    def make_output_batch(self, items):
+        """
+        The queue item that carries a batch of outputs. Override for a compact batch type.
+        """
+        return list(items)
+
+    async def flush_output(self):
+        """
+        Put the buffered outputs as one batch.
+        """
+        if self._output_buffer:
+            items, self._output_buffer = self._output_buffer, []
+            self._output_deadline = None
+            await self._put_output(self.make_output_batch(items))
+
+    async def dead_letter(self, item):
+        """
+        Put item on the dead-letter queue instead of handling it, if this worker has one.
+        :return: True if it was put there, False if the caller has to deal with the failure itself.
+        """
+        if self._dead_letter_queue is None:
+            return False
+        started = time.perf_counter()
+        await self._dead_letter_queue.put(item)
+        self._metrics.record_wait('output', time.perf_counter() - started)
+        self._metrics.record_error()
+        return True
+
+    async def process_item(self, item):
+        """
+        Handle a single input item. Must be implemented by subclasses that use the default consume().
+        """
+        raise NotImplementedError
+
+    async def on_end_of_stream(self):
+        """
+        Called once after END_OF_STREAM is received.
+        """
+
+    async def consume(self):
+        """
+        Consume items until END_OF_STREAM, awaiting process_item() for each one.
+        """
+        while True:
+            if self._output_buffer and time.monotonic() >= self._output_deadline:
+                await self.flush_output()
+            try:
+                # At most until buffered outputs are due
+                item = await self.get(max(0.0, self._output_deadline - time.monotonic()) if self._output_buffer else None)
+            except asyncio.TimeoutError:
+                continue
+            if item == END_OF_STREAM:
+                break
+            started = time.perf_counter()
+            try:
+                await self.process_item(item)
+            except Exception as error:
+                if not await self.dead_letter(item):
+                    self._metrics.record_error()
+                    raise
+                print(f"⚠️ {self._stage_name}: {item!r} failed ({error!r}), sent to the dead-letter queue")
+            self._metrics.record_item(time.perf_counter() - started)
+        await self.flush_output()
+        await self.on_end_of_stream()
+
+    async def run(self):
+        """
+        Task body: run consume() with metrics attributed to this worker's stage.
+        """
+        with bind_stage(self._stage_name, bind_thread=False):
+            await self.consume()
+
+    @classmethod
+    async def shutdown(cls):
+        """
+        Called once by the executor after the pipeline drains. Releases shared resources.
+        """
+        await close_client_sessions()
+
+
+class AsyncWikiWorkerScheduler(AsyncQueueConsumerWorker):
+    """
+    Source stage: fetches the S&P 500 constituents pages and puts every symbol on the output queue.
+    """
+    def __init__(self, input_queue=None, output_queue=None, input_values=None, cache_ttl=None,
+                 connect_timeout=httpClient.DEFAULT_CONNECT_TIMEOUT, read_timeout=httpClient.DEFAULT_READ_TIMEOUT,
+                 stage_name=None):
+        """
+        :param input_values: List of Wikipedia URLs to scrape.
+        :param cache_ttl: Seconds to reuse the cached page and parsed symbols. None disables caching.
+        """
+        super(AsyncWikiWorkerScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue,
+                                                       stage_name=stage_name)
+        self._entries = input_values or []
+        self._cache_ttl = cache_ttl
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+    async def consume(self):
+        for entry in self._entries:
+            started = time.perf_counter()
+            symbols = await self._get_symbols(entry)
+            for symbol in symbols:
+                await self.put(symbol)
+            self._metrics.record_item(time.perf_counter() - started, items=len(symbols))
+
+    async def _get_symbols(self, url):
+        """
+        Return the symbols on url, from the cache when warm, revalidating the page when stale.
+        """
+        cache = get_response_cache() if self._cache_ttl else None
+        symbols_key, response_key = f'symbols:{url}', f'response:{url}'
+        page_entry = None
+        if cache is not None:
+            symbols = cache.get(symbols_key)
+            if symbols is not None:  # Warm cache: no request, no parsing
+                return symbols
+            page_entry = cache.get_entry(response_key)
+
+        requested = time.perf_counter()
+        async with get_client_session().get(url, headers=conditional_headers(page_entry),
+                                            timeout=self._timeout) as response:
+            record_wait('http', time.perf_counter() - requested)
+            stale_symbols = cache.get_entry(symbols_key) if cache is not None else None
+            if response.status == 304 and page_entry is not None and stale_symbols is not None:
+                cache.refresh(response_key, page_entry, self._cache_ttl)
+                cache.refresh(symbols_key, stale_symbols, self._cache_ttl)
+                return stale_symbols.value
+            if response.status != 200:
+                print("Couldn't fetch the page")
+                return []
+            page_html = await response.text()
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+        # BeautifulSoup parsing is CPU-bound, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        symbols = await loop.run_in_executor(None, lambda: list(WikiWorker._extract_company_symbols(page_html)))
+        if cache is not None:
+            cache.set(response_key, page_html, self._cache_ttl, etag, last_modified)
+            cache.set(symbols_key, symbols, self._cache_ttl)
+        return symbols
+
+
+class AsyncYahooFinancePriceScheduler(AsyncQueueConsumerWorker):
+    """
+    Fetches Yahoo Finance prices for symbols from the input queue and puts
+    (symbol, price, timestamp) tuples on the output queue. Each instance is a
+    task, so hundreds of fetches can be in flight on one thread, paced by the
+    same shared rate limiter as the threaded scheduler.
+    """
+    def __init__(self, input_queue=None, output_queue=None, rate_limit=None, price_cache_ttl=None,
+                 connect_timeout=httpClient.DEFAULT_CONNECT_TIMEOUT, read_timeout=httpClient.DEFAULT_READ_TIMEOUT,
+                 base_url=YAHOO_BASE_URL, stage_name=None, output_batch_size=1, output_flush_interval=1.0,
+                 emit_changes_only=False, stale_after=None, deadline=None, hedging=None, dead_letter_queue=None):
+        """
+        :param rate_limit: AdaptiveRateLimiter settings for Yahoo Finance (optional).
+        :param price_cache_ttl: Seconds to reuse a scraped price instead of fetching it again (optional).
+        :param connect_timeout: Seconds to establish a connection.
+        :param read_timeout: Seconds to wait for the server between bytes.
+        :param base_url: Quote URL prefix the symbol is appended to (e.g. a local fixture server).
+        :param emit_changes_only: Only put prices that changed since the symbol's previous poll.
+        :param stale_after: Seconds without a successful fetch before the freshness metric counts a symbol as stale.
+        :param deadline: Seconds one symbol may take, retries included but rate limiter waits not (optional).
+        :param hedging: RequestHedger settings, or True for the defaults, to hedge requests slower than the recent p95.
+        :param dead_letter_queue: asyncio.Queue for the symbols whose price couldn't be fetched (optional).
+        """
+        super(AsyncYahooFinancePriceScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue,
+                                                              stage_name=stage_name, output_batch_size=output_batch_size,
+                                                              output_flush_interval=output_flush_interval,
+                                                              dead_letter_queue=dead_letter_queue)
+        self._base_url = base_url
+        self._rate_limiter = get_rate_limiter(base_url, **(rate_limit or {}))
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._price_cache_ttl = price_cache_ttl
+        self._emit_changes_only = emit_changes_only
+        self._deadline = deadline
+        self._hedger = get_hedger(base_url, **(hedging if isinstance(hedging, dict) else {})) if hedging else None
+        self._price_tracker = get_price_tracker(self._stage_name, stale_after=stale_after)  # Shared by the stage
+
+    async def process_item(self, symbol):
+        if self._price_cache_ttl:
+            cached = get_response_cache().get(f'price:{symbol}')
+            if cached is not None:  # Scraped recently, reuse it with its original timestamp
+                if self._emit_changes_only:
+                    return  # Already sent when it was scraped
+                price, extracted_time = cached
+                await self.put(PriceRecord(symbol, price, datetime.fromisoformat(extracted_time)))
+                return
+        price = await self.get_price(symbol)
+        extracted_time = datetime.now(timezone.utc)
+        if self._price_cache_ttl and price is not None:
+            get_response_cache().set(f'price:{symbol}', [price, extracted_time.isoformat()], self._price_cache_ttl)
+        changed = self._price_tracker.observe(symbol, price)  # Also refreshes the symbol's freshness
+        if price is None and await self.dead_letter(symbol):
+            return  # Retried later, by whatever consumes the dead-letter queue
+        if self._emit_changes_only and not changed:
+            return  # Unchanged (or failed) poll, nothing new for downstream
+        await self.put(PriceRecord(symbol, price, extracted_time))
+
+    def make_output_batch(self, records):
+        """
+        Batched prices travel as one columnar PriceBatch.
+        """
+        return PriceBatch.from_records(records)
+
+    async def _request_price(self, url):
+        """
+        Send one request for the quote page (the caller waits for the rate limiter first).
+        :return: (status code, price or None, Retry-After header of a 429).
+        """
+        requested = time.perf_counter()
+        async with get_client_session().get(url, headers=YAHOO_HEADERS, timeout=self._timeout) as response:
+            record_wait('http', time.perf_counter() - requested)
+            if response.status == 429:  # Too many requests (rate limited)
+                return response.status, None, response.headers.get('Retry-After')
+            self._rate_limiter.on_success()
+            if response.status != 200:
+                return response.status, None, None
+            return response.status, await self._read_price(response), None
+
+    async def get_price(self, symbol):
+        """
+        Fetch the current price for symbol, with the same retry policy (and deadline) as YahooFinancePriceWorker.
+        :return: Price as float, or None if not found or error occurs.
+        """
+        url = f'{self._base_url}{symbol}'
+        fetch = PriceFetchPolicy(symbol, self._rate_limiter, deadline=self._deadline)  # Same policy as the threads engine
+        for _ in fetch.attempts():
+            waiting = time.monotonic()
+            await self._rate_limiter.acquire_async()  # Wait for the shared per-host rate limiter
+            remaining = fetch.granted(time.monotonic() - waiting)
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                if self._hedger is not None:
+                    result = await self._hedger.call_async(lambda: self._request_price(url), timeout=remaining,
+                                                           may_hedge=self._rate_limiter.try_acquire)  # Hedge only with a spare token
+                else:
+                    result = await asyncio.wait_for(self._request_price(url), remaining)
+            except (aiohttp.ClientError, asyncio.TimeoutError, TimeoutError) as e:  # Network errors, or the deadline
+                backoff = fetch.failed(e)
+                if backoff is None:
+                    break
+                await asyncio.sleep(backoff)
+                continue
+            except ValueError as ve:  # Handle conversion errors
+                return fetch.unreadable(ve)
+            if fetch.answered(*result):
+                return fetch.price
+        return fetch.give_up()
+
+    @staticmethod
+    async def _read_price(response):
+        """
+        Scan the price out of the body as it streams in, then drain the rest so the connection is reused.
+        Falls back to a full lxml parse (off the event loop) for unrecognized layouts.
+        """
+        decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+        scanner = PriceScanner()
+        chunks = []
+        async for raw_chunk in response.content.iter_chunked(16384):
+            chunk = decoder.decode(raw_chunk)
+            if scanner.feed(chunk) is not None:
+                async for _ in response.content.iter_chunked(65536):
+                    pass
+                return price_from_text(scanner.price_text)
+            chunks.append(chunk)
+        chunks.append(decoder.decode(b'', final=True))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, YahooFinancePriceWorker.parse_price, ''.join(chunks))
+
+
+class AsyncPostGresScheduler(AsyncQueueConsumerWorker):
+    """
+    Async database sink: gathers rows into size- or time-bounded batches and writes
+    each batch through PostGresBatchWriter in a worker thread, so the event loop
+    never blocks on the database. A batch the database rejects is kept and retried
+    after a growing delay, before any more rows are taken, for up to retry_for seconds;
+    then the worker raises and its stage fails.
+    """
+    def __init__(self, input_queue=None, output_queue=None, batch_size=100, flush_interval=1.0,
+                 database_url=None, insert_method='values', stage_name=None, retry_for=DEFAULT_RETRY_FOR):
+        super(AsyncPostGresScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue,
+                                                     stage_name=stage_name)
+        self._batch_size = max(1, int(batch_size))
+        self._flush_interval = float(flush_interval)
+        self._retry_for = float(retry_for)
+        self._writer = PostGresBatchWriter(batch_size=batch_size, flush_interval=flush_interval,
+                                           database_url=database_url, insert_method=insert_method)
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        rows = []
+        deadline = None  # loop.time() by which the buffered rows must be written (or retried)
+        failures = 0  # Consecutive failed writes of the buffered rows
+        failing_since = None  # loop.time() of the first of them
+        end_of_stream = False
+        while True:
+            if rows and (len(rows) >= self._batch_size or loop.time() >= deadline or end_of_stream):
+                started = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._writer.write_rows, rows)  # to_thread copies the stage context
+                except Exception:  # Already logged and counted by the writer
+                    now = loop.time()
+                    failing_since = now if failing_since is None else failing_since
+                    failures += 1
+                    if now - failing_since >= self._retry_for:
+                        print(f"❌ Giving up on {len(rows)} rows after {failures} failed writes "
+                              f"in {round(now - failing_since, 1)}s")
+                        raise
+                    deadline = now + min(self._flush_interval * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                else:
+                    self._metrics.record_item(time.perf_counter() - started, items=len(rows))
+                    rows, deadline, failures, failing_since = [], None, 0, None
+            if end_of_stream and not rows:
+                break
+            if end_of_stream or len(rows) >= self._batch_size:  # Only a failed write leaves these: wait to retry
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+                continue
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            items, end_of_stream = await self.get_many(self._batch_size - len(rows), timeout=timeout)
+            if items and not rows:
+                deadline = loop.time() + self._flush_interval
+            for item in items:
+                if isinstance(item, PriceBatch):  # Timestamps already normalized, converted in one pass
+                    rows.extend(item.rows())
+                    continue
+                symbol, price, extracted_time = item
+                rows.append({'symbol': symbol, 'price': price, 'extracted_time': ensure_datetime(extracted_time)})
@@ -0,0 +1,116 @@
+import time  # Monotonic clock for the deadline
+
+from workers.rateLimiter import parse_retry_after  # Retry-After header of a 429
+
+DEFAULT_ATTEMPTS = 4  # Requests per symbol, at most
+
+
+class PriceFetchPolicy:
+    """
+    Retry policy of one symbol's price fetch: up to `attempts` requests, exponential backoff after
+    network errors, a slower shared rate after a 429, and an optional deadline for the whole fetch.
+
+    It does no I/O itself. The threaded and asyncio Yahoo schedulers each wait for tokens, send
+    requests and sleep in their own way, and report every step here, so both engines retry, back
+    off and give up alike.
+
+    The deadline starts once the first token is granted and is pushed back by the token waits
+    before retries: queueing behind our own rate limiter isn't a slow server.
+    """
+    def __init__(self, symbol, rate_limiter, deadline=None, attempts=DEFAULT_ATTEMPTS):
+        """
+        :param symbol: Symbol being fetched, for the messages.
+        :param rate_limiter: AdaptiveRateLimiter the requests are paced by, told about 429s.
+        :param deadline: Seconds the fetch may take in total, retries included (None: no limit).
+        :param attempts: Requests to send at most.
+        """
+        self.symbol = symbol
+        self._rate_limiter = rate_limiter
+        self._seconds = deadline
+        self._attempts = attempts
+        self._attempt = 0  # Attempts started so far
+        self.deadline = None  # time.monotonic() the fetch must end by, once the first token is granted
+        self.price = None  # Set by answered()
+
+    def attempts(self):
+        """
+        Iterate once per attempt; the loop ends early on an answer, an unreadable price or the deadline.
+        """
+        return range(self._attempts)
+
+    def granted(self, waited):
+        """
+        A token was granted after waiting `waited` seconds: start the deadline, or push it back.
+        :return: Seconds left before the deadline (None without one). Zero or less: out of time, stop.
+        """
+        self._attempt += 1
+        if self._seconds is None:
+            return None
+        now = time.monotonic()
+        self.deadline = now + self._seconds if self.deadline is None else self.deadline + waited
+        return self.deadline - now
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, or None without one.
+        """
+        return self.deadline - time.monotonic() if self.deadline is not None else None
+
+    def expired(self):
+        """
+        True once the deadline has passed.
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def timeouts(self, connect_timeout, read_timeout):
+        """
+        The connect and read timeouts for the next request, capped by the time left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return connect_timeout, read_timeout
+        return min(connect_timeout, remaining), min(read_timeout, remaining)  # No single wait may outlast the deadline
+
+    def failed(self, error):
+        """
+        The request raised a network error or timed out.
+        :return: Seconds to back off before the next attempt, or None if the fetch is out of time.
+        """
+        if self.expired():
+            return None  # Out of time, not a network error
+        print(f"[{self.symbol}] Request failed: {error}. Retrying...")
+        backoff = 2 ** (self._attempt - 1)  # Exponential backoff before retrying
+        return backoff if self.deadline is None else max(0.0, min(backoff, self.remaining()))
+
+    def unreadable(self, error):
+        """
+        The price text wasn't a number; there's no point asking again.
+        :return: None, the fetch's price.
+        """
+        print(f"[{self.symbol}] Failed to convert price to float: {error}")
+        return None
+
+    def answered(self, status, price, retry_after=None):
+        """
+        The server answered.
+        :return: True if the fetch is over (self.price holds the price, or None), False to try again.
+        """
+        if status == 429:  # Rate limited
+            self._rate_limiter.on_throttled(parse_retry_after(retry_after))  # Back off for every worker
+            print(f"[{self.symbol}] 429 received. Retrying at {self._rate_limiter.snapshot()['rate']} req/s...")
+            return False
+        if status != 200:  # Any other HTTP error
+            print(f"[{self.symbol}] Error: {status}")
+        elif price is None:  # If no price element found
+            print(f"[{self.symbol}] Price element not found.")
+        self.price = price if status == 200 else None
+        return True
+
+    def give_up(self):
+        """
+        Every attempt is used up, or the deadline passed.
+        :return: None, the fetch's price.
+        """
+        if self.expired():
+            print(f"[{self.symbol}] No price within the {self._seconds}s deadline")
+        return None
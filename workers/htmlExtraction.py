@@ -0,0 +1,127 @@
+import re  # Precompiled selectors
+from html import unescape  # Decode entities in extracted text
+
+# Wikipedia S&P 500 constituents table
+_CONSTITUENTS_TABLE = re.compile(r'<table\b[^>]*\bid\s*=\s*["\']?constituents\b[^>]*>', re.IGNORECASE)
+_ROW = re.compile(r'<tr\b[^>]*>(.*?)</tr\s*>', re.IGNORECASE | re.DOTALL)
+_FIRST_CELL = re.compile(r'<td\b[^>]*>(.*?)</td\s*>', re.IGNORECASE | re.DOTALL)
+_TABLE_END = re.compile(r'</table\s*>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+
+# Yahoo Finance quote page: the price span, and the streamer element older layouts use
+_QSP_PRICE = re.compile(r'<span\b[^>]*\bdata-testid\s*=\s*["\']qsp-price["\'][^>]*>\s*([^<]+?)\s*<', re.IGNORECASE)
+_MARKET_PRICE_STREAMER = re.compile(
+    r'<fin-streamer\b(?=[^>]*\bdata-field\s*=\s*["\']regularMarketPrice["\'])[^>]*\bdata-value\s*=\s*["\']([^"\']+)["\']',
+    re.IGNORECASE
+)
+_PRICE_PATTERNS = (_QSP_PRICE, _MARKET_PRICE_STREAMER)
+_PRICE_OVERLAP = 2048  # Characters kept from the previous chunk so a tag split across chunks is still matched
+
+
+def _cell_text(cell_html):
+    """
+    Text of a table cell with tags removed and whitespace stripped, like get_text(strip=True).
+    """
+    return unescape(_TAG.sub('', cell_html)).strip()
+
+
+class ConstituentsSymbolScanner:
+    """
+    Incremental extractor for the symbols in the Wikipedia constituents table.
+
+    feed() takes the page in arbitrary text chunks and returns the symbols found in
+    the rows completed so far, so symbols can be passed on while the body is still
+    downloading. It skips everything before the table, keeps only the unfinished row
+    in its buffer, and sets `done` at the closing </table>, after which the rest of
+    the page can be discarded.
+    """
+    def __init__(self):
+        self._buffer = ''
+        self.found_table = False
+        self.done = False
+
+    def feed(self, chunk):
+        """
+        :param chunk: Next piece of the page.
+        :return: List of symbols completed by this chunk.
+        """
+        if self.done:
+            return []
+        self._buffer += chunk
+        if not self.found_table:
+            match = _CONSTITUENTS_TABLE.search(self._buffer)
+            if match is None:
+                self._buffer = self._buffer[-256:]  # Keep enough to match a tag split across chunks
+                return []
+            self.found_table = True
+            self._buffer = self._buffer[match.end():]
+
+        symbols = []
+        table_end = _TABLE_END.search(self._buffer)
+        body = self._buffer if table_end is None else self._buffer[:table_end.start()]
+        position = 0
+        for row in _ROW.finditer(body):
+            cell = _FIRST_CELL.search(row.group(1))
+            if cell is not None:  # Header rows only have <th>
+                symbols.append(_cell_text(cell.group(1)))
+            position = row.end()
+        if table_end is not None:
+            self.done = True
+            self._buffer = ''
+        else:
+            self._buffer = self._buffer[position:]
+        return symbols
+
+
+def iter_company_symbols(chunks):
+    """
+    Yield constituents symbols from an iterable of text chunks, stopping at the end of the table.
+    """
+    scanner = ConstituentsSymbolScanner()
+    for chunk in chunks:
+        yield from scanner.feed(chunk)
+        if scanner.done:
+            return
+
+
+def extract_company_symbols(page_html):
+    """
+    Return the constituents symbols of a complete page, or None if the page has no constituents table.
+    """
+    scanner = ConstituentsSymbolScanner()
+    symbols = scanner.feed(page_html)
+    return symbols if scanner.found_table else None
+
+
+class PriceScanner:
+    """
+    Incremental extractor for the price on a Yahoo Finance quote page.
+    feed() returns the price text as soon as the price element has streamed in.
+    """
+    def __init__(self):
+        self._tail = ''
+        self.price_text = None
+
+    def feed(self, chunk):
+        """
+        :param chunk: Next piece of the page.
+        :return: The price text (e.g. '1,234.56') once found, else None.
+        """
+        if self.price_text is not None:
+            return self.price_text
+        window = self._tail + chunk
+        for pattern in _PRICE_PATTERNS:
+            match = pattern.search(window)
+            if match is not None:
+                self.price_text = match.group(1)
+                return self.price_text
+        self._tail = window[-_PRICE_OVERLAP:]
+        return None
+
+
+def price_from_text(price_text):
+    """
+    Convert the scraped price text to float.
+    :raises ValueError: If the text is not a number.
+    """
+    return float(price_text.replace(',', '').strip())
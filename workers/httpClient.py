@@ -0,0 +1,128 @@
+import codecs  # Incremental decoding of streamed bodies
+import threading  # Guards the shared session
+import time  # Monotonic clock for read deadlines
+import requests  # HTTP client
+import urllib3  # Exceptions of raw body reads
+from requests.adapters import HTTPAdapter  # Per-host keep-alive connection pools
+
+from workers.stageMetrics import timed_wait  # Records HTTP wait time for the running stage
+
+try:  # urllib3 only decodes brotli when one of these packages is installed
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_CONNECT_TIMEOUT = 3.05  # Seconds to establish a connection
+DEFAULT_READ_TIMEOUT = 10  # Seconds to wait for the server between bytes
+DEFAULT_POOL_HOSTS = 10  # Number of hosts to keep a connection pool for
+
+_session = None  # Process-wide requests.Session
+_adapter = None  # Its one HTTPAdapter, shared by http:// and https://
+_pool_size = 0  # Connections the adapter keeps alive per host
+_reserved = 0  # Workers that reserved a connection
+_lock = threading.Lock()
+
+
+def _mount_adapter(pool_size):
+    """
+    Mount a new HTTPAdapter keeping pool_size connections alive per host, replacing the current one.
+    Requests in flight on the old adapter finish normally; its connections are closed as they come back.
+    """
+    global _adapter
+    old_adapter = _adapter
+    _adapter = HTTPAdapter(pool_connections=DEFAULT_POOL_HOSTS, pool_maxsize=max(1, pool_size))
+    _session.mount('https://', _adapter)
+    _session.mount('http://', _adapter)
+    if old_adapter is not None:
+        old_adapter.close()
+
+
+def get_session():
+    """
+    Return the requests.Session shared by every worker in this process.
+    Connections are kept alive and reused, so each request skips the TCP and TLS handshake.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers['Accept-Encoding'] = ACCEPT_ENCODING  # Responses are decompressed transparently
+            _mount_adapter(_pool_size)
+        return _session
+
+
+def size_pools(connections):
+    """
+    Keep `connections` connections alive per host, one per worker that makes requests. The pipeline
+    executor calls this once with its total instance count before any worker starts, so the adapter
+    is sized once and reserve_connections() has nothing left to do.
+    """
+    global _pool_size
+    with _lock:
+        if connections > _pool_size:
+            _pool_size = connections
+            if _session is not None:
+                _mount_adapter(_pool_size)
+
+
+def reserve_connections(count=1):
+    """
+    Reserve count keep-alive connections per host. Every worker that makes requests calls this once;
+    the pools only grow (by mounting a larger adapter) when more workers reserve than size_pools()
+    planned for, e.g. outside a pipeline.
+    """
+    global _reserved
+    session = get_session()
+    with _lock:
+        _reserved += count
+        reserved = _reserved
+    size_pools(reserved)
+    return session
+
+
+def get(url, headers=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, **kwargs):
+    """
+    GET url through the shared session.
+    :param headers: Extra headers, merged over the session defaults.
+    :param connect_timeout: Seconds to establish a connection.
+    :param read_timeout: Seconds to wait for the server between bytes.
+    :return: requests.Response
+    """
+    with timed_wait('http'):  # Until the response headers arrive (the whole body unless stream=True)
+        return get_session().get(url, headers=headers, timeout=(connect_timeout, read_timeout), **kwargs)
+
+
+def iter_text(response, chunk_size=16384, deadline=None, abandoned=None):
+    """
+    Yield a response opened with stream=True as decoded text, chunk by chunk as it arrives.
+    Unlike iter_content(), each read returns whatever the server has sent so far instead of
+    waiting for chunk_size bytes, so a slowly trickling body can't hold a read past deadline.
+    :param chunk_size: Most bytes to read at once.
+    :param deadline: time.monotonic() by which the whole body must be read (optional).
+    :param abandoned: threading.Event set once nobody waits for the body any more (optional).
+    :raises TimeoutError: If deadline passes, or abandoned is set, before the body is read.
+    :raises requests.exceptions.RequestException: On network errors, like iter_content().
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Body of {response.url} not read by the deadline")
+        if abandoned is not None and abandoned.is_set():
+            raise TimeoutError(f"Body of {response.url} no longer wanted")
+        try:
+            data = response.raw.read1(chunk_size, decode_content=True)  # Decompressed as well
+        except urllib3.exceptions.HTTPError as e:  # Surface them as requests' own exceptions, like iter_content()
+            raise requests.exceptions.ConnectionError(e) from e
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
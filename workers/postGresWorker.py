@@ -1,102 +1,464 @@
 import threading  # For creating and managing threads
 import os  # For accessing environment variables
-from dotenv import load_dotenv  # For loading environment variables from a .env file
-from sqlalchemy import create_engine, text  # For database connection and SQL query construction
+import time  # For measuring how long a batch has been buffering
+from collections import deque  # Rows per queue item awaiting acknowledgement
 from urllib.parse import quote_plus  # For safely encoding the database password in the URL
 from queue import Queue  # For thread-safe queues (not used directly here, but for type hinting)
 from datetime import datetime, timezone  # For handling timestamps and timezones
 
-# Load environment variables from .env file into the process environment
-load_dotenv()
+from workers.queueWorkers import QueueConsumerWorker  # Blocking queue consumer base class
+from workers.priceRecords import PriceBatch  # Columnar batches of prices
+from workers.stageMetrics import current_stage, timed_wait  # Records database waits and failures for the running stage
 
-class PostGresMasterScheduler(threading.Thread):
+# python-dotenv and SQLAlchemy are imported on first use: SQLAlchemy alone adds ~0.2s to an import of this module
+_environment_loaded = False  # Whether .env has been loaded into the process environment
+_engines = {}  # Process-wide cache of SQLAlchemy engines, keyed by database URL
+_engines_lock = threading.Lock()  # Guards _engines so concurrent schedulers share a single engine
+_upsert_support = {}  # Database URL -> whether prices has the unique index the upsert needs
+_upsert_lock = threading.Lock()  # Guards _upsert_support, never held while the database is asked
+PRICES_UNIQUE_INDEX = 'prices_symbol_extracted_time_key'  # Unique (symbol, extracted_time), target of ON CONFLICT
+MAX_RETRY_DELAY = 30.0  # Longest wait, in seconds, before retrying a batch the database rejected
+DEFAULT_RETRY_FOR = 300.0  # Seconds a failing batch is retried before the writer gives up
+
+
+def load_environment():
+    """
+    Load environment variables from the .env file into the process environment, once.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv  # For loading environment variables from a .env file
+        load_dotenv()
+        _environment_loaded = True
+
+
+def build_database_url():
+    """
+    Build the database URL from environment variables.
+    DATABASE_URL wins when set (e.g. 'sqlite:///prices.db' for a local stand-in),
+    otherwise the PG_* variables are used to build a PostgreSQL URL.
+    """
+    load_environment()
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        return database_url
+
+    # Read database connection parameters from environment variables
+    pg_user = os.getenv('PG_USER', '')
+    pg_password = os.getenv('PG_PASSWORD', '')
+    pg_host = os.getenv('PG_HOST', 'localhost')
+    pg_port = os.getenv('PG_PORT', '5432')
+    pg_database = os.getenv('PG_DATABASE', '')
+
+    # Safely encode the password for use in the database URL
+    safe_password = quote_plus(pg_password)
+    return f'postgresql://{pg_user}:{safe_password}@{pg_host}:{pg_port}/{pg_database}'
+
+
+def get_engine(database_url=None):
+    """
+    Return the shared SQLAlchemy engine (and therefore connection pool) for database_url.
+    The engine is created once per process and reused by every scheduler and worker.
+    """
+    database_url = database_url or build_database_url()
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            from sqlalchemy import create_engine  # For database connection pooling
+            engine = create_engine(database_url, pool_pre_ping=True)
+            _engines[database_url] = engine
+        return engine
+
+
+def create_unique_index(engine):
+    """
+    Setup step: create the unique index on prices (symbol, extracted_time) that makes inserts
+    idempotent upserts. Run it once per database (`python -m workers.postGresWorker`), like any
+    other migration; the writers only check that it exists.
+    """
+    from sqlalchemy import text
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {PRICES_UNIQUE_INDEX} ON prices (symbol, extracted_time)"
+        ))
+    with _upsert_lock:
+        _upsert_support.pop(str(engine.url), None)  # Checked again on the next lookup
+
+
+def has_unique_index(engine):
+    """
+    Whether prices has a unique index (or key) on (symbol, extracted_time), so inserts can be
+    idempotent upserts. Looked up in the catalog once per database, without any DDL.
+    :return: True or False, or None if the database couldn't be asked (e.g. it is down); writers
+             then insert plainly and ask again on their next write.
+    """
+    from sqlalchemy import inspect
+
+    database_url = str(engine.url)
+    supported = _upsert_support.get(database_url)
+    if supported is not None:
+        return supported
+    columns = {'symbol', 'extracted_time'}
+    try:
+        inspector = inspect(engine)
+        if not inspector.has_table('prices'):
+            return None  # Not created yet
+        keys = [index['column_names'] for index in inspector.get_indexes('prices') if index['unique']]
+        keys += [constraint['column_names'] for constraint in inspector.get_unique_constraints('prices')]
+        keys.append(inspector.get_pk_constraint('prices')['constrained_columns'])
+    except Exception:
+        return None
+    supported = any(set(key) == columns for key in keys)
+    with _upsert_lock:
+        first_answer = database_url not in _upsert_support  # Writers starting together may all have asked
+        _upsert_support[database_url] = supported
+    if first_answer and not supported:
+        print(f"⚠️ No unique index on prices (symbol, extracted_time), replayed rows may be duplicated. "
+              f"Create it with `python -m workers.postGresWorker`")
+    return supported
+
+
+def ensure_datetime(extracted_time):
+    """
+    Convert extracted_time to a timezone-aware datetime object.
+    Accepts UNIX timestamps (int/float) or datetime objects.
+    """
+    if isinstance(extracted_time, int):  # If it's a UNIX timestamp (seconds)
+        return datetime.fromtimestamp(extracted_time, tz=timezone.utc)
+    elif isinstance(extracted_time, float):  # If it's a UNIX timestamp (float)
+        return datetime.fromtimestamp(int(extracted_time), tz=timezone.utc)
+    elif isinstance(extracted_time, datetime):  # If it's already a datetime
+        if extracted_time.tzinfo is None:
+            return extracted_time.replace(tzinfo=timezone.utc)  # Make it timezone-aware
+        return extracted_time
+    else:
+        raise ValueError("Invalid extracted_time format")  # Raise error for unsupported types
+
+
+def create_insert_query(upsert=False):
+    """
+    Construct a parameterized SQL insert query for the prices table.
+    Executed with a list of parameter dicts, SQLAlchemy sends it as a multi-row insert.
+    :param upsert: Skip rows whose (symbol, extracted_time) is already stored, so replays are
+                   idempotent (needs the unique index from create_unique_index()).
+    """
+    from sqlalchemy import text  # For SQL query construction
+
+    return text("""
+        INSERT INTO prices (symbol, price, extracted_time)
+        VALUES (:symbol, :price, :extracted_time)
+    """ + ("ON CONFLICT (symbol, extracted_time) DO NOTHING" if upsert else ""))
+
+
+class PostGresBatchWriter:
+    """
+    Buffers rows and writes them to the prices table in size- or time-bounded batches.
+    All writers share the process-wide engine returned by get_engine(), looked up on the
+    first write, so creating a writer (and scaling up its stage) stays cheap.
+    Rows are upserted on (symbol, extracted_time) whenever the unique index exists, so a
+    resumed run that replays rows doesn't duplicate them.
+    A batch that fails to write stays buffered and is retried after a growing delay, so
+    buffered_rows() only ever goes down for rows that were committed. Once writes have
+    failed for retry_for seconds in a row, flush() raises instead.
+    """
+    INSERT_METHODS = ('values', 'copy')
+
+    def __init__(self, batch_size=100, flush_interval=1.0, database_url=None, insert_method='values',
+                 retry_for=DEFAULT_RETRY_FOR):
+        """
+        :param batch_size: Flush as soon as this many rows are buffered.
+        :param flush_interval: Flush rows that have been buffered for this many seconds.
+        :param database_url: Optional SQLAlchemy URL; defaults to build_database_url().
+        :param insert_method: 'values' for a multi-row INSERT, 'copy' for PostgreSQL COPY.
+        :param retry_for: Seconds to keep retrying failed writes before flush() raises.
+        """
+        if insert_method not in self.INSERT_METHODS:
+            raise ValueError(f"Unknown insert_method {insert_method!r}, expected one of {self.INSERT_METHODS}")
+        self._batch_size = max(1, int(batch_size))
+        self._flush_interval = float(flush_interval)
+        self._insert_method = insert_method
+        self._database_url = database_url
+        self.retry_for = float(retry_for)
+        self._engine = None  # Set by _connect() on the first write
+        self._upsert = False
+        self._insert_query = None
+        self._rows = []  # Rows waiting to be written
+        self._first_row_time = None  # monotonic() time the oldest buffered row arrived
+        self._failures = 0  # Consecutive failed flushes
+        self._retry_at = None  # monotonic() time to retry a failed flush at
+        self._failing_since = None  # monotonic() time of the first failure in a row
+
+    def add(self, symbol, price, extracted_time):
+        """
+        Buffer a single row, flushing if the batch is full.
+        """
+        if not self._rows:
+            self._first_row_time = time.monotonic()
+        self._rows.append({
+            'symbol': symbol,
+            'price': price,
+            'extracted_time': ensure_datetime(extracted_time)
+        })
+        if len(self._rows) >= self._batch_size and self._retry_at is None:
+            self.flush()
+
+    def add_batch(self, batch):
+        """
+        Buffer every row of a PriceBatch at once (its timestamps are already normalized),
+        flushing if the batch is full.
+        """
+        if not len(batch):
+            return
+        if not self._rows:
+            self._first_row_time = time.monotonic()
+        self._rows.extend(batch.rows())
+        if len(self._rows) >= self._batch_size and self._retry_at is None:
+            self.flush()
+
+    def buffered_rows(self):
+        """
+        Number of rows waiting to be written.
+        """
+        return len(self._rows)
+
+    def time_until_flush(self):
+        """
+        Seconds until the buffered rows are due to be flushed, or None if the buffer is empty.
+        """
+        if not self._rows:
+            return None
+        if self._retry_at is not None:  # Backing off after a failed flush
+            return max(0.0, self._retry_at - time.monotonic())
+        return max(0.0, self._flush_interval - (time.monotonic() - self._first_row_time))
+
+    def flush_if_due(self):
+        """
+        Flush the buffer if its oldest row has waited at least flush_interval seconds.
+        """
+        if self._rows and self.time_until_flush() == 0.0:
+            self.flush()
+
+    def flush(self):
+        """
+        Write every buffered row in a single transaction.
+        Returns the number of rows written: 0 if the write failed, in which case the rows stay
+        buffered and time_until_flush() says when to retry them.
+        :raises Exception: What the database raised, once writes have failed for retry_for seconds
+                           (the rows stay buffered, for the caller to report).
+        """
+        if not self._rows:
+            return 0
+        rows, self._rows = self._rows, []
+        try:
+            written = self.write_rows(rows)
+        except Exception:
+            self._rows = rows + self._rows  # Oldest first, as they arrived
+            now = time.monotonic()
+            if self._failing_since is None:
+                self._failing_since = now
+            self._failures += 1
+            if now - self._failing_since >= self.retry_for:
+                print(f"❌ Giving up on {len(self._rows)} rows after {self._failures} failed writes "
+                      f"in {round(now - self._failing_since, 1)}s")
+                raise
+            self._retry_at = now + min(self._flush_interval * 2 ** (self._failures - 1), MAX_RETRY_DELAY)
+            return 0
+        self._first_row_time = None
+        self._failures = 0
+        self._retry_at = None
+        self._failing_since = None
+        return written
+
+    def write_rows(self, rows):
+        """
+        Write a list of row dicts (symbol, price, extracted_time) in a single transaction,
+        bypassing the buffer. Returns the number of rows written.
+        :raises Exception: Whatever the database raised, after logging it; nothing was written.
+        """
+        if not rows:
+            return 0
+        try:
+            with timed_wait('db'):
+                self._connect()
+                if self._insert_method == 'copy' and self._engine.dialect.name == 'postgresql':
+                    self._copy_rows(rows)
+                else:
+                    with self._engine.begin() as connection:  # One transaction per batch
+                        connection.execute(self._insert_query, rows)
+            print(f"✅ Inserted batch of {len(rows)} rows")
+            return len(rows)
+        except Exception as e:
+            print(f"❌ Error inserting batch of {len(rows)} rows: {e}")  # Print error if insertion fails
+            stage = current_stage()
+            if stage is not None:
+                stage.record_error()
+            raise
+
+    def _connect(self):
+        """
+        Look up the shared engine and check upsert support, once per writer (until the check gets an answer).
+        """
+        if self._engine is None or self._upsert is None:
+            engine = get_engine(self._database_url)
+            self._upsert = has_unique_index(engine)
+            self._insert_query = create_insert_query(upsert=bool(self._upsert))
+            self._engine = engine
+        return self._engine
+
+    def _copy_rows(self, rows):
+        """
+        Stream rows into the prices table with COPY ... FROM STDIN (psycopg2 only).
+        When upserting, rows are copied into a temporary table and moved over with
+        INSERT ... ON CONFLICT DO NOTHING, since COPY itself can't skip conflicts.
+        """
+        import csv
+        import io
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            price = '' if row['price'] is None else row['price']  # Empty unquoted field is NULL in CSV COPY
+            writer.writerow([row['symbol'], price, row['extracted_time'].isoformat()])
+        buffer.seek(0)
+
+        connection = self._engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                table = 'prices'
+                if self._upsert:
+                    table = 'prices_staging'
+                    cursor.execute(
+                        "CREATE TEMP TABLE prices_staging "
+                        "(symbol text, price double precision, extracted_time timestamptz) ON COMMIT DROP"
+                    )
+                cursor.copy_expert(
+                    f"COPY {table} (symbol, price, extracted_time) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+                if self._upsert:
+                    cursor.execute(
+                        "INSERT INTO prices (symbol, price, extracted_time) "
+                        "SELECT symbol, price, extracted_time FROM prices_staging "
+                        "ON CONFLICT (symbol, extracted_time) DO NOTHING"
+                    )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+
+class PostGresMasterScheduler(QueueConsumerWorker):
     """
-    Threaded scheduler that listens to an input queue for data and delegates
-    insertion tasks to PostGresWorker instances.
+    Threaded scheduler that listens to an input queue for data and writes it
+    to the database in batches through a PostGresBatchWriter.
     """
     def __init__(self, input_queue=None, output_queue=None, **kwargs):
         """
         Initialize the scheduler thread with input and output queues.
+        Accepts batch_size, flush_interval, database_url, insert_method and retry_for to configure batching.
         Starts the thread immediately.
         """
-        self._input_queue = input_queue  # Queue from which to receive data
-        self._output_queue = output_queue  # (Unused) Queue for output, if needed
-        # Remove input_queue and output_queue from kwargs to avoid passing them to Thread
-        kwargs.pop('input_queue', None)
-        kwargs.pop('output_queue', None)
-        super(PostGresMasterScheduler, self).__init__(**kwargs)  # Initialize the Thread
+        self._batch_size = kwargs.pop('batch_size', 100)
+        self._writer = PostGresBatchWriter(
+            batch_size=self._batch_size,
+            flush_interval=kwargs.pop('flush_interval', 1.0),
+            database_url=kwargs.pop('database_url', None),
+            insert_method=kwargs.pop('insert_method', 'values'),
+            retry_for=kwargs.pop('retry_for', DEFAULT_RETRY_FOR),
+        )
+        self._unwritten = deque()  # Rows in each queue item taken but not yet fully written, oldest first
+        self._unwritten_rows = 0
+        super(PostGresMasterScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue, **kwargs)
         self.start()  # Start the thread
 
-    def run(self):
+    def consume(self):
         """
-        Main loop for the thread. Continuously checks the input queue for data.
-        For each data item, creates a PostGresWorker to insert it into the database.
+        Main loop for the thread. Drains up to batch_size queue items at a time from the
+        input queue into the batch writer, flushing when the batch is full or has
+        waited flush_interval seconds. Items are single rows or PriceBatches of rows, and
+        are acknowledged only once all their rows are committed. While the database is
+        failing, the buffered rows are retried before any more items are taken; after
+        retry_for seconds of failures the thread raises, failing the stage, and the items
+        left unacknowledged are redelivered by a broker.
         Stops when it receives a "DONE" signal.
         """
         while True:
-            if not self._input_queue.empty():  # Check if there is data in the queue
-                data = self._input_queue.get()  # Retrieve data from the queue
-                if data == "DONE":  # Special signal to stop the thread
-                    break
-                print(f"Received val: {data}")
-                symbol, price, extracted_time = data  # Unpack the data tuple
-                # Create a worker to handle the database insertion
-                postGresWorker = PostGresWorker(symbol=symbol, price=price, extracted_time=extracted_time)
-                postGresWorker.insert_into_database()   
-                # self._input_queue.task_done()  # (Optional) Mark the task as done
+            if self._writer.buffered_rows() >= self._batch_size:  # Only a failed flush leaves a full buffer
+                time.sleep(self._writer.time_until_flush())
+                self._writer.flush()
+                self._acknowledge_written()
+                continue
+            # Wait no longer than the flush deadline of the rows already buffered
+            items, end_of_stream = self.get_many(self._batch_size, timeout=self._writer.time_until_flush())
+            started = time.perf_counter()
+            rows = 0
+            for item in items:
+                if isinstance(item, PriceBatch):
+                    self._writer.add_batch(item)
+                    self._unwritten.append(len(item))
+                else:
+                    symbol, price, extracted_time = item  # Unpack the data record
+                    self._writer.add(symbol, price, extracted_time)
+                    self._unwritten.append(1)
+                rows += self._unwritten[-1]
+            if not end_of_stream:
+                self._writer.flush_if_due()
+            if rows:
+                self._metrics.record_item(time.perf_counter() - started, items=rows)
+            self._unwritten_rows += rows
+            self._acknowledge_written()
+            if end_of_stream:  # Special signal to stop the thread
+                break
+        self._writer.flush()  # Write any remaining rows before exiting
+        self._acknowledge_written()
+        while self._writer.buffered_rows():  # That failed: retry until it works or the writer gives up and raises
+            time.sleep(self._writer.time_until_flush())
+            self._writer.flush()
+            self._acknowledge_written()
+
+    def _acknowledge_written(self):
+        """
+        Acknowledge the items whose rows have all left the writer's buffer, i.e. were committed.
+        """
+        written = self._unwritten_rows - self._writer.buffered_rows()
+        acknowledged = 0
+        while self._unwritten and self._unwritten[0] <= written:
+            written -= self._unwritten[0]
+            self._unwritten_rows -= self._unwritten.popleft()
+            acknowledged += 1
+        if self._unwritten:  # Part of the oldest item is written; don't count it again
+            self._unwritten[0] -= written
+            self._unwritten_rows -= written
+        self.acknowledge(acknowledged)
 
 class PostGresWorker:
     """
     Handles the insertion of a single record into the PostgreSQL database.
     """
-    def __init__(self, symbol, price, extracted_time):
+    def __init__(self, symbol, price, extracted_time, database_url=None):
         """
         Initialize the worker with symbol, price, and extracted_time.
-        Sets up the database engine using environment variables.
+        Uses the shared process-wide database engine.
         """
         self._symbol = symbol  # The symbol to insert (e.g., stock ticker)
         self._price = price  # The price value to insert
         self._extracted_time = self._ensure_datetime(extracted_time)  # Ensure extracted_time is a datetime object
-        
-        # Read database connection parameters from environment variables
-        pg_user = os.getenv('PG_USER', '')
-        pg_password = os.getenv('PG_PASSWORD', '')
-        pg_host = os.getenv('PG_HOST', 'localhost')
-        pg_port = os.getenv('PG_PORT', '5432')
-        pg_database = os.getenv('PG_DATABASE', '')
-
-        # Safely encode the password for use in the database URL
-        safe_password = quote_plus(pg_password)
-
-        # Create a SQLAlchemy engine for connecting to the PostgreSQL database
-        self._engine = create_engine(
-            f'postgresql://{pg_user}:{safe_password}@{pg_host}:{pg_port}/{pg_database}'
-        )
+        self._database_url = database_url  # The shared engine is looked up when the row is inserted
 
     def _ensure_datetime(self, extracted_time):
         """
         Convert extracted_time to a timezone-aware datetime object.
         Accepts UNIX timestamps (int/float) or datetime objects.
         """
-        if isinstance(extracted_time, int):  # If it's a UNIX timestamp (seconds)
-            return datetime.fromtimestamp(extracted_time, tz=timezone.utc)
-        elif isinstance(extracted_time, float):  # If it's a UNIX timestamp (float)
-            return datetime.fromtimestamp(int(extracted_time), tz=timezone.utc)
-        elif isinstance(extracted_time, datetime):  # If it's already a datetime
-            if extracted_time.tzinfo is None:
-                return extracted_time.replace(tzinfo=timezone.utc)  # Make it timezone-aware
-            return extracted_time
-        else:
-            raise ValueError("Invalid extracted_time format")  # Raise error for unsupported types
+        return ensure_datetime(extracted_time)
 
     def _create_insert_query(self):
         """
         Construct a parameterized SQL insert query for the prices table.
         """
-        return text("""
-            INSERT INTO prices (symbol, price, extracted_time)
-            VALUES (:symbol, :price, :extracted_time)
-        """)
+        return create_insert_query(upsert=bool(has_unique_index(get_engine(self._database_url))))
 
     def insert_into_database(self):
         """
@@ -104,8 +466,9 @@ class PostGresWorker:
         Prints success or error messages.
         """
         insert_query = self._create_insert_query()  # Get the SQL query
+        engine = get_engine(self._database_url)  # Shared engine, no new pool per row
         try:
-            with self._engine.connect() as connection:  # Open a database connection
+            with engine.connect() as connection:  # Open a database connection
                 with connection.begin():  # Start a transaction (commits on exit)
                     connection.execute(insert_query, {
                         'symbol': self._symbol,
@@ -115,3 +478,9 @@ class PostGresWorker:
                 print(f"✅ Inserted {self._symbol} with price {self._price} at {self._extracted_time}")
         except Exception as e:
             print(f"❌ Error inserting data for {self._symbol}: {e}")  # Print error if insertion fails
+
+
+if __name__ == "__main__":
+    # Setup step for the database in DATABASE_URL (or PG_*): the index replayed rows are deduplicated on
+    create_unique_index(get_engine())
+    print(f"✅ {PRICES_UNIQUE_INDEX} is in place")
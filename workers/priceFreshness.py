@@ -0,0 +1,106 @@
+import threading  # Guards a tracker shared by every instance of a stage
+import time  # Wall clock ages, comparable across nodes
+
+from workers.sharedRegistry import SharedRegistry  # Trackers are shared per stage
+
+
+class PriceTracker:
+    """
+    Last price and last successful fetch of every symbol a stage polls.
+
+    observe() tells the stage whether a price changed since the symbol's previous poll,
+    so a streaming pipeline can send only changes downstream (delta suppression), and
+    snapshot() reports how fresh the symbols' prices are: the age of each symbol's last
+    successful fetch, whether or not its price changed. A failed fetch (no price) leaves
+    the symbol's age growing. Symbols that haven't been polled at all for forget_after
+    seconds (dropped from the universe) are forgotten instead of counting as stale.
+    """
+    def __init__(self, stale_after=None, forget_after=3600.0):
+        """
+        :param stale_after: Age in seconds above which a symbol counts as stale in snapshots (optional).
+        :param forget_after: Seconds after its last poll attempt before a symbol is forgotten.
+        """
+        self.stale_after = stale_after
+        self._forget_after = forget_after
+        self._prices = {}  # symbol -> last price
+        self._fetched = {}  # symbol -> time of the last successful fetch
+        self._polled = {}  # symbol -> time of the last attempt, successful or not
+        self._changed = 0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def observe(self, symbol, price, now=None):
+        """
+        Record one poll of symbol.
+        :return: True if price is new or differs from the previous one, False if unchanged or missing.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._polled[symbol] = now
+            if price is None:  # Fetch failed, the last known price stays current
+                return False
+            self._fetched[symbol] = now
+            changed = self._prices.get(symbol) != price
+            self._prices[symbol] = price
+            if changed:
+                self._changed += 1
+            else:
+                self._suppressed += 1
+            return changed
+
+    def _forget(self, now):
+        for symbol in [symbol for symbol, polled in self._polled.items() if now - polled > self._forget_after]:
+            del self._polled[symbol]
+            self._prices.pop(symbol, None)
+            self._fetched.pop(symbol, None)
+
+    def ages(self, now=None):
+        """
+        {symbol: seconds since its last successful fetch (None if it never had one)}.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._forget(now)
+            return {symbol: (now - self._fetched[symbol]) if symbol in self._fetched else None
+                    for symbol in self._polled}
+
+    def snapshot(self, now=None):
+        """
+        Symbol count, age percentiles and maximum, stale and never-fetched counts, and the
+        number of changed and suppressed (unchanged) prices so far.
+        """
+        ages = self.ages(now)
+        known = sorted(age for age in ages.values() if age is not None)
+
+        def percentile(fraction):
+            return round(known[min(len(known) - 1, int(fraction * len(known)))], 3) if known else None
+
+        snapshot = {
+            'symbols': len(ages),
+            'never_fetched': len(ages) - len(known),
+            'age_p50': percentile(0.5),
+            'age_p95': percentile(0.95),
+            'age_max': round(known[-1], 3) if known else None,
+            'changed': self._changed,
+            'suppressed': self._suppressed,
+        }
+        if self.stale_after is not None:
+            snapshot['stale'] = sum(1 for age in ages.values() if age is None or age > self.stale_after)
+        return snapshot
+
+
+_trackers = SharedRegistry(PriceTracker, 'price tracker')  # One per stage in the process
+
+
+def get_price_tracker(stage_name, **config):
+    """
+    Return the tracker shared by every worker of stage_name.
+    """
+    return _trackers.get(stage_name, **config)
+
+
+def freshness_snapshots():
+    """
+    Snapshot of every tracker in the process, keyed by stage.
+    """
+    return _trackers.snapshots()
@@ -0,0 +1,161 @@
+import math  # NaN stands in for a missing price in the price column
+from array import array  # Compact typed columns
+from datetime import datetime, timezone  # Timestamps are normalized to UTC epoch seconds
+
+
+def epoch_seconds(extracted_time):
+    """
+    UTC epoch seconds for a timestamp: a datetime (naive ones are taken as UTC) or a UNIX timestamp.
+    """
+    if isinstance(extracted_time, datetime):
+        if extracted_time.tzinfo is None:
+            extracted_time = extracted_time.replace(tzinfo=timezone.utc)
+        return extracted_time.timestamp()
+    if isinstance(extracted_time, (int, float)):
+        return float(extracted_time)
+    raise ValueError("Invalid extracted_time format")
+
+
+class PriceRecord:
+    """
+    One scraped price: what the Yahoo Finance stage emits for each symbol.
+
+    Behaves like the (symbol, price, extracted_time) tuple it replaces: it unpacks,
+    indexes (so hash routes can key on record[0]) and compares equal to that tuple,
+    while __slots__ keeps it as small as one.
+    """
+    __slots__ = ('symbol', 'price', 'extracted_time')
+
+    def __init__(self, symbol, price, extracted_time):
+        self.symbol = symbol
+        self.price = price
+        self.extracted_time = extracted_time
+
+    def __iter__(self):
+        return iter((self.symbol, self.price, self.extracted_time))
+
+    def __getitem__(self, index):
+        return (self.symbol, self.price, self.extracted_time)[index]
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        if isinstance(other, (PriceRecord, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __reduce__(self):
+        return PriceRecord, tuple(self)
+
+    def __repr__(self):
+        return f"PriceRecord({self.symbol!r}, {self.price!r}, {self.extracted_time!r})"
+
+
+class PriceBatch:
+    """
+    Many prices as one queue item, stored by column: symbols in a list, prices and UTC
+    epoch timestamps in array('d') columns (a missing price is NaN).
+
+    Passing a batch instead of one item per price costs one queue put/get, one lock
+    round trip and a handful of objects per batch rather than per price, and timestamps
+    are normalized once, when a price joins the batch, rather than by every consumer.
+    Iterating yields PriceRecords; rows() builds the database rows in one pass, and
+    split() breaks a batch up for a hash route, so every symbol keeps its queue.
+    """
+    __slots__ = ('symbols', 'prices', 'timestamps')
+
+    def __init__(self, symbols=None, prices=None, timestamps=None):
+        """
+        :param symbols: List of symbols.
+        :param prices: array('d') of prices, NaN where missing.
+        :param timestamps: array('d') of UTC epoch seconds.
+        """
+        self.symbols = symbols if symbols is not None else []
+        self.prices = prices if prices is not None else array('d')
+        self.timestamps = timestamps if timestamps is not None else array('d')
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Batch of (symbol, price, extracted_time) records, PriceRecords or tuples.
+        """
+        batch = cls()
+        for symbol, price, extracted_time in records:
+            batch.append(symbol, price, extracted_time)
+        return batch
+
+    def append(self, symbol, price, extracted_time):
+        self.symbols.append(symbol)
+        self.prices.append(math.nan if price is None else price)
+        self.timestamps.append(epoch_seconds(extracted_time))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        for symbol, price, timestamp in zip(self.symbols, self.prices, self.timestamps):
+            yield PriceRecord(symbol, None if price != price else price,
+                              datetime.fromtimestamp(timestamp, tz=timezone.utc))
+
+    def split(self, partition):
+        """
+        Split the batch by partition(record), e.g. a hash route's queue index.
+        :return: {partition: PriceBatch of the records that map to it, in batch order}.
+        """
+        parts = {}
+        for record, price, timestamp in zip(self, self.prices, self.timestamps):
+            index = partition(record)
+            part = parts.get(index)
+            if part is None:
+                part = parts[index] = PriceBatch()
+            part.symbols.append(record.symbol)
+            part.prices.append(price)  # Columns copied as they are: no NaN or timestamp round trip
+            part.timestamps.append(timestamp)
+        return parts
+
+    def rows(self):
+        """
+        Row dicts (symbol, price, extracted_time) for PostGresBatchWriter, with aware datetimes.
+        """
+        fromtimestamp = datetime.fromtimestamp
+        return [
+            {'symbol': symbol, 'price': None if price != price else price,  # NaN is the only value unequal to itself
+             'extracted_time': fromtimestamp(timestamp, tz=timezone.utc)}
+            for symbol, price, timestamp in zip(self.symbols, self.prices, self.timestamps)
+        ]
+
+    def columns(self):
+        """
+        The batch as plain lists, for JSON: {symbols, prices (None where missing), timestamps}.
+        """
+        return {
+            'symbols': list(self.symbols),
+            'prices': [None if price != price else price for price in self.prices],
+            'timestamps': self.timestamps.tolist(),
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Inverse of columns().
+        """
+        return cls(list(columns['symbols']),
+                   array('d', (math.nan if price is None else price for price in columns['prices'])),
+                   array('d', columns['timestamps']))
+
+    def to_numpy(self):
+        """
+        (symbols, prices, timestamps) as NumPy arrays, sharing the price and timestamp buffers.
+        :raises ImportError: If NumPy is not installed (it is optional).
+        """
+        import numpy  # Optional, only needed by callers that want vectorized columns
+
+        return (numpy.array(self.symbols, dtype=object), numpy.frombuffer(self.prices, dtype=numpy.float64),
+                numpy.frombuffer(self.timestamps, dtype=numpy.float64))
+
+    def __repr__(self):
+        return f"PriceBatch({len(self)} prices)"
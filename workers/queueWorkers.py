@@ -0,0 +1,253 @@
+import threading  # Consumers run as threads, like every other worker
+import time  # Timing for stage metrics
+from queue import Empty  # Raised by get() when a timeout expires
+
+from workers.stageMetrics import bind_stage, registry  # Per-stage instrumentation
+
+END_OF_STREAM = "DONE"  # Sentinel the pipeline supervisor puts once per consumer when a stage's input ends
+RETIRE = "RETIRE"  # Sentinel the autoscaler puts to stop one consumer while the rest of the stage keeps running
+
+
+class QueueConsumerWorker(threading.Thread):
+    """
+    Base class for threaded workers that consume items from an input queue.
+
+    Consumers block in Queue.get() instead of spinning on empty(), so an idle
+    consumer costs no CPU. A subclass implements process_item(); the default
+    consume() loop calls it for every item until it receives END_OF_STREAM and
+    then calls on_end_of_stream(). Subclasses that work in batches can override
+    consume() and use get_many() instead.
+
+    run() attributes everything the thread does to its stage's metrics: time
+    blocked in get()/get_many() and put(), per-item latency, and any HTTP or
+    database waits recorded along the way.
+
+    With a checkpoint (pipeline_checkpoints.StageCheckpoint), items an earlier attempt
+    of the same run completed are not processed again: the outputs recorded for them
+    are put on the output queue instead. Only items that produced output, and whose outputs
+    is_complete() accepts, are recorded; the rest (e.g. a price that couldn't be fetched) are
+    tried again.
+
+    A RETIRE marker (sent by the autoscaler to shrink the stage) ends this instance
+    exactly like END_OF_STREAM, so buffered work is flushed the same way.
+
+    Every item taken from the input queue is acknowledged once it has been handled.
+    Broker-backed queues (pipeline_broker.RemoteQueue) redeliver items that never are,
+    so a consume() override must call acknowledge() itself, after its output is safe.
+
+    With output_batch_size above 1, outputs are gathered and put as one queue item per
+    output_batch_size outputs (or per output_flush_interval seconds, and at the end), built
+    by make_output_batch(). Input items are then acknowledged once the batch holding their
+    outputs has been put.
+
+    With a dead_letter_queue, an item whose process_item() raises is put on it (for a later
+    retry pass, e.g. a stage consuming that queue) instead of stopping the worker, and
+    subclasses can call dead_letter() for items they give up on. Dead-lettered items count
+    as errors and are not checkpointed, so a resumed run tries them again.
+
+    Like the other workers, subclasses call self.start() at the end of __init__.
+    """
+    def __init__(self, input_queue=None, output_queue=None, **kwargs):
+        """
+        :param input_queue: Queue to consume items from.
+        :param output_queue: Queue to put results in, or None for sink stages.
+        :param stage_name: Pipeline stage this worker belongs to, for metrics (defaults to the class name).
+        :param checkpoint: StageCheckpoint to skip and record completed items (optional).
+        :param output_batch_size: Outputs per batch put on the output queue (default 1: no batching).
+        :param output_flush_interval: Seconds a partial output batch may wait before it is put.
+        :param dead_letter_queue: Queue to put failed items on instead of stopping (optional).
+        """
+        self._input_queue = input_queue  # Queue to consume from
+        self._output_queue = output_queue  # Queue to put results in
+        # Remove these keys from kwargs before calling Thread.__init__()
+        kwargs.pop('input_queue', None)
+        kwargs.pop('output_queue', None)
+        self._stage_name = kwargs.pop('stage_name', None) or type(self).__name__
+        self._metrics = registry.stage(self._stage_name)
+        self._checkpoint = kwargs.pop('checkpoint', None)
+        self._recorded_outputs = None  # Outputs of the item being processed, while checkpointing
+        self._output_batch_size = max(1, int(kwargs.pop('output_batch_size', 1)))
+        self._output_flush_interval = float(kwargs.pop('output_flush_interval', 1.0))
+        self._output_buffer = [] if self._output_batch_size > 1 else None  # Outputs not put yet
+        self._output_deadline = None  # monotonic() time the buffered outputs are due
+        self._deferred_acks = 0  # Handled input items whose outputs are still buffered
+        self._dead_letter_queue = kwargs.pop('dead_letter_queue', None)
+        self._dead_lettered = False  # The item being processed went to the dead-letter queue
+        self.error = None  # Exception that ended the thread, if one did
+        super(QueueConsumerWorker, self).__init__(**kwargs)
+
+    def get(self, timeout=None):
+        """
+        Block until an item is available and return it.
+        Returns END_OF_STREAM when the stage's input has ended or this instance is retired.
+        :param timeout: Seconds to wait, or None to wait forever.
+        :raises queue.Empty: If timeout expires before an item arrives.
+        """
+        started = time.perf_counter()
+        try:
+            item = self._input_queue.get(timeout=timeout)
+        finally:
+            self._metrics.record_wait('input', time.perf_counter() - started)
+        return END_OF_STREAM if item == RETIRE else item
+
+    def get_many(self, max_items, timeout=None):
+        """
+        Block for the first item, then drain up to max_items without blocking again.
+        :param max_items: Maximum number of items to return.
+        :param timeout: Seconds to wait for the first item, or None to wait forever.
+        :return: (items, end_of_stream) where end_of_stream is True if END_OF_STREAM was received.
+                 items is empty if timeout expired first.
+        """
+        items = []
+        try:
+            item = self.get(timeout=timeout)
+        except Empty:
+            return items, False
+        while True:
+            if item == END_OF_STREAM:
+                return items, True
+            items.append(item)
+            if len(items) >= max_items:
+                return items, False
+            try:
+                item = self._input_queue.get_nowait()  # Drain whatever is already queued
+            except Empty:
+                return items, False
+            if item == RETIRE:
+                item = END_OF_STREAM
+
+    def put(self, item):
+        """
+        Put an item on the output queue, if this worker has one (through the output batch, when batching).
+        """
+        if self._recorded_outputs is not None:
+            self._recorded_outputs.append(item)
+        if self._output_buffer is None:
+            self._put_output(item)
+            return
+        if not self._output_buffer:
+            self._output_deadline = time.monotonic() + self._output_flush_interval
+        self._output_buffer.append(item)
+        if len(self._output_buffer) >= self._output_batch_size:
+            self.flush_output()
+
+    def _put_output(self, item):
+        if self._output_queue is not None:
+            started = time.perf_counter()
+            self._output_queue.put(item)  # Blocks while a bounded queue is full
+            self._metrics.record_wait('output', time.perf_counter() - started)
+
+    def make_output_batch(self, items):
+        """
+        The queue item that carries a batch of outputs. Override for a compact batch type.
+        """
+        return list(items)
+
+    def is_complete(self, outputs):
+        """
+        Whether an item that produced outputs is done for good, so a checkpoint records it.
+        Override to have items whose outputs only report a failure tried again on a resumed run.
+        """
+        return True
+
+    def flush_output(self):
+        """
+        Put the buffered outputs as one batch and acknowledge the input items they came from.
+        """
+        if self._output_buffer:
+            items, self._output_buffer = self._output_buffer, []
+            self._output_deadline = None
+            self._put_output(self.make_output_batch(items))
+        self.acknowledge(self._deferred_acks)
+        self._deferred_acks = 0
+
+    def _item_handled(self):
+        if self._output_buffer:
+            self._deferred_acks += 1  # Acknowledged once the batch holding its outputs is put
+        else:
+            self.acknowledge()
+
+    def acknowledge(self, count=1):
+        """
+        Tell the input queue that count more items taken from it have been fully handled.
+        """
+        task_done = getattr(self._input_queue, 'task_done', None)  # multiprocessing queues have none
+        for _ in range(count if task_done is not None else 0):
+            task_done()
+
+    def dead_letter(self, item):
+        """
+        Put item on the dead-letter queue instead of handling it, if this worker has one.
+        :return: True if it was put there, False if the caller has to deal with the failure itself.
+        """
+        if self._dead_letter_queue is None:
+            return False
+        started = time.perf_counter()
+        self._dead_letter_queue.put(item)
+        self._metrics.record_wait('output', time.perf_counter() - started)
+        self._metrics.record_error()
+        self._dead_lettered = True
+        return True
+
+    def process_item(self, item):
+        """
+        Handle a single input item. Must be implemented by subclasses that use the default consume().
+        """
+        raise NotImplementedError
+
+    def on_end_of_stream(self):
+        """
+        Called once after END_OF_STREAM is received. Override to flush buffered work.
+        """
+
+    def consume(self):
+        """
+        Consume items until END_OF_STREAM, handing each one to process_item().
+        """
+        while True:
+            if self._output_buffer and time.monotonic() >= self._output_deadline:
+                self.flush_output()
+            try:
+                # Blocks without using CPU while the queue is empty, at most until buffered outputs are due
+                item = self.get(timeout=max(0.0, self._output_deadline - time.monotonic()) if self._output_buffer else None)
+            except Empty:
+                continue
+            if item == END_OF_STREAM:
+                break
+            if self._checkpoint is not None:
+                outputs = self._checkpoint.lookup(item)
+                if outputs is not None:  # Completed by an earlier attempt of this run: replay its outputs
+                    for output in outputs:
+                        self.put(output)
+                    self._item_handled()
+                    continue
+                self._recorded_outputs = []
+            started = time.perf_counter()
+            try:
+                self.process_item(item)
+            except Exception as error:
+                if not self.dead_letter(item):
+                    self._metrics.record_error()
+                    raise
+                print(f"⚠️ {self._stage_name}: {item!r} failed ({error!r}), sent to the dead-letter queue")
+            finally:
+                outputs, self._recorded_outputs = self._recorded_outputs, None
+            self._metrics.record_item(time.perf_counter() - started)
+            if self._checkpoint is not None and outputs and not self._dead_lettered and self.is_complete(outputs):
+                self._checkpoint.record(item, outputs)
+            self._dead_lettered = False
+            self._item_handled()  # Only now: an item that raised is redelivered by broker-backed queues
+        self.flush_output()
+        self.on_end_of_stream()
+
+    def run(self):
+        """
+        Thread body: run consume() with metrics attributed to this worker's stage.
+        An exception that ends the thread is kept in self.error for the supervisor.
+        """
+        with bind_stage(self._stage_name):
+            try:
+                self.consume()
+            except BaseException as error:
+                self.error = error
+                raise
@@ -0,0 +1,177 @@
+import asyncio  # For the asyncio-compatible acquire
+import threading  # Guards limiter state across scheduler threads
+import time  # Monotonic clock and sleeping
+
+from workers.sharedRegistry import SharedRegistry, host_of  # Limiters are shared per host
+
+
+class AdaptiveRateLimiter:
+    """
+    Thread-safe token bucket whose refill rate adapts with AIMD (additive increase,
+    multiplicative decrease), like TCP congestion control.
+
+    Until the first throttled (HTTP 429) response the rate doubles about once a second
+    ("slow start"); after that every successful request raises it by roughly `increase`
+    requests/sec per second of success, up to max_rate. A 429 multiplies the rate by
+    `decrease`, down to min_rate, and honours Retry-After. So the limiter settles just
+    under the server's real limit instead of sleeping a fixed amount per request.
+
+    acquire() blocks the calling thread; acquire_async() is the asyncio equivalent.
+    Waiters sleep outside the lock and re-check the bucket when they wake, so a rate
+    increase immediately benefits everyone already waiting.
+    """
+    def __init__(self, rate=2.0, burst=4, min_rate=0.2, max_rate=20.0, increase=1.0, decrease=0.5,
+                 decrease_cooldown=1.0):
+        """
+        :param rate: Starting rate in requests/sec.
+        :param burst: Bucket size: how many requests may go out back to back.
+        :param min_rate: Floor for the adapted rate.
+        :param max_rate: Ceiling for the adapted rate.
+        :param increase: Additive increase, in requests/sec gained per second of successful requests.
+        :param decrease: Multiplicative decrease applied on a 429 (0 < decrease < 1).
+        :param decrease_cooldown: Seconds during which further 429s (from requests already in flight) don't cut the rate again.
+        """
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        self._lock = threading.Lock()
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._min_rate = float(min_rate)
+        self._max_rate = float(max_rate)
+        self._increase = float(increase)
+        self._decrease = float(decrease)
+        self._decrease_cooldown = float(decrease_cooldown)
+        self._tokens = float(burst)  # Start with a full bucket
+        self._slow_start = True  # Grow exponentially until the server first pushes back
+        self._last_refill = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._blocked_until = 0.0  # monotonic() time before which no request may go out (Retry-After)
+        self._requests = 0
+        self._successes = 0
+        self._throttled = 0
+        self._wait_seconds = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def _try_acquire(self):
+        """
+        Take a token if one is available and return 0, otherwise return how many
+        seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._requests += 1
+                return 0.0
+            return (1 - self._tokens) / self._rate
+
+    def _record_wait(self, seconds):
+        with self._lock:
+            self._wait_seconds += seconds
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        """
+        started = time.monotonic()
+        wait = self._try_acquire()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._try_acquire()
+        self._record_wait(time.monotonic() - started)
+
+    def try_acquire(self):
+        """
+        Take a token if one is available right now, without waiting.
+        :return: True if a request may be sent.
+        """
+        return self._try_acquire() == 0
+
+    async def acquire_async(self):
+        """
+        Wait, without blocking the event loop, until a request may be sent.
+        """
+        started = time.monotonic()
+        wait = self._try_acquire()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._try_acquire()
+        self._record_wait(time.monotonic() - started)
+
+    def on_success(self):
+        """
+        Record a successful request: additive increase.
+        """
+        with self._lock:
+            self._successes += 1
+            step = 1.0 if self._slow_start else self._increase / self._rate
+            self._rate = min(self._max_rate, self._rate + step)
+
+    def on_throttled(self, retry_after=None):
+        """
+        Record a throttled request: multiplicative decrease, and pause everyone for retry_after seconds if given.
+        :param retry_after: Value of the Retry-After header in seconds, or None.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._throttled += 1
+            self._slow_start = False
+            if now - self._last_decrease >= self._decrease_cooldown:
+                self._refill(now)
+                self._rate = max(self._min_rate, self._rate * self._decrease)
+                self._tokens = min(self._tokens, 0.0)  # Drop any saved-up burst
+                self._last_decrease = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + float(retry_after))
+
+    def snapshot(self):
+        """
+        Current state and counters, for logging and metrics.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'rate': round(self._rate, 3),
+                'slow_start': self._slow_start,
+                'burst': self._burst,
+                'tokens': round(self._tokens, 3),
+                'min_rate': self._min_rate,
+                'max_rate': self._max_rate,
+                'requests': self._requests,
+                'successes': self._successes,
+                'throttled': self._throttled,
+                'wait_seconds': round(self._wait_seconds, 3),
+            }
+
+
+_limiters = SharedRegistry(AdaptiveRateLimiter, 'rate limiter', key=host_of)  # One per host in the process
+
+
+def get_rate_limiter(url, **config):
+    """
+    Return the limiter shared by every worker that talks to url's host.
+    """
+    return _limiters.get(url, **config)
+
+
+def rate_limiter_snapshots():
+    """
+    Snapshot of every limiter in the process, keyed by host.
+    """
+    return _limiters.snapshots()
+
+
+def parse_retry_after(value):
+    """
+    Seconds from a Retry-After header, or None if missing or an HTTP date.
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
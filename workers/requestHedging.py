@@ -0,0 +1,229 @@
+import asyncio  # For the asyncio-compatible call
+import contextvars  # Requests run on pool threads with the caller's stage metrics
+import threading  # Hedgers are shared by every scheduler thread
+import time  # Monotonic clock for latencies and deadlines
+from collections import deque  # Sliding window of recent latencies
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait  # Racing a request and its hedge
+
+from workers.sharedRegistry import SharedRegistry, host_of  # Hedgers are shared per host
+
+
+class RequestHedger:
+    """
+    Runs requests with a deadline and hedges the slow ones.
+
+    Latencies of recent requests to a host are kept in a sliding window. When a request is
+    still unanswered after the window's `percentile` latency, a duplicate ("hedge") is sent
+    and whichever answers first is used; the other one is told to stop and its answer is
+    dropped. Only requests in the slow tail are hedged, and `budget` caps hedges at
+    that fraction of all requests, so the request volume barely grows while the tail latency
+    drops to about percentile latency plus one typical request.
+
+    call() blocks the calling thread until an answer or the deadline; the requests themselves
+    run on a small pool so the caller can stop waiting for them, and are told (through an Event)
+    to stop once their answer is no longer wanted, so they give their pool thread back early.
+    call_async() is the asyncio equivalent, and cancels the request that lost.
+
+    A hedge is only sent if `may_hedge()` allows it right away (e.g. a rate limiter has a spare
+    token): waiting for one would eat into the caller's deadline, and hedging a host we are
+    already throttling for only adds load.
+    """
+    def __init__(self, percentile=0.95, budget=0.1, window=1000, min_samples=20, min_delay=0.01, max_workers=64):
+        """
+        :param percentile: Latency percentile of recent requests after which a request is hedged.
+        :param budget: Hedges allowed per request, on average (0.1: at most 10% more requests). Hedging at
+                       the p95 latency sends about 5% duplicates; the rest is headroom for a burst of slow answers.
+        :param window: Number of recent latencies the percentile is taken over.
+        :param min_samples: Latencies needed before anything is hedged.
+        :param min_delay: Never hedge sooner than this many seconds.
+        :param max_workers: Threads running requests and hedges, at most.
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self._min_samples = min_samples
+        self._min_delay = min_delay
+        self._latencies = deque(maxlen=window)
+        self._hedge_delay = None  # Cached percentile, refreshed every few samples
+        self._samples_since_refresh = 0
+        self._credit = 0.0  # Hedges currently allowed by the budget
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._timeouts = 0
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._pool = None  # Created on the first call(), the asyncio engine never needs it
+
+    def _observe(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._samples_since_refresh += 1
+            if self._samples_since_refresh >= 10 or self._hedge_delay is None:
+                self._samples_since_refresh = 0
+                if len(self._latencies) >= self._min_samples:
+                    ordered = sorted(self._latencies)
+                    self._hedge_delay = max(self._min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def _timed(self, request, abandoned):
+        started = time.monotonic()
+        result = request(abandoned)
+        self._observe(time.monotonic() - started)  # Only answered requests count towards the percentile
+        return result
+
+    async def _timed_async(self, request):
+        started = time.monotonic()
+        result = await request()
+        self._observe(time.monotonic() - started)
+        return result
+
+    def _submit(self, request, abandoned):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='hedged-request')
+        return self._pool.submit(contextvars.copy_context().run, self._timed, request, abandoned)  # Same stage as the caller
+
+    def _begin(self, started):
+        """
+        Count a call and return the monotonic() time to hedge it at, or None.
+        """
+        with self._lock:
+            self._requests += 1
+            self._credit = min(self._credit + self.budget, 10.0)  # A short burst of slow requests may all be hedged
+            return started + self._hedge_delay if self._hedge_delay is not None else None
+
+    def _finish(self, won_by_hedge=False, timed_out=False):
+        with self._lock:
+            self._hedge_wins += won_by_hedge
+            self._timeouts += timed_out
+
+    def hedge_delay(self):
+        """
+        Seconds after which a request is hedged, or None while there are too few samples.
+        """
+        with self._lock:
+            return self._hedge_delay
+
+    def _take_hedge(self, may_hedge):
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+        if may_hedge is not None and not may_hedge():  # Outside our lock, it may take the rate limiter's
+            with self._lock:
+                self._credit += 1.0  # Not spent
+            return False
+        with self._lock:
+            self._hedges += 1
+        return True
+
+    def call(self, request, timeout=None, may_hedge=None):
+        """
+        Run request(abandoned), hedged with a second one if it is slow.
+        :param request: Callable sending the request and returning its result. Must be safe to run twice at once.
+                        It gets a threading.Event that is set once its answer is no longer wanted (the other
+                        request answered, or the deadline passed), and should give up soon after.
+        :param timeout: Seconds to wait for an answer, or None to wait as long as it takes.
+        :param may_hedge: Callable returning whether the hedge may go out now, without waiting (e.g. a rate
+                          limiter's try_acquire). The caller waits for its own token before calling.
+        :return: The result of the first request to return.
+        :raises TimeoutError: If no request returned within timeout.
+        :raises Exception: What the last request raised, if every request failed.
+        """
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        hedge_at = self._begin(started)
+        abandoned = threading.Event()
+        primary = self._submit(request, abandoned)
+        pending = {primary}
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                wake_up = [moment for moment in (deadline, hedge_at) if moment is not None]
+                done, pending = wait(pending, timeout=max(0.0, min(wake_up) - now) if wake_up else None,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self._finish(won_by_hedge=future is not primary)
+                        return future.result()
+                    error = future.exception()
+                if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                    hedge_at = None  # One hedge per call at most
+                    if self._take_hedge(may_hedge):
+                        pending.add(self._submit(request, abandoned))
+        finally:
+            abandoned.set()  # The loser, or both at the deadline, stop and free their pool threads
+            for future in pending:
+                future.cancel()  # Still queued for a thread: never starts
+        if error is not None and not pending:
+            raise error
+        self._finish(timed_out=True)
+        raise TimeoutError(f"No answer within {timeout}s")
+
+    async def call_async(self, request, timeout=None, may_hedge=None):
+        """
+        asyncio equivalent of call(): request is a coroutine function taking no arguments, and whichever
+        request is still running when the other answers (or at the deadline) is cancelled.
+        """
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+        hedge_at = self._begin(started)
+        primary = asyncio.ensure_future(self._timed_async(request))
+        pending = {primary}
+        error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                wake_up = [moment for moment in (deadline, hedge_at) if moment is not None]
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, min(wake_up) - now) if wake_up else None,
+                                                   return_when=FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._finish(won_by_hedge=task is not primary)
+                        return task.result()
+                    error = task.exception()
+                if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if self._take_hedge(may_hedge):
+                        pending.add(asyncio.ensure_future(self._timed_async(request)))
+        finally:
+            for task in pending:
+                task.cancel()
+        if error is not None and not pending:
+            raise error
+        self._finish(timed_out=True)
+        raise TimeoutError(f"No answer within {timeout}s")
+
+    def snapshot(self):
+        """
+        Requests, hedges sent, hedges that answered first, timeouts and the current hedge delay.
+        """
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'hedges': self._hedges,
+                'hedge_wins': self._hedge_wins,
+                'timeouts': self._timeouts,
+                'hedge_delay': round(self._hedge_delay, 4) if self._hedge_delay is not None else None,
+            }
+
+
+_hedgers = SharedRegistry(RequestHedger, 'request hedger', key=host_of)  # One per host in the process
+
+
+def get_hedger(url, **config):
+    """
+    Return the hedger shared by every worker that talks to url's host.
+    """
+    return _hedgers.get(url, **config)
+
+
+def hedger_snapshots():
+    """
+    Snapshot of every hedger in the process, keyed by host.
+    """
+    return _hedgers.snapshots()
@@ -0,0 +1,195 @@
+import hashlib  # File names for the disk store
+import json  # On-disk entry format
+import os  # Cache directory handling
+import tempfile  # Atomic writes
+import threading  # Guards the in-memory store
+import time  # Expiry timestamps
+from collections import OrderedDict  # LRU ordering
+
+from workers import httpClient  # Shared keep-alive HTTP session
+
+DEFAULT_CACHE_DIR = os.getenv('PIPELINE_CACHE_DIR', os.path.join('.cache', 'pipeline'))  # Where the disk store lives
+
+_default_cache = None  # Process-wide ResponseCache
+_default_cache_lock = threading.Lock()
+
+
+class CacheEntry:
+    """
+    A cached value with its expiry time and the HTTP validators it was served with.
+    """
+    __slots__ = ('value', 'expires_at', 'etag', 'last_modified')
+
+    def __init__(self, value, expires_at, etag=None, last_modified=None):
+        self.value = value  # JSON-serializable payload (page text, symbol list, price, ...)
+        self.expires_at = expires_at  # time.time() after which the entry is stale
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+    def to_dict(self):
+        return {'value': self.value, 'expires_at': self.expires_at,
+                'etag': self.etag, 'last_modified': self.last_modified}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['value'], data['expires_at'], data.get('etag'), data.get('last_modified'))
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory store that evicts the least recently used entry beyond max_entries.
+    """
+    def __init__(self, max_entries=1024):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class DiskCache:
+    """
+    Store that keeps one JSON file per key, so entries survive between pipeline runs.
+    Writes go through a temporary file and os.replace(), so readers never see a partial entry.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self._directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return CacheEntry.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, entry):
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(entry.to_dict(), file)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"❌ Could not write cache entry {key}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+class ResponseCache:
+    """
+    Two-level cache: an in-memory LRU in front of an optional on-disk store.
+    Every entry has its own TTL; stale entries are kept so their ETag/Last-Modified
+    validators can be used to revalidate instead of downloading again.
+    """
+    def __init__(self, memory=None, disk=None):
+        """
+        :param memory: LRUCache, created with default size if omitted.
+        :param disk: DiskCache, or None to keep entries in memory only.
+        """
+        self._memory = memory or LRUCache()
+        self._disk = disk
+
+    def get_entry(self, key):
+        """
+        Return the CacheEntry for key, fresh or stale, or None.
+        """
+        entry = self._memory.get(key)
+        if entry is None and self._disk is not None:
+            entry = self._disk.get(key)
+            if entry is not None:
+                self._memory.set(key, entry)  # Promote to memory
+        return entry
+
+    def get(self, key):
+        """
+        Return the cached value for key if it has not expired, else None.
+        """
+        entry = self.get_entry(key)
+        if entry is not None and entry.is_fresh():
+            return entry.value
+        return None
+
+    def set(self, key, value, ttl, etag=None, last_modified=None):
+        """
+        Cache value under key for ttl seconds.
+        """
+        entry = CacheEntry(value, time.time() + ttl, etag, last_modified)
+        self._memory.set(key, entry)
+        if self._disk is not None:
+            self._disk.set(key, entry)
+        return entry
+
+    def refresh(self, key, entry, ttl):
+        """
+        Extend a stale entry by ttl seconds after the server confirmed it is unchanged.
+        """
+        return self.set(key, entry.value, ttl, entry.etag, entry.last_modified)
+
+
+def get_response_cache():
+    """
+    Return the cache shared by every worker in the process (memory + disk under DEFAULT_CACHE_DIR).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(disk=DiskCache(DEFAULT_CACHE_DIR))
+        return _default_cache
+
+
+def conditional_headers(entry, headers=None):
+    """
+    Return headers extended with If-None-Match / If-Modified-Since for a stale entry.
+    """
+    request_headers = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            request_headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            request_headers['If-Modified-Since'] = entry.last_modified
+    return request_headers
+
+
+def fetch_text(url, ttl, cache=None, headers=None, **get_kwargs):
+    """
+    GET url through the shared HTTP session, serving it from cache while fresh and
+    revalidating with If-None-Match / If-Modified-Since once it is stale.
+    :param ttl: Seconds a response stays fresh.
+    :param cache: ResponseCache, defaults to get_response_cache().
+    :param get_kwargs: Passed to httpClient.get() (connect_timeout, read_timeout, ...).
+    :return: (text, modified). text is None if the request failed; modified is False when the
+             text came from the cache (fresh or confirmed by a 304).
+    """
+    cache = cache or get_response_cache()
+    key = f'response:{url}'
+    entry = cache.get_entry(key)
+    if entry is not None and entry.is_fresh():
+        return entry.value, False
+
+    response = httpClient.get(url, headers=conditional_headers(entry, headers), **get_kwargs)
+    if response.status_code == 304 and entry is not None:  # Unchanged: reuse the body we have
+        cache.refresh(key, entry, ttl)
+        return entry.value, False
+    if response.status_code != 200:
+        return None, False
+
+    cache.set(key, response.text, ttl, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return response.text, True
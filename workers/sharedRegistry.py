@@ -0,0 +1,56 @@
+import threading  # Registries are shared by every worker thread
+from urllib.parse import urlsplit  # To key objects by host
+
+
+def host_of(url):
+    """
+    Host (and port) of url, or url itself if it has none.
+    """
+    return urlsplit(url).netloc or url
+
+
+class SharedRegistry:
+    """
+    Process-wide objects (rate limiters, hedgers, price trackers, ...) shared by every
+    worker that asks for the same key, e.g. the same host or stage.
+
+    The first get() for a key creates the object with its config; later calls reuse it.
+    A later call passing a different, non-empty config gets the existing object too, and
+    a warning, since its settings are ignored.
+    """
+    def __init__(self, factory, kind, key=None):
+        """
+        :param factory: Called with the config to create the object for a key.
+        :param kind: What the objects are, for the warning (e.g. 'rate limiter').
+        :param key: Maps get()'s argument to the key (e.g. host_of), identity by default.
+        """
+        self._factory = factory
+        self._kind = kind
+        self._key = key
+        self._objects = {}  # key -> shared object
+        self._configs = {}  # key -> config it was created with
+        self._warned = set()  # (key, config) pairs already warned about
+        self._lock = threading.Lock()
+
+    def get(self, name, **config):
+        """
+        Return the object shared under name's key, creating it with config on first use.
+        """
+        key = self._key(name) if self._key is not None else name
+        with self._lock:
+            if key not in self._objects:
+                self._objects[key] = self._factory(**config)
+                self._configs[key] = config
+            elif config and config != self._configs[key] and (key, repr(config)) not in self._warned:
+                self._warned.add((key, repr(config)))
+                print(f"⚠️ The {self._kind} for {key} is already configured with {self._configs[key]}, "
+                      f"ignoring {config}")
+            return self._objects[key]
+
+    def snapshots(self):
+        """
+        snapshot() of every object in the registry, keyed by key.
+        """
+        with self._lock:
+            objects = dict(self._objects)
+        return {key: shared.snapshot() for key, shared in objects.items()}
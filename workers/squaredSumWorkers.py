@@ -1,5 +1,19 @@
 import threading
 
+from workers.queueWorkers import QueueConsumerWorker
+
+
+def calculate_sum_squares(n):
+    """
+    Calculate the sum of squares of the first n natural numbers.
+
+    :param n: The number of natural numbers to consider.
+    :return: The sum of squares of the first n natural numbers.
+    """
+    sum_of_squares = 0
+    for i in range(n):
+        sum_of_squares += i * i
+    return sum_of_squares
 
 
 class SquaredSumWorker(threading.Thread):
@@ -20,14 +34,27 @@ class SquaredSumWorker(threading.Thread):
         :param n: The number of natural numbers to consider.
         :return: The sum of squares of the first n natural numbers.
         """
-        sum_of_squares = 0
-        for i in range(self.n):
-            sum_of_squares += i * 2
-        print(sum_of_squares)
+        print(calculate_sum_squares(self.n))
 
     def run(self):
         """
         Run the worker thread to calculate the sum of squares.
         """
         self.calcUlate_sum_squares()
-    
\ No newline at end of file
+
+
+class SquaredSumScheduler(QueueConsumerWorker):
+    """
+    Pipeline stage that reads n values from its input queue and puts (n, sum of squares) tuples
+    in its output queue. CPU-bound, so declare it with 'backend: process' in the pipeline YAML.
+    """
+
+    def __init__(self, input_queue=None, output_queue=None, **kwargs):
+        super(SquaredSumScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue, **kwargs)
+        self.start()
+
+    def process_item(self, n):
+        """
+        Calculate the sum of squares for n and pass it downstream.
+        """
+        self.put((n, calculate_sum_squares(n)))
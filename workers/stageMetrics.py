@@ -0,0 +1,221 @@
+import bisect  # Histogram bucket lookup
+import contextvars  # Current stage per thread / asyncio task
+import threading  # Guards counters updated from several workers
+import time  # Timestamps and durations
+from collections import deque  # Bounded queue depth history
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)  # Seconds
+WAIT_KINDS = ('input', 'output', 'http', 'db')  # Where a stage can spend time waiting
+
+_current_stage = contextvars.ContextVar('current_stage', default=None)  # StageMetrics of the running worker
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (Prometheus style: cumulative buckets in seconds).
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of observations, or None if empty.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def merge(self, counts, count, total):
+        """
+        Add the observations of another histogram with the same buckets (see StageMetrics.state()).
+        """
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.count += count
+        self.sum += total
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': dict(zip([str(bucket) for bucket in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class StageMetrics:
+    """
+    Counters for one pipeline stage, shared by all of its worker instances.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.items = 0
+        self.errors = 0
+        self.latency = Histogram()  # Time to process one item (or one batch, for batching stages)
+        self.waits = {kind: Histogram() for kind in WAIT_KINDS}  # Time blocked on each kind of wait
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def record_item(self, seconds, items=1):
+        with self._lock:
+            self.items += items
+            self.latency.observe(seconds)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_wait(self, kind, seconds):
+        with self._lock:
+            self.waits[kind].observe(seconds)
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = self.finished_at or time.time()
+
+    def state(self):
+        """
+        Raw counters, picklable, for merge() into the same stage's metrics in another process.
+        """
+        with self._lock:
+            return {
+                'items': self.items,
+                'errors': self.errors,
+                'latency': (list(self.latency.counts), self.latency.count, self.latency.sum),
+                'waits': {kind: (list(histogram.counts), histogram.count, histogram.sum)
+                          for kind, histogram in self.waits.items()},
+            }
+
+    def merge(self, state):
+        """
+        Add what a worker process recorded for this stage (its state()).
+        """
+        with self._lock:
+            self.items += state['items']
+            self.errors += state['errors']
+            self.latency.merge(*state['latency'])
+            for kind, histogram in state['waits'].items():
+                self.waits[kind].merge(*histogram)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            return {
+                'items': self.items,
+                'errors': self.errors,
+                'elapsed_seconds': round(elapsed, 3),
+                'throughput_per_second': round(self.items / elapsed, 3) if elapsed > 0 else 0.0,
+                'finished': self.finished_at is not None,
+                'latency': self.latency.snapshot(),
+                'wait_seconds': {kind: round(histogram.sum, 6) for kind, histogram in self.waits.items()},
+                'waits': {kind: histogram.snapshot() for kind, histogram in self.waits.items()},
+            }
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of stage metrics, queue depth history and the
+    thread -> stage mapping used by the sampling profiler.
+    """
+    def __init__(self, history_length=720):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._threads = {}  # thread ident -> stage name
+        self.queue_depths = deque(maxlen=history_length)  # (timestamp, {queue name: size})
+
+    def stage(self, name):
+        with self._lock:
+            metrics = self._stages.get(name)
+            if metrics is None:
+                metrics = StageMetrics(name)
+                self._stages[name] = metrics
+            return metrics
+
+    def stages(self):
+        with self._lock:
+            return dict(self._stages)
+
+    def bind_thread(self, stage_name):
+        with self._lock:
+            self._threads[threading.get_ident()] = stage_name
+
+    def unbind_thread(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def thread_stages(self):
+        with self._lock:
+            return dict(self._threads)
+
+    def record_queue_depths(self, depths):
+        self.queue_depths.append((time.time(), depths))
+
+    def snapshot(self):
+        return {name: stage.snapshot() for name, stage in self.stages().items()}
+
+
+registry = MetricsRegistry()  # The registry every worker in this process records into
+
+
+@contextmanager
+def bind_stage(stage_name, bind_thread=True):
+    """
+    Attribute everything recorded by the current thread or asyncio task to stage_name,
+    including HTTP and database waits recorded deep inside helper code.
+    :param bind_thread: Also map the current thread to the stage for the sampling profiler
+                        (pass False for asyncio tasks, which share one thread).
+    """
+    token = _current_stage.set(registry.stage(stage_name))
+    if bind_thread:
+        registry.bind_thread(stage_name)
+    try:
+        yield _current_stage.get()
+    finally:
+        if bind_thread:
+            registry.unbind_thread()
+        _current_stage.reset(token)
+
+
+def current_stage():
+    """
+    StageMetrics of the running worker, or None outside a bound stage.
+    """
+    return _current_stage.get()
+
+
+def record_wait(kind, seconds):
+    """
+    Record time the current stage spent waiting on kind ('input', 'output', 'http' or 'db').
+    """
+    stage = _current_stage.get()
+    if stage is not None:
+        stage.record_wait(kind, seconds)
+
+
+@contextmanager
+def timed_wait(kind):
+    """
+    Context manager that records the time spent inside it as a wait of the given kind.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_wait(kind, time.perf_counter() - started)
@@ -1,6 +1,11 @@
-import requests  # Import the requests library to make HTTP requests
-from bs4 import BeautifulSoup  # Import BeautifulSoup for parsing HTML
+from workers import httpClient  # Shared keep-alive HTTP session
+from workers.htmlExtraction import extract_company_symbols, iter_company_symbols  # Streaming table scanner
+from workers.stageMetrics import bind_stage  # Per-stage instrumentation
+from workers.responseCache import fetch_text, get_response_cache  # TTL cache with HTTP revalidation
+import heapq  # Poll schedule ordered by due time
+import random  # Poll interval jitter
 import threading  # Import threading for concurrent execution
+import time  # For stage metrics timing
 
 class WikiWorkerMasterScheduler(threading.Thread):
     """
@@ -12,12 +17,20 @@ class WikiWorkerMasterScheduler(threading.Thread):
         Initializes the scheduler with output queues and input values.
         Args:
             output_queue (queue.Queue or list): Queue(s) to put results into.
-            **kwargs: Additional keyword arguments, expects 'input_values' for URLs.
+            **kwargs: Additional keyword arguments, expects 'input_values' for URLs and
+                accepts 'connect_timeout', 'read_timeout' and 'cache_ttl' in seconds, and a
+                'checkpoint' (StageCheckpoint) to replay the symbols of URLs already scraped in this run.
         """
         if 'input_queue' in kwargs:
             kwargs.pop('input_queue', None)  # Remove 'input_queue' if present, not used here
         # ✅ Fix: grab and remove input_values
         self._entries = kwargs.pop('input_values', None)  # List of URLs to process
+        self._connect_timeout = kwargs.pop('connect_timeout', httpClient.DEFAULT_CONNECT_TIMEOUT)
+        self._read_timeout = kwargs.pop('read_timeout', httpClient.DEFAULT_READ_TIMEOUT)
+        self._cache_ttl = kwargs.pop('cache_ttl', None)  # Seconds to reuse the page and its symbols, None disables caching
+        self._stage_name = kwargs.pop('stage_name', None) or type(self).__name__  # Pipeline stage, for metrics
+        self._checkpoint = kwargs.pop('checkpoint', None)  # Completed entries of this run, if checkpointing
+        httpClient.reserve_connections()  # One keep-alive connection for this scheduler
         temp_queue = output_queue
         if type(temp_queue) != list:
             temp_queue = [temp_queue]  # Ensure output queues are in a list
@@ -29,38 +42,181 @@ class WikiWorkerMasterScheduler(threading.Thread):
         """
         Main thread execution: for each entry, fetch company symbols and put them in output queues.
         """
-        for entry in self._entries:  # Iterate over each URL or entry
-            wikiWorker = WikiWorker(entry)  # Create a WikiWorker for the entry
-            
-            for symbol in wikiWorker.get_s_and_p_500_companies():  # Get company symbols
-                for output_queue in self._output_queue:  # For each output queue
-                    output_queue.put(symbol)  # Put the symbol in the queue
-            
-        for output_queue in self._output_queue:  # After processing all entries
-            for _ in range(20):  # Put "DONE" marker 20 times to signal completion
-                output_queue.put("DONE")
+        with bind_stage(self._stage_name) as metrics:
+            for entry in self._entries:  # Iterate over each URL or entry
+                started = time.perf_counter()
+                symbols = self._checkpoint.lookup(entry) if self._checkpoint is not None else None
+                replayed = symbols is not None  # Scraped by an earlier attempt of this run
+                if not replayed:
+                    wikiWorker = WikiWorker(entry, connect_timeout=self._connect_timeout, read_timeout=self._read_timeout,
+                                            cache_ttl=self._cache_ttl)  # Create a WikiWorker for the entry
+                    symbols = wikiWorker.get_s_and_p_500_companies()  # Get company symbols
+
+                emitted = []
+                for symbol in symbols:
+                    emitted.append(symbol)
+                    for output_queue in self._output_queue:  # For each output queue
+                        put_started = time.perf_counter()
+                        output_queue.put(symbol)  # Put the symbol in the queue
+                        metrics.record_wait('output', time.perf_counter() - put_started)
+                metrics.record_item(time.perf_counter() - started, items=len(emitted))
+                if self._checkpoint is not None and not replayed:
+                    self._checkpoint.record(entry, emitted)
+        # No "DONE" markers here: the pipeline supervisor sends one per consumer when this thread exits
             
+class WikiStreamingScheduler(threading.Thread):
+    """
+    Streaming source: keeps re-polling every S&P 500 symbol instead of emitting each once.
+
+    The symbol universe is refreshed from the input URLs every 'universe_refresh' seconds
+    (revalidated with the page's ETag/Last-Modified, so an unchanged page isn't re-parsed)
+    and each symbol is put on the output queues again every 'poll_interval' seconds, give or
+    take 'jitter' (a fraction of the interval) so the polls spread out instead of arriving in
+    bursts. It runs until stop() is called or for 'run_for' seconds, and only then does the
+    supervisor end the stream downstream, so the stages after it stay up between polls.
+    """
+    def __init__(self, output_queue=None, **kwargs):
+        """
+        :param output_queue: Queue, or list of queues, to put symbols into.
+        :param input_values: URLs of the pages listing the symbols.
+        :param poll_interval: Seconds between two polls of the same symbol.
+        :param jitter: Fraction of poll_interval each poll is moved by, at random (0 polls on the dot).
+        :param universe_refresh: Seconds between two refreshes of the symbol list.
+        :param run_for: Seconds to stream before stopping by itself (optional, default until stop()).
+        :param cache_ttl: Seconds to reuse the page and its symbols (optional, default half of universe_refresh
+                          so every refresh revalidates the page; 0 fetches it in full every time).
+        :param connect_timeout: Seconds to establish a connection (optional).
+        :param read_timeout: Seconds to wait for the server between bytes (optional).
+        """
+        kwargs.pop('input_queue', None)  # Source stage, nothing to consume
+        kwargs.pop('checkpoint', None)  # A stream has no end to resume towards
+        self._entries = kwargs.pop('input_values', None) or []
+        self._poll_interval = kwargs.pop('poll_interval', 60.0)
+        self._jitter = kwargs.pop('jitter', 0.1)
+        self._universe_refresh = kwargs.pop('universe_refresh', 86400.0)
+        self._run_for = kwargs.pop('run_for', None)
+        self._cache_ttl = kwargs.pop('cache_ttl', self._universe_refresh / 2)  # Expired, so revalidated, by the next refresh
+        self._connect_timeout = kwargs.pop('connect_timeout', httpClient.DEFAULT_CONNECT_TIMEOUT)
+        self._read_timeout = kwargs.pop('read_timeout', httpClient.DEFAULT_READ_TIMEOUT)
+        self._stage_name = kwargs.pop('stage_name', None) or type(self).__name__  # Pipeline stage, for metrics
+        self._stop_event = threading.Event()
+        self._symbols = set()  # Current universe
+        self._schedule = []  # Heap of (due time, symbol)
+        self._scheduled = set()  # Symbols with an entry in the schedule
+        httpClient.reserve_connections()  # One keep-alive connection for this scheduler
+        temp_queue = output_queue
+        if type(temp_queue) != list:
+            temp_queue = [temp_queue]  # Ensure output queues are in a list
+        self._output_queue = temp_queue  # Store output queues
+        super(WikiStreamingScheduler, self).__init__(**kwargs)  # Initialize thread
+        self.start()  # Start the thread
+
+    def stop(self):
+        """
+        Stop polling; the thread exits after the symbol it is putting, if any.
+        """
+        self._stop_event.set()
+
+    def _next_poll(self, after):
+        return after + self._poll_interval * (1 + random.uniform(-self._jitter, self._jitter))
+
+    def _refresh_universe(self, now):
+        """
+        Re-read the symbol list and schedule new symbols right away. Symbols that left the
+        list drop out of the schedule as they come due. Returns False if no page could be read.
+        """
+        symbols = set()
+        for entry in self._entries:
+            try:
+                wikiWorker = WikiWorker(entry, connect_timeout=self._connect_timeout, read_timeout=self._read_timeout,
+                                        cache_ttl=self._cache_ttl)
+                symbols.update(wikiWorker.get_s_and_p_500_companies())
+            except Exception as e:  # Keep streaming the current universe
+                print(f"⚠️ {self._stage_name}: couldn't refresh symbols from {entry}: {e!r}")
+        if not symbols:
+            return False
+        added, removed = symbols - self._symbols, self._symbols - symbols
+        for symbol in added - self._scheduled:  # A symbol that left and came back may still be scheduled
+            heapq.heappush(self._schedule, (now, symbol))
+            self._scheduled.add(symbol)
+        self._symbols = symbols
+        if added or removed:
+            print(f"[{self._stage_name}] Universe: {len(symbols)} symbols (+{len(added)} -{len(removed)})")
+        return True
+
+    def run(self):
+        """
+        Put each symbol on the output queues whenever it comes due, until stopped.
+        """
+        started = time.monotonic()
+        stop_at = started + self._run_for if self._run_for is not None else None
+        next_refresh = started
+        with bind_stage(self._stage_name) as metrics:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if stop_at is not None and now >= stop_at:
+                    break
+                if now >= next_refresh:
+                    refreshed = self._refresh_universe(now)
+                    # Retry a failed refresh sooner, but not in a tight loop
+                    next_refresh = now + (self._universe_refresh if refreshed else min(self._universe_refresh, 60.0))
+
+                while self._schedule and self._schedule[0][0] <= now and not self._stop_event.is_set():
+                    due, symbol = heapq.heappop(self._schedule)
+                    if symbol not in self._symbols:
+                        self._scheduled.discard(symbol)
+                        continue  # Left the universe
+                    item_started = time.perf_counter()
+                    for output_queue in self._output_queue:  # For each output queue
+                        output_queue.put(symbol)  # Blocks while downstream is backed up
+                    metrics.record_item(time.perf_counter() - item_started)
+                    next_due = self._next_poll(due)
+                    if next_due <= now:  # Fell a whole interval behind: skip the missed polls
+                        next_due = self._next_poll(now)
+                    heapq.heappush(self._schedule, (next_due, symbol))
+
+                wake_up = min([next_refresh] + ([self._schedule[0][0]] if self._schedule else []) +
+                              ([stop_at] if stop_at is not None else []))
+                self._stop_event.wait(max(0.0, wake_up - time.monotonic()))
+        print(f"[{self._stage_name}] Streaming stopped")
+        # No "DONE" markers here: the pipeline supervisor sends one per consumer when this thread exits
+
 class WikiWorker():
     """
     Worker class to fetch and parse S&P 500 company symbols from Wikipedia.
     """
-    def __init__(self, url=None):
+    def __init__(self, url=None, connect_timeout=httpClient.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=httpClient.DEFAULT_READ_TIMEOUT, cache_ttl=None):
         """
         Initializes the worker with a URL.
         Args:
             url (str): The Wikipedia URL to fetch. Defaults to S&P 500 companies list.
+            connect_timeout (float): Seconds to establish a connection.
+            read_timeout (float): Seconds to wait for the server between bytes.
+            cache_ttl (float): Seconds to reuse the cached page and parsed symbols. None disables caching.
         """
         self.url = url or "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._cache_ttl = cache_ttl
 
     @staticmethod
     def _extract_company_symbols(page_html):
         """
         Extracts company symbols from the HTML of the Wikipedia page.
+        Uses the targeted constituents scanner, falling back to BeautifulSoup if the
+        page layout is not recognized.
         Args:
             page_html (str): HTML content of the page.
         Yields:
             str: Company symbol.
         """
+        symbols = extract_company_symbols(page_html)
+        if symbols is not None:
+            yield from symbols
+            return
+
+        from bs4 import BeautifulSoup  # Only needed for unrecognized layouts
         soup = BeautifulSoup(page_html, features="html.parser")  # Parse HTML
         table = soup.find(id="constituents")  # Find the table with S&P 500 companies
         table_rows = table.find_all("tr")  # Get all rows in the table
@@ -74,15 +230,64 @@ class WikiWorker():
     def get_s_and_p_500_companies(self):
         """
         Fetches the Wikipedia page and yields S&P 500 company symbols.
+        With cache_ttl set, a warm cache returns the parsed symbols without any request,
+        and an expired one is revalidated with the page's ETag/Last-Modified.
         Yields:
             str: Company symbol.
         """
-        response = requests.get(self.url)  # Make HTTP GET request
-        if response.status_code != 200:  # Check for successful response
+        if self._cache_ttl:
+            yield from self._get_cached_companies()
+            return
+
+        with httpClient.get(self.url, connect_timeout=self._connect_timeout, read_timeout=self._read_timeout,
+                            stream=True) as response:  # Stream the body over a pooled keep-alive connection
+            if response.status_code != 200:  # Check for successful response
+                print("Couldn't fetch the page")
+                return []
+
+            response.encoding = response.encoding or 'utf-8'
+            chunks = []
+            found_symbols = False
+            # Yield symbols while the page is still downloading; stop reading at the end of the table
+            for symbol in iter_company_symbols(self._iter_text(response, chunks)):
+                found_symbols = True
+                yield symbol
+            if not found_symbols:  # Unrecognized layout: the scanner read the whole page, parse it fully
+                yield from self._extract_company_symbols(''.join(chunks))
+
+    @staticmethod
+    def _iter_text(response, chunks):
+        """
+        Yield the response body as decoded text chunks, remembering them in chunks.
+        """
+        for chunk in response.iter_content(chunk_size=16384, decode_unicode=True):
+            chunks.append(chunk)
+            yield chunk
+
+    def _get_cached_companies(self):
+        """
+        Returns the symbol list from the response cache, fetching or revalidating the page as needed.
+        """
+        cache = get_response_cache()
+        symbols_key = f'symbols:{self.url}'
+        symbols = cache.get(symbols_key)
+        if symbols is not None:  # Warm cache: no request, no parsing
+            return symbols
+
+        page_html, modified = fetch_text(self.url, self._cache_ttl, cache=cache, connect_timeout=self._connect_timeout,
+                                         read_timeout=self._read_timeout)
+        if page_html is None:
             print("Couldn't fetch the page")
             return []
-        
-        yield from self._extract_company_symbols(response.text)  # Yield symbols from HTML
+
+        stale_symbols = cache.get_entry(symbols_key)
+        if not modified and stale_symbols is not None:  # Page unchanged, skip parsing
+            cache.refresh(symbols_key, stale_symbols, self._cache_ttl)
+            return stale_symbols.value
+
+        symbols = list(self._extract_company_symbols(page_html))
+        cache.set(symbols_key, symbols, self._cache_ttl)
+        return symbols
 
     def run(self):
         """
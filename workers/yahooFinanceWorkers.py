@@ -1,11 +1,29 @@
+import functools  # Binds the per-attempt timeouts of a request
 import threading  # Import threading module for concurrent execution using threads
-import requests  # Import requests module for making HTTP requests
+import requests  # Import requests module for its exception types
 from datetime import datetime, timezone  # Import datetime and timezone for timestamping
 import time  # Import time module for delays and sleeping
-import random  # Import random module for generating random numbers
-from lxml import html  # Import lxml.html for parsing HTML content
 
-class YahooFinancePriceScheduler(threading.Thread):
+from workers import httpClient  # Shared keep-alive HTTP session
+from workers.htmlExtraction import PriceScanner, price_from_text  # Streaming price scanner
+from workers.responseCache import get_response_cache  # Optional short-TTL price cache
+from workers.rateLimiter import get_rate_limiter  # Shared adaptive per-host rate limiter
+from workers.fetchPolicy import PriceFetchPolicy  # Retries, backoff and deadline of one symbol
+from workers.requestHedging import get_hedger  # Shared per-host hedging of slow requests
+from workers.queueWorkers import QueueConsumerWorker  # Blocking queue consumer base class
+from workers.priceRecords import PriceBatch, PriceRecord  # Compact stage traffic
+from workers.priceFreshness import get_price_tracker  # Delta suppression and per-symbol freshness
+
+YAHOO_BASE_URL = "https://finance.yahoo.com/quote/"  # Base URL for Yahoo Finance
+YAHOO_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/115.0.0.0 Safari/537.36",  # Set user agent to mimic a browser
+    "Accept-Encoding": httpClient.ACCEPT_ENCODING  # Compressed responses are decoded by the client
+}
+PRICE_XPATH = '//*[@id="nimbus-app"]/section/section/section/article/section[1]/div[2]/div[1]/section/div/section/div[1]/div[1]/span'  # XPath to price element
+
+class YahooFinancePriceScheduler(QueueConsumerWorker):
     """
     Threaded scheduler that fetches stock prices from Yahoo Finance for symbols in an input queue,
     and puts the results in an output queue.
@@ -14,95 +32,209 @@ class YahooFinancePriceScheduler(threading.Thread):
         """
         Initialize the scheduler with input and output queues.
         :param input_queue: Queue containing stock symbols to fetch.
-        :param output_queue: Queue to put (symbol, price, timestamp) tuples.
-        """
-        self._symbol_queue = input_queue  # Queue of symbols to process
-        self._output_queue = output_queue  # Queue to put results in
-        # Remove these keys from kwargs before calling Thread.__init__()
-        kwargs.pop('input_queue', None)
-        kwargs.pop('output_queue', None)
-        super(YahooFinancePriceScheduler, self).__init__(**kwargs)  # Initialize parent Thread
+        :param output_queue: Queue to put PriceRecords (symbol, price, timestamp) in, or PriceBatches
+                             of them with output_batch_size above 1.
+        :param connect_timeout: Seconds to establish a connection (optional).
+        :param read_timeout: Seconds to wait for the server between bytes (optional).
+        :param rate_limit: AdaptiveRateLimiter settings (rate, burst, min_rate, max_rate, ...) for
+                           Yahoo Finance (optional). The first scheduler to start configures the shared limiter.
+        :param price_cache_ttl: Seconds to reuse a scraped price instead of fetching it again (optional, off by default).
+        :param base_url: Quote URL prefix the symbol is appended to (optional, e.g. a local fixture server).
+        :param emit_changes_only: Only put prices that changed since the symbol's previous poll (optional,
+                                  for streaming pipelines that poll the same symbols over and over).
+        :param stale_after: Seconds without a successful fetch after which the freshness metric counts a
+                            symbol as stale (optional).
+        :param deadline: Seconds one symbol may take, retries and backoff included (optional, no limit by
+                         default). Waiting for the rate limiter doesn't count. A symbol that runs out of time
+                         counts as failed.
+        :param hedging: RequestHedger settings (percentile, budget, ...), or True for the defaults, to send a
+                        duplicate of requests slower than the recent p95 and use whichever answers first (optional).
+                        The first scheduler to start configures the shared hedger.
+        :param dead_letter_queue: Queue for the symbols whose price couldn't be fetched (optional). Without
+                                  one they are put downstream with a None price, as before.
+        """
+        self._base_url = kwargs.pop('base_url', YAHOO_BASE_URL)
+        self._emit_changes_only = kwargs.pop('emit_changes_only', False)
+        self._price_tracker = get_price_tracker(kwargs.get('stage_name') or type(self).__name__,
+                                                stale_after=kwargs.pop('stale_after', None))  # Shared by the stage
+        self._connect_timeout = kwargs.pop('connect_timeout', httpClient.DEFAULT_CONNECT_TIMEOUT)
+        self._read_timeout = kwargs.pop('read_timeout', httpClient.DEFAULT_READ_TIMEOUT)
+        self._rate_limiter = get_rate_limiter(self._base_url, **(kwargs.pop('rate_limit', None) or {}))
+        self._price_cache_ttl = kwargs.pop('price_cache_ttl', None)
+        self._deadline = kwargs.pop('deadline', None)
+        hedging = kwargs.pop('hedging', None)
+        self._hedger = get_hedger(self._base_url, **(hedging if isinstance(hedging, dict) else {})) if hedging else None
+        httpClient.reserve_connections()  # One keep-alive connection per scheduler instance
+        super(YahooFinancePriceScheduler, self).__init__(input_queue=input_queue, output_queue=output_queue, **kwargs)
         self.start()  # Start the thread immediately
 
-    def run(self):
+    def process_item(self, symbol):
+        """
+        Fetch the price for one symbol and put the result in the output queue.
+        """
+        if self._price_cache_ttl:
+            cached = get_response_cache().get(f'price:{symbol}')
+            if cached is not None:  # Scraped recently, reuse it with its original timestamp
+                if self._emit_changes_only:
+                    return  # Already sent when it was scraped
+                price, extracted_time = cached
+                self.put(PriceRecord(symbol, price, datetime.fromisoformat(extracted_time)))
+                return
+
+        yahooFinancePriceWorker = YahooFinancePriceWorker(symbol=symbol, connect_timeout=self._connect_timeout,
+                                                          read_timeout=self._read_timeout,
+                                                          rate_limiter=self._rate_limiter,
+                                                          base_url=self._base_url, deadline=self._deadline,
+                                                          hedger=self._hedger)  # Create worker for symbol
+        price = yahooFinancePriceWorker.get_price()  # Fetch price for symbol, paced by the shared rate limiter
+        output_values = PriceRecord(symbol, price, datetime.now(timezone.utc))  # Prepare result record
+        if self._price_cache_ttl and price is not None:
+            get_response_cache().set(f'price:{symbol}', [price, output_values.extracted_time.isoformat()], self._price_cache_ttl)
+        changed = self._price_tracker.observe(symbol, price)  # Also refreshes the symbol's freshness
+        if price is None and self.dead_letter(symbol):
+            return  # Retried later, by whatever consumes the dead-letter queue
+        if self._emit_changes_only and not changed:
+            return  # Unchanged (or failed) poll, nothing new for downstream
+        self.put(output_values)  # Put result in output queue
+
+    def make_output_batch(self, records):
+        """
+        Batched prices travel as one columnar PriceBatch.
+        """
+        return PriceBatch.from_records(records)
+
+    def is_complete(self, records):
         """
-        Main thread loop: fetch symbols from input queue, get their prices, and put results in output queue.
+        A symbol put downstream without a price (no dead-letter queue) is fetched again on a resumed run.
         """
-        while True:
-            if not self._symbol_queue.empty():  # Check if there are symbols to process
-                symbol = self._symbol_queue.get(timeout=10)  # Get symbol from queue, timeout to avoid blocking forever
-                if symbol == "DONE":  # Special sentinel value to signal completion
-                    if self._output_queue is not None:
-                        self._output_queue.put("DONE")  # Propagate sentinel to output queue
-                    break  # Exit the loop and end the thread
-                yahooFinancePriceWorker = YahooFinancePriceWorker(symbol=symbol)  # Create worker for symbol
-                price = yahooFinancePriceWorker.get_price()  # Fetch price for symbol
-                if self._output_queue is not None:
-                    output_values = (symbol, price, datetime.now(timezone.utc))  # Prepare result tuple
-                    self._output_queue.put(output_values)  # Put result in output queue
-                time.sleep(random.random())  # Sleep for a random short duration to avoid hammering the server
+        return all(record.price is not None for record in records)
 
 class YahooFinancePriceWorker(threading.Thread):
     """
     Worker thread to fetch the current price of a given stock symbol from Yahoo Finance.
     """
-    def __init__(self, symbol, **kwargs):
+    def __init__(self, symbol, connect_timeout=httpClient.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=httpClient.DEFAULT_READ_TIMEOUT, rate_limiter=None, base_url=YAHOO_BASE_URL,
+                 deadline=None, hedger=None, **kwargs):
         """
         Initialize the worker with a stock symbol.
         :param symbol: Stock symbol to fetch price for.
+        :param connect_timeout: Seconds to establish a connection.
+        :param read_timeout: Seconds to wait for the server between bytes.
+        :param rate_limiter: AdaptiveRateLimiter to pace requests, defaults to the shared limiter for base_url's host.
+        :param base_url: Quote URL prefix the symbol is appended to.
+        :param deadline: Seconds get_price() may take in total, retries included but rate limiter waits not (None: no limit).
+        :param hedger: RequestHedger to send requests through, hedging the slow ones (optional).
         """
         self.symbol = symbol  # Store the stock symbol
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._rate_limiter = rate_limiter or get_rate_limiter(base_url)
+        self._deadline = deadline
+        self._hedger = hedger
         super(YahooFinancePriceWorker, self).__init__(**kwargs)  # Initialize parent Thread
-        base_url = "https://finance.yahoo.com/quote/"  # Base URL for Yahoo Finance
         self._url = f'{base_url}{self.symbol}'  # Construct full URL for the symbol
         self.daemon = True  # Set thread as daemon so it exits with the main program
         self.start()  # Start the thread immediately
 
+    @staticmethod
+    def parse_price(page_html):
+        """
+        Extract the price from a Yahoo Finance quote page.
+        Tries the precompiled price selectors first and only builds an lxml tree
+        for layouts they don't recognize.
+        :param page_html: HTML content of the quote page.
+        :return: Price as float, or None if the price element is missing.
+        :raises ValueError: If the price text is not a number.
+        """
+        price_text = PriceScanner().feed(page_html)
+        if price_text is not None:
+            return price_from_text(price_text)
+
+        from lxml import html  # Only needed for unrecognized layouts
+        tree = html.fromstring(page_html)  # Parse HTML response
+
+        # Check if element exists to avoid IndexError
+        price_elements = tree.xpath(PRICE_XPATH)  # Find price element(s) using XPath
+        if not price_elements:  # If no price element found
+            return None
+
+        return price_from_text(price_elements[0].text)  # Remove commas and whitespace, convert to float
+
+    @classmethod
+    def read_price(cls, response, deadline=None, abandoned=None):
+        """
+        Read the price from a streamed response, scanning each chunk as it arrives.
+        The rest of the body is drained without parsing so the connection can be reused.
+        :param response: requests.Response opened with stream=True.
+        :param deadline: time.monotonic() by which the body must be read (optional).
+        :param abandoned: threading.Event set once the price is no longer wanted (optional).
+        :return: Price as float, or None if the price element is missing.
+        :raises ValueError: If the price text is not a number.
+        :raises TimeoutError: If deadline passes, or abandoned is set, before the price is read.
+        """
+        scanner = PriceScanner()
+        chunks = []
+        body = httpClient.iter_text(response, deadline=deadline, abandoned=abandoned)  # Checked between reads
+        for chunk in body:
+            if scanner.feed(chunk) is not None:
+                try:
+                    for _ in body:  # Drain, keep the connection alive
+                        pass
+                except TimeoutError:  # We have the price; closing the response drops the connection instead
+                    pass
+                return price_from_text(scanner.price_text)
+            chunks.append(chunk)
+        return cls.parse_price(''.join(chunks))  # Unrecognized layout, full parse
+
+    def _request_price(self, connect_timeout, read_timeout, deadline=None, abandoned=None):
+        """
+        Send one request for the quote page (the caller waits for the rate limiter first).
+        :param deadline: time.monotonic() by which the whole answer must be read (optional).
+        :param abandoned: threading.Event the hedger sets once the answer is no longer wanted (optional).
+        :return: (status code, price or None, Retry-After header of a 429).
+        :raises ValueError: If the price text is not a number.
+        :raises TimeoutError: If the deadline passes while the page is read.
+        """
+        with httpClient.get(self._url, headers=YAHOO_HEADERS, connect_timeout=connect_timeout,
+                            read_timeout=read_timeout, stream=True) as r:  # GET over a pooled keep-alive connection
+            if r.status_code == 429:  # Too many requests (rate limited)
+                return r.status_code, None, r.headers.get('Retry-After')
+            self._rate_limiter.on_success()
+            if r.status_code != 200:
+                return r.status_code, None, None
+            return r.status_code, self.read_price(r, deadline, abandoned), None  # Scan the price out of the page as it streams in
+
     def get_price(self):
         """
-        Fetch the current price for the symbol from Yahoo Finance.
+        Fetch the current price for the symbol from Yahoo Finance, within the deadline if there is one.
         :return: Price as float, or None if not found or error occurs.
         """
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                          "AppleWebKit/537.36 (KHTML, like Gecko) "
-                          "Chrome/115.0.0.0 Safari/537.36",  # Set user agent to mimic a browser
-            "Accept-Encoding": "identity"  # Disable gzip compression to avoid decoding errors
-        }
+        fetch = PriceFetchPolicy(self.symbol, self._rate_limiter, deadline=self._deadline)  # Same policy as the asyncio engine
 
-        for attempt in range(4):  # Try up to 4 times in case of errors
+        for _ in fetch.attempts():
+            waiting = time.monotonic()
+            self._rate_limiter.acquire()  # Wait for the shared per-host rate limiter
+            remaining = fetch.granted(time.monotonic() - waiting)
+            if remaining is not None and remaining <= 0:
+                break
+            request = functools.partial(self._request_price, *fetch.timeouts(self._connect_timeout, self._read_timeout),
+                                        fetch.deadline)  # A slow body can't outlast the deadline either
             try:
-                time.sleep(random.uniform(1.0, 3.0))  # Small random delay to be polite to the server
-                r = requests.get(self._url, headers=headers, timeout=10)  # Make HTTP GET request
-
-                if r.status_code == 429:  # Too many requests (rate limited)
-                    wait = 3 ** attempt  # Exponential backoff
-                    print(f"[{self.symbol}] 429 received. Retrying in {wait} sec...")
-                    time.sleep(wait)  # Wait before retrying
-                    continue  # Retry the request
-
-                if r.status_code != 200:  # Any other HTTP error
-                    print(f"[{self.symbol}] Error: {r.status_code}")
-                    return  # Exit and return None
-
-                tree = html.fromstring(r.text)  # Parse HTML response
-                price_xpath = '//*[@id="nimbus-app"]/section/section/section/article/section[1]/div[2]/div[1]/section/div/section/div[1]/div[1]/span'  # XPath to price element
-
-                # Check if element exists to avoid IndexError
-                price_elements = tree.xpath(price_xpath)  # Find price element(s) using XPath
-                if not price_elements:  # If no price element found
-                    print(f"[{self.symbol}] Price element not found.")
-                    return  # Exit and return None
-
-                price_str = price_elements[0].text  # Get price as string
-                price_clean = price_str.replace(',', '').strip()  # Remove commas and whitespace
-                price = float(price_clean)  # Convert to float
-                # print(f"[{self.symbol}] ${price}")
-                return price  # Return the price
-
-            except requests.exceptions.RequestException as e:  # Handle network errors
-                print(f"[{self.symbol}] Request failed: {e}. Retrying...")
-                time.sleep(2 ** attempt)  # Exponential backoff before retrying
+                if self._hedger is not None:  # Also stops waiting exactly at the deadline
+                    result = self._hedger.call(request, timeout=remaining,
+                                               may_hedge=self._rate_limiter.try_acquire)  # Hedge only with a spare token
+                else:
+                    result = request()
+            except (requests.exceptions.RequestException, TimeoutError) as e:  # Network errors, or the deadline
+                backoff = fetch.failed(e)
+                if backoff is None:
+                    break
+                time.sleep(backoff)
+                continue
             except ValueError as ve:  # Handle conversion errors
-                print(f"[{self.symbol}] Failed to convert price to float: {ve}")
-                return  # Exit and return None
+                return fetch.unreadable(ve)
+            if fetch.answered(*result):
+                return fetch.price
+
+        return fetch.give_up()
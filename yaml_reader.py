@@ -1,55 +1,249 @@
-import importlib
+import os
 import threading
-import time
-import yaml
-from queue import Queue  # ✅ use this instead
+from queue import Full
 
+from pipeline_autoscaler import PipelineAutoscaler
+from pipeline_broker import DEFAULT_LEASE, RemoteQueue, parse_address
+from pipeline_checkpoints import DEFAULT_CHECKPOINT_PATH, CheckpointStore, new_run_id
+from pipeline_metrics import (MetricsReporterThread, StageSamplingProfiler, build_reporters, collect_snapshot,
+                              format_stage_summary, sample_queue_depths)
+from pipeline_plan import load_plan
+from pipeline_queues import PipelineQueue
+from pipeline_routing import build_output, output_queue_names
+from pipeline_supervisor import PipelineSupervisor
+from process_stage import ProcessStage
+from workers.queueWorkers import END_OF_STREAM, RETIRE
+from workers.stageMetrics import registry
 
 
 class YamlPipelineExecutor(threading.Thread):
-    def __init__(self, pipeline_location):
+    def __init__(self, pipeline_location, run_id=None, stages=None, broker=None):
+        """
+        :param pipeline_location: Path of the pipeline YAML.
+        :param run_id: Run to resume from its checkpoints, or to start under that id. Giving one
+                       turns checkpointing on even without a 'checkpoint' block in the YAML.
+        :param stages: Names of the workers to run on this node (default: all of them). The other
+                       nodes of a distributed pipeline run the rest, sharing its broker-backed queues.
+        :param broker: 'host:port' of the queue broker, overriding the pipeline's 'broker' block.
+        """
         super(YamlPipelineExecutor, self).__init__()
         self._pipeline_location = pipeline_location
+        self.run_id = run_id
+        self._stages = stages
+        self._broker = broker
+        self._checkpoints = None  # CheckpointStore when checkpointing is on
+        self._stage_checkpoints = {}  # stage name -> StageCheckpoint
         self._queues = {}
         self._workers = {}
-        self._queue_consumers = {}
+        self._queue_consumers = {}  # queue name -> worker instances consuming it, across every stage
+        self._queue_producers = {}  # queue name -> stages still writing to it
         self._downstream_queues = {}
+        self._stage_instances = {}  # stage name -> instances not yet retired, for autoscaled stages
+        self._supervisor = PipelineSupervisor(on_stage_done=self._end_of_stream)
+        self._profiler = None
+        self._autoscaler = None
+        self._stage_specs = {}  # stage name -> (input queue name, WorkerClass, init_params) for autoscaled stages
+        self._closed_queues = set()  # Queues whose end-of-stream markers have been sent
+        self.finished = threading.Event()  # Set once run() returns, for waiting without join()
+        self._scaling_lock = threading.Lock()  # Keeps consumer counts consistent with the markers on each queue
+        self._stop_requested = False
         
     def _load_pipeline(self):
-        with open(self._pipeline_location, 'r') as file:
-            self._yaml_data = yaml.safe_load(file)
+        self._plan = load_plan(self._pipeline_location)  # Validated once per process while the file is unchanged
+        self._yaml_data = self._plan.data
         
+    def _broker_address(self):
+        address = self._broker or self._yaml_data.get('broker')
+        if address is None:
+            raise ValueError("Queues with backend: broker need a 'broker' block in the pipeline or a broker address")
+        return parse_address(address)
+
     def _initialize_queues(self):
         for queue in self._yaml_data['queues']:
             queue_name = queue['name']
-            self._queues[queue_name] = Queue()
+            if queue.get('backend', 'memory') == 'broker':  # Shared with the other nodes through the broker
+                if queue.get('overflow', 'block') != 'block':
+                    print(f"⚠️ Queue {queue_name}: overflow {queue['overflow']!r} is not supported by broker-backed queues, blocking instead")
+                self._queues[queue_name] = RemoteQueue(
+                    queue_name, self._broker_address(), self._plan.name,  # Nodes share queues by pipeline name
+                    maxsize=queue.get('maxsize', 0),
+                    producers=queue.get('producers', 1),  # Producer stages, across every node, the queue waits for
+                    lease=queue.get('lease', DEFAULT_LEASE)
+                )
+                continue
+            self._queues[queue_name] = PipelineQueue(
+                queue_name,
+                maxsize=queue.get('maxsize', 0),  # 0 keeps the queue unbounded
+                overflow=queue.get('overflow', 'block')
+            )
             
+    def _initialize_checkpoints(self):
+        """
+        Open the checkpoint store when the pipeline has a 'checkpoint' block or a run id was given.
+        """
+        checkpoint_config = self._yaml_data.get('checkpoint')
+        if checkpoint_config is None and self.run_id is None:
+            return
+        if self._plan.mode == 'streaming':  # The same symbols come back every poll, they must not be replayed
+            print("⚠️ Checkpoints are not supported in streaming mode, ignoring them")
+            return
+        checkpoint_config = checkpoint_config or {}
+        self.run_id = self.run_id or new_run_id()
+        self._checkpoints = CheckpointStore(checkpoint_config.get('path', DEFAULT_CHECKPOINT_PATH), self.run_id)
+        resumed = self._checkpoints.begin_run(os.path.abspath(self._pipeline_location))
+        print(f"[checkpoint] {'Resuming' if resumed else 'Starting'} run {self.run_id} ({self._checkpoints.path})")
+
+    def _selected_workers(self):
+        """
+        The worker entries this node runs.
+        """
+        workers = self._yaml_data['workers']
+        if self._stages is None:
+            return workers
+        unknown = set(self._stages) - {worker['name'] for worker in workers}
+        if unknown:
+            raise ValueError(f"Unknown stages {sorted(unknown)}, the pipeline defines {[worker['name'] for worker in workers]}")
+        workers = [worker for worker in workers if worker['name'] in self._stages]
+        local_outputs = {name for worker in workers for name in output_queue_names(worker.get('output_queues'))} | \
+            {worker['dead_letter_queue'] for worker in workers if worker.get('dead_letter_queue')}
+        for worker in workers:
+            input_queue = worker.get('input_queue')
+            if input_queue is not None and input_queue not in local_outputs and \
+                    not isinstance(self._queues[input_queue], RemoteQueue):
+                print(f"⚠️ {worker['name']}: nothing on this node writes to {input_queue}, "
+                      f"give it backend: broker to share it with the node that does")
+        return workers
+
     def _initialize_workers(self):
-        for worker in self._yaml_data['workers']: #import
-            WorkerClass = getattr(importlib.import_module(worker['location']), worker['class'])
-            
+        selected = self._selected_workers()
+        from workers import httpClient  # Imports requests, which only the HTTP workers need otherwise
+        # One keep-alive connection per host for every thread that may make requests, sized before any starts
+        httpClient.size_pools(sum(max(worker.get('instances', 1), worker.get('max_instances') or 0)
+                                  for worker in selected if worker.get('backend', 'thread') == 'thread'))
+        for worker in selected: #import
             input_queue = worker.get('input_queue')
-            output_queues = worker.get('output_queues', [])
+            output_queues = output_queue_names(worker.get('output_queues'))  # Every queue any route writes to
             worker_name = worker['name']
             num_instances = worker.get('instances', 1)
-            
-            self._downstream_queues[worker_name] = output_queues
+            min_instances = worker.get('min_instances')
+            max_instances = worker.get('max_instances')
+            autoscaled = min_instances is not None or max_instances is not None
+            if autoscaled:
+                min_instances = max(1, min_instances or 1)
+                max_instances = max(min_instances, max_instances or num_instances)
+                num_instances = min(max(num_instances, min_instances), max_instances)
+
+            dead_letter_queue = worker.get('dead_letter_queue')
+            # The dead-letter queue ends with the stage, like its outputs, so a retry stage reading it finishes too
+            stage_outputs = output_queues + ([dead_letter_queue] if dead_letter_queue else [])
+            self._downstream_queues[worker_name] = stage_outputs
+            for output_queue in stage_outputs:
+                self._queue_producers.setdefault(output_queue, set()).add(worker_name)
+            for output_queue in dict.fromkeys(stage_outputs):
+                if isinstance(self._queues[output_queue], RemoteQueue):
+                    self._queues[output_queue].register_producer(worker_name)  # Before any worker can finish
             if input_queue is not None:
-                self._queue_consumers[input_queue] = num_instances
-                
+                self._queue_consumers[input_queue] = self._queue_consumers.get(input_queue, 0) + num_instances
+
             init_params = {
                 'input_queue': self._queues[input_queue] if input_queue else None,
-                'output_queue': self._queues[output_queues[0]] if output_queues else None
+                # The queue itself for a single output, otherwise a router shared by every instance
+                'output_queue': build_output(worker.get('output_queues'), self._queues),
+                'stage_name': worker_name  # Metrics are recorded per stage, not per class
             }
+            if dead_letter_queue:
+                init_params['dead_letter_queue'] = self._queues[dead_letter_queue]
             
             input_values = worker.get('input_values')
             if input_values is not None:
                 init_params['input_values'] = input_values
+
+            params = worker.get('params')  # Worker-specific settings, passed through as keyword arguments
+            if params is not None:
+                init_params.update(params)
                 
             self._workers[worker_name] = []
+            if worker.get('backend', 'thread') == 'process':  # Run the instances in child processes
+                if autoscaled:
+                    print(f"⚠️ {worker_name}: min/max_instances are not supported with backend: process, running {num_instances}")
+                if self._checkpoints is not None:
+                    print(f"⚠️ {worker_name}: checkpoints are not supported with backend: process, its items are redone on resume")
+                if init_params.pop('dead_letter_queue', None) is not None:
+                    print(f"⚠️ {worker_name}: dead_letter_queue is not supported with backend: process, failed items stop a worker")
+                stage = ProcessStage(worker['location'], worker['class'], num_instances, **init_params)
+                self._workers[worker_name].append(stage)
+                self._supervisor.add_worker(worker_name, stage)
+                continue
+
+            if self._checkpoints is not None:
+                self._stage_checkpoints[worker_name] = self._checkpoints.stage(worker_name)
+                init_params['checkpoint'] = self._stage_checkpoints[worker_name]  # Shared by every instance
+
             ## WorkerClass(input_queue=self._queues['SymbolQueue'], output_queue=[self._queues['PostgresUploading']])
+            WorkerClass = self._plan.worker_class(worker)  # Imported on first use, cached for the process
             for i in range(num_instances):
-                self._workers[worker_name].append(WorkerClass(**init_params))
+                worker_thread = WorkerClass(**init_params)
+                self._workers[worker_name].append(worker_thread)
+                self._supervisor.add_worker(worker_name, worker_thread)
+
+            if autoscaled and input_queue is not None:
+                self._stage_specs[worker_name] = (input_queue, WorkerClass, init_params)
+                self._stage_instances[worker_name] = num_instances
+                self._get_autoscaler().add_stage(
+                    worker_name, self._queues[input_queue], [self._queues[name] for name in output_queues],
+                    min_instances, max_instances
+                )
+
+    def _get_autoscaler(self):
+        if self._autoscaler is None:
+            config = self._yaml_data.get('autoscaling') or {}
+            self._autoscaler = PipelineAutoscaler(self.stage_instances, self.scale_up, self.scale_down, **config)
+        return self._autoscaler
+
+    def stage_instances(self, worker_name):
+        """
+        Workers of an autoscaled stage that have not been retired, or 0 once its input has ended.
+        """
+        input_queue = self._stage_specs[worker_name][0]
+        with self._scaling_lock:
+            if input_queue in self._closed_queues:
+                return 0
+            return self._stage_instances[worker_name]
+
+    def scale_up(self, worker_name, count):
+        """
+        Start count more workers for a stage, unless its input has already ended.
+        """
+        input_queue, WorkerClass, init_params = self._stage_specs[worker_name]
+        with self._scaling_lock:
+            if input_queue in self._closed_queues:
+                return
+            for _ in range(count):
+                worker_thread = WorkerClass(**init_params)
+                self._workers[worker_name].append(worker_thread)
+                self._supervisor.add_worker(worker_name, worker_thread)
+            self._queue_consumers[input_queue] += count
+            self._stage_instances[worker_name] += count
+            print(f"[autoscaler] {worker_name}: {self._stage_instances[worker_name] - count} -> "
+                  f"{self._stage_instances[worker_name]} instances (backlog {self._queues[input_queue].qsize()})")
+
+    def scale_down(self, worker_name):
+        """
+        Retire one worker of a stage: a RETIRE marker stops whichever worker takes it, and the
+        stage's consumer count drops right away so end-of-stream sends one marker fewer.
+        """
+        input_queue = self._stage_specs[worker_name][0]
+        with self._scaling_lock:
+            if input_queue in self._closed_queues:
+                return
+            try:
+                self._queues[input_queue].put(RETIRE, block=False)
+            except Full:  # Backed up; try again at the next check
+                return
+            self._queue_consumers[input_queue] -= 1
+            self._stage_instances[worker_name] -= 1
+            print(f"[autoscaler] {worker_name}: {self._stage_instances[worker_name] + 1} -> "
+                  f"{self._stage_instances[worker_name]} instances")
     
     def _join_workers(self):
         for worker_name in self._workers:
@@ -60,47 +254,124 @@ class YamlPipelineExecutor(threading.Thread):
     def process_pipeline(self):
         self._load_pipeline()
         self._initialize_queues()
+        self._initialize_checkpoints()
         self._initialize_workers()
+        if self._stop_requested:  # stop() came while the stages were being built
+            self.stop()
         # self._join_workers()
 
+    def stop(self):
+        """
+        Stop a streaming pipeline: every source worker with a stop() method stops producing,
+        and the rest of the pipeline drains and ends as a batch run would.
+        """
+        self._stop_requested = True
+        for worker_name, workers in list(self._workers.items()):
+            for worker in list(workers):
+                if hasattr(worker, 'stop'):
+                    worker.stop()
+
+    def failed_stages(self):
+        """
+        Names of the stages in which a worker failed (an exception ended it).
+        """
+        return self._supervisor.failed_stages()
+
  
+    def _end_of_stream(self, worker_name):
+        """
+        Called by the supervisor once every instance of a stage has exited: send one "DONE"
+        per consumer on each of the stage's output queues that no other stage still writes to.
+        """
+        with self._scaling_lock:
+            for output_queue in dict.fromkeys(self._downstream_queues[worker_name]):  # Each queue once
+                producers = self._queue_producers[output_queue]
+                producers.discard(worker_name)
+                if isinstance(self._queues[output_queue], RemoteQueue):
+                    # The broker ends the queue on every node once all of its producers are done
+                    self._queues[output_queue].producer_done(worker_name)
+                    continue
+                if producers:
+                    continue  # Another stage still feeds it
+                self._closed_queues.add(output_queue)  # Its consumers can no longer be scaled
+                number_of_consumers = self._queue_consumers.get(output_queue, 0)
+                for _ in range(number_of_consumers):
+                    self._queues[output_queue].put(END_OF_STREAM)
+        registry.stage(worker_name).finish()
+        del self._workers[worker_name]
+
+    def queue_stats(self):
+        """
+        Size, capacity and high-water mark of every queue.
+        """
+        return [queue.stats() for queue in self._queues.values()]
+
+    def metrics_snapshot(self):
+        """
+        Per-stage metrics, live workers, queue depths and rate limiter state in one dict.
+        """
+        return collect_snapshot(self.queue_stats(), dict(self._supervisor.stats()), self._profiler)
+
+    def _start_metrics(self):
+        """
+        Start the reporters and the sampling profiler configured under the pipeline's 'metrics' key.
+        Returns the reporter thread, which samples queue depths every interval even without reporters.
+        """
+        metrics_config = self._yaml_data.get('metrics') or {}
+        if metrics_config.get('profile'):
+            self._profiler = StageSamplingProfiler(interval=metrics_config.get('profile_interval', 0.01))
+            self._profiler.start()
+        reporter = MetricsReporterThread(self.metrics_snapshot, build_reporters(metrics_config.get('reporters')),
+                                         interval=metrics_config.get('interval', 5.0),
+                                         sample=lambda: sample_queue_depths(self.queue_stats()))
+        reporter.start()
+        return reporter
+
     def run(self):
+        try:
+            self._run_pipeline()
+        finally:
+            self.finished.set()
+
+    def _run_pipeline(self):
         self.process_pipeline()
-        total_workers_alive = 0
-        while True:
-            total_workers_alive = 0
-            worker_stats = []
-            to_del = []
-            for worker_name in self._workers:
-                total_worker_threads_alive = 0
-                for worker_thread in self._workers[worker_name]:
-                    if worker_thread.is_alive():
-                        total_worker_threads_alive += 1
-                if total_worker_threads_alive == 0:
-                    if self._downstream_queues[worker_name] is not None and isinstance(self._downstream_queues[worker_name], list):
-                        for output_queue in self._downstream_queues[worker_name]:
-                            number_of_consumers = self._queue_consumers[output_queue]
-                            for _ in range(number_of_consumers):
-                                self._queues[output_queue].put("DONE")
-                                
-                    # del self._workers[worker_name]
-                    
-                    to_del.append(worker_name)
-                
-                worker_stats.append([worker_name, total_worker_threads_alive])
-            print(worker_stats)
-                
-            if total_workers_alive == 0:
-                break
-            
-            
-            # queue_stats = []
-            # for queue in self._queues:
-            #     queue_stats.append([queue, self._queues[queue].qsize()])
-                
-            # print(queue_stats)
-            
-            for worker_name in to_del:
-                del self._workers[worker_name]
-            time.sleep(1)  # Keep the thread alive, or implement a proper shutdown mechanism
-            
\ No newline at end of file
+        reporter = self._start_metrics()
+        if self._autoscaler is not None:
+            self._autoscaler.start()
+        self._supervisor.wait()  # Returns once the whole pipeline has drained
+        if self._autoscaler is not None:
+            self._autoscaler.stop()
+        if self._profiler is not None:
+            self._profiler.stop()
+        reporter.stop()  # Writes the final report
+        if not reporter.reporters:
+            print(format_stage_summary(self.metrics_snapshot()))
+        for queue in self._queues.values():
+            if isinstance(queue, RemoteQueue):
+                queue.close()
+        if self._checkpoints is not None:
+            replayed = {name: checkpoint.replayed for name, checkpoint in self._stage_checkpoints.items() if checkpoint.replayed}
+            print(f"[checkpoint] Run {self.run_id} finished" + (f", replayed {replayed}" if replayed else ""))
+            self._checkpoints.finish_run()
+            self._checkpoints.close()
+
+
+def create_pipeline_executor(pipeline_location, run_id=None, stages=None, broker=None):
+    """
+    Build the executor selected by the pipeline's top-level 'engine' key:
+    'threads' (default) for YamlPipelineExecutor, 'asyncio' for AsyncYamlPipelineExecutor.
+    :param run_id: Checkpointed run to start or resume (threads engine only).
+    :param stages: Workers to run on this node, for distributed pipelines (threads engine only).
+    :param broker: 'host:port' of the queue broker (threads engine only).
+    """
+    engine = load_plan(pipeline_location).engine  # Validates the pipeline; the executor reuses the parsed plan
+    if engine == 'threads':
+        return YamlPipelineExecutor(pipeline_location=pipeline_location, run_id=run_id, stages=stages, broker=broker)
+    if engine == 'asyncio':
+        from async_yaml_reader import AsyncYamlPipelineExecutor  # Imported lazily, pulls in aiohttp
+        if run_id is not None:
+            print("⚠️ Checkpointed runs are only supported by the threads engine, ignoring the run id")
+        if stages is not None or broker is not None:
+            print("⚠️ Distributed runs are only supported by the threads engine, running every stage here")
+        return AsyncYamlPipelineExecutor(pipeline_location=pipeline_location)
+    raise ValueError(f"Unknown pipeline engine {engine!r}, expected 'threads' or 'asyncio'")